@@ -1,51 +1,187 @@
 import os
 import logging
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import random
+import bisect
+import hashlib
+import mimetypes
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from datetime import date, datetime, timedelta
+from flask import (Flask, Response, render_template, stream_template, request, redirect, url_for, flash,
+                   get_flashed_messages, g, has_request_context, jsonify, send_file, send_from_directory, session)
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
-from sqlalchemy import event
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from sqlalchemy.orm import Session, relationship, selectinload
+from sqlalchemy import Integer, and_, case, cast, event, func, insert, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import NotFound
 import csv
+import click
 from io import StringIO
 from dotenv import load_dotenv
 
-from gemini_client import GeminiUnavailable, interpret_box_speech
+import fast_json
+import idempotency
+from gemini_client import GeminiUnavailable, interpret_box_speech, normalize_interpretation
+from assets import build_assets, choose_variant, load_manifest
+from compression import configure_compression
+from profiling import configure_profiling
+from log_config import configure_logging
+from search_index import create_search_index, rebuild_search_index, reindex_boxes, search_boxes
+from inventory_events import EventBroadcaster, box_event, container_event, format_sse
+from load_planner import plan_containers
+from weight_analytics import fit_unit_weights, load_content_rows, numpy_available, ranked_outliers
+from backup import BackupScheduler, backup_database, latest_snapshot_time, prune_snapshots
+from archive import archivable_container_ids, archive_containers, count_owned_rows, tables_reusing_ids
+from inventory_snapshots import daily_rollups, snapshot_rows, trend_series
+from maintenance import (ORPHAN_CHECKS, chunk_end, clear_checkpoint, count_unnumbered_containers,
+                         create_checkpoint_table, database_stats, delete_rows, highest_container_number,
+                         integrity_problems, load_checkpoint, orphaned_ids, save_checkpoint)
+from jobs import JobQueueFull, JobResult, JobRunner, cleanup_jobs, create_job_table, job_status
+from write_queue import WriteQueue, WriteQueueBusy
+from sites import SiteRoutingSession, active_site, gather_sites, parse_site_databases, site_engine, use_site
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (records are queued and written by a background thread)
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')
+app.config['LOG_FILE'] = os.getenv('LOG_FILE', '')
+app.config['LOG_MAX_BYTES'] = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+app.config['LOG_ROTATE_WHEN'] = os.getenv('LOG_ROTATE_WHEN', '')
+app.config['LOG_BACKUP_COUNT'] = int(os.getenv('LOG_BACKUP_COUNT', 5))
+app.config['LOG_REQUESTS'] = os.getenv('LOG_REQUESTS', 'true').lower() == 'true'
+configure_logging(app)
 logger = logging.getLogger(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///warehouse.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///warehouse.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# On-the-fly compression of HTML/JSON/CSV responses
+app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+app.config['COMPRESS_ALGORITHMS'] = os.getenv('COMPRESS_ALGORITHMS', 'br,gzip').split(',')
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_BR_LEVEL'] = int(os.getenv('COMPRESS_BR_LEVEL', 4))
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+configure_compression(app)
+
+# Profiling single requests on demand (see profiling.py); off unless PROFILE_TOKEN is set
+app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN', '')
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+app.config['PROFILE_MAX_FILES'] = int(os.getenv('PROFILE_MAX_FILES', 50))
+app.config['PROFILE_MIN_INTERVAL'] = float(os.getenv('PROFILE_MIN_INTERVAL', 10))
+configure_profiling(app)
+
+# Live inventory events pushed to dashboards over server-sent events
+app.config['EVENTS_POLL_INTERVAL'] = float(os.getenv('EVENTS_POLL_INTERVAL', 1.0))
+app.config['EVENTS_HEARTBEAT'] = float(os.getenv('EVENTS_HEARTBEAT', 15.0))
+app.config['EVENTS_RETENTION_HOURS'] = int(os.getenv('EVENTS_RETENTION_HOURS', 24))
+app.config['EVENTS_REPLAY_LIMIT'] = int(os.getenv('EVENTS_REPLAY_LIMIT', 500))
+
+# Responses kept for retries that send the same Idempotency-Key
+app.config['IDEMPOTENCY_TTL_HOURS'] = int(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+app.config['IDEMPOTENCY_MAX_KEYS'] = int(os.getenv('IDEMPOTENCY_MAX_KEYS', 10000))
+# A key whose response was never stored (its worker died right after the
+# write) is answered as already processed once it is this old
+app.config['IDEMPOTENCY_PENDING_SECONDS'] = int(os.getenv('IDEMPOTENCY_PENDING_SECONDS', 30))
+
+# Background jobs for large reports (see jobs.py); results are files in JOBS_DIR
+app.config['JOBS_MAX_WORKERS'] = int(os.getenv('JOBS_MAX_WORKERS', 2))
+app.config['JOBS_MAX_PENDING'] = int(os.getenv('JOBS_MAX_PENDING', 20))
+app.config['JOBS_RETENTION_HOURS'] = int(os.getenv('JOBS_RETENTION_HOURS', 24))
+app.config['JOBS_DIR'] = os.getenv('JOBS_DIR', os.path.join(app.instance_path, 'jobs'))
+
+# Writes from requests handed to one writer thread per site that commits them
+# in groups (see write_queue.py); off unless WRITE_QUEUE_ENABLED is set
+app.config['WRITE_QUEUE_ENABLED'] = os.getenv('WRITE_QUEUE_ENABLED', 'false').lower() == 'true'
+app.config['WRITE_QUEUE_MAX_BATCH'] = int(os.getenv('WRITE_QUEUE_MAX_BATCH', 50))
+app.config['WRITE_QUEUE_MAX_DELAY'] = float(os.getenv('WRITE_QUEUE_MAX_DELAY', 0.005))
+app.config['WRITE_QUEUE_MAX_PENDING'] = int(os.getenv('WRITE_QUEUE_MAX_PENDING', 500))
+app.config['WRITE_QUEUE_TIMEOUT'] = float(os.getenv('WRITE_QUEUE_TIMEOUT', 10))
+
+# Online database snapshots (see backup.py), by `flask backup-db` or every
+# BACKUP_INTERVAL_HOURS from a background thread (0 turns that off)
+app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR', os.path.join(app.instance_path, 'backups'))
+app.config['BACKUP_KEEP'] = int(os.getenv('BACKUP_KEEP', 7))
+app.config['BACKUP_COMPRESS'] = os.getenv('BACKUP_COMPRESS', 'true').lower() == 'true'
+app.config['BACKUP_STEP_PAGES'] = int(os.getenv('BACKUP_STEP_PAGES', 1024))
+app.config['BACKUP_STEP_PAUSE'] = float(os.getenv('BACKUP_STEP_PAUSE', 0.05))
+app.config['BACKUP_INTERVAL_HOURS'] = float(os.getenv('BACKUP_INTERVAL_HOURS', 0))
+
+# Fingerprinted, precompressed static assets written by `flask build-assets`
+app.config['ASSETS_DIR'] = os.path.join(app.static_folder, 'dist')
+asset_manifest = load_manifest(app.config['ASSETS_DIR'])
+
+# Compiled templates are cached on disk, when TEMPLATE_CACHE_DIR is set, so new
+# workers skip parsing them (`flask compile-templates` fills the cache at deploy
+# time). Templates are re-read when they change only in debug mode unless
+# TEMPLATES_AUTO_RELOAD is set.
+app.config['TEMPLATE_CACHE_DIR'] = os.getenv('TEMPLATE_CACHE_DIR', '')
+templates_auto_reload = os.getenv('TEMPLATES_AUTO_RELOAD', '')
+app.config['TEMPLATES_AUTO_RELOAD'] = templates_auto_reload.lower() == 'true' if templates_auto_reload else None
+if app.config['TEMPLATE_CACHE_DIR']:
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+# Shipped containers moved out of the live tables by `flask archive-containers`
+# go to archived_* tables, in this SQLite file when set (attached as "archive")
+app.config['ARCHIVE_DATABASE'] = os.getenv('ARCHIVE_DATABASE', '')
+ARCHIVE_SCHEMA = 'archive' if app.config['ARCHIVE_DATABASE'] else None
+ARCHIVE_PREFIX = f'{ARCHIVE_SCHEMA}.' if ARCHIVE_SCHEMA else ''
+
+# Warehouse sites served by this deployment, each with its own database (see sites.py):
+# SITE_DATABASES=east=sqlite:////data/east.db,west=sqlite:////data/west.db
+# Without it there is a single site, "main", using DATABASE_URL.
+site_databases = (parse_site_databases(os.getenv('SITE_DATABASES', ''))
+                  or {'main': app.config['SQLALCHEMY_DATABASE_URI']})
+app.config['SITES'] = list(site_databases)
+app.config['SQLALCHEMY_DATABASE_URI'] = site_databases[app.config['SITES'][0]]
+app.config['SQLALCHEMY_BINDS'] = {site: url for site, url in site_databases.items() if site != app.config['SITES'][0]}
+# Site used when a request doesn't pick one, and by CLI commands
+app.config['DEFAULT_SITE'] = os.getenv('DEFAULT_SITE', app.config['SITES'][0])
+if app.config['DEFAULT_SITE'] not in app.config['SITES']:
+    raise ValueError(f"DEFAULT_SITE {app.config['DEFAULT_SITE']!r} is not in SITE_DATABASES")
+MULTI_SITE = len(app.config['SITES']) > 1
+
+db = SQLAlchemy(app, session_options={'class_': SiteRoutingSession})
+
+def archive_database_path(site):
+    """Archive file of `site`; with several sites each gets its own, e.g. archive-east.db."""
+    if not MULTI_SITE:
+        return app.config['ARCHIVE_DATABASE']
+    root, extension = os.path.splitext(app.config['ARCHIVE_DATABASE'])
+    return f'{root}-{site}{extension}'
+
+def site_engines():
+    """(site, engine) for every configured site."""
+    return [(site, site_engine(db, site)) for site in app.config['SITES']]
 
 # Initialize database tables automatically on app startup
 with app.app_context():
-    db.create_all()
+    for site, engine in site_engines():
+        if ARCHIVE_SCHEMA:
+            @event.listens_for(engine, 'connect')
+            def attach_archive_database(dbapi_connection, connection_record, path=archive_database_path(site)):
+                dbapi_connection.execute('ATTACH DATABASE ? AS archive', (path,))
+        db.metadata.create_all(engine)
 
-# Models
-class Box(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    box_number = db.Column(db.String(50), unique=True, nullable=False)
-    weight = db.Column(db.Float, nullable=False)
-    box_type = db.Column(db.String(20), nullable=False, default='detailed')  # 'detailed' or 'simple'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    contents = relationship('BoxContent', back_populates='box', cascade='all, delete-orphan')
-    container_id = db.Column(db.Integer, db.ForeignKey('container.id'), nullable=True)
+# Product types offered in the box forms and accepted from voice entry
+PRODUCT_TYPES = ['Laptops', 'PCs', 'LCDs', 'Servers', 'Switches', 'Wires', 'Keyboards', 'Stands']
 
+# Standard LCD sizes offered in the box forms
+LCD_SIZES = ['17"S', '17"W', '19"S', '19"W', '20"S', '20"W', '22"', '23"', '24"', 'Borderless 24"']
+
+# Models
+# Totals shared by live and archived models (see the archive models below)
+class BoxTotalsMixin:
     def calculate_totals(self):
         totals = {}
         for content in self.contents:
@@ -64,23 +200,7 @@ class Box(db.Model):
                 lcd_sizes[content.lcd_size] += content.quantity
         return lcd_sizes
 
-class BoxContent(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    box_id = db.Column(db.Integer, db.ForeignKey('box.id'), nullable=False)
-    section = db.Column(db.String(20), nullable=False)  # bottom, middle, top
-    product_type = db.Column(db.String(100), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
-    lcd_size = db.Column(db.String(50), nullable=True)  # For LCD size specification
-    box = relationship('Box', back_populates='contents')
-
-class Container(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    container_number = db.Column(db.String(50), unique=True, nullable=True)
-    name = db.Column(db.String(100), nullable=False)
-    date = db.Column(db.DateTime, default=datetime.utcnow)
-    boxes = relationship('Box', backref='container', lazy=True)
-    custom_boxes = relationship('CustomBox', backref='container', lazy=True)
-
+class ContainerTotalsMixin:
     def calculate_totals(self):
         totals = {}
         # Count from regular boxes
@@ -122,76 +242,960 @@ class Container(db.Model):
     def get_total_box_count(self):
         return len(self.boxes) + len(self.custom_boxes)
 
+class Box(BoxTotalsMixin, db.Model):
+    # AUTOINCREMENT on the tables that feed the archive, so IDs of archived rows are never handed out again
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    box_number = db.Column(db.String(50), unique=True, nullable=False)
+    weight = db.Column(db.Float, nullable=False)
+    box_type = db.Column(db.String(20), nullable=False, default='detailed')  # 'detailed' or 'simple'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    contents = relationship('BoxContent', back_populates='box', cascade='all, delete-orphan')
+    container_id = db.Column(db.Integer, db.ForeignKey('container.id'), nullable=True, index=True)
+
+class BoxContent(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    box_id = db.Column(db.Integer, db.ForeignKey('box.id'), nullable=False, index=True)
+    section = db.Column(db.String(20), nullable=False)  # bottom, middle, top
+    product_type = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    lcd_size = db.Column(db.String(50), nullable=True)  # For LCD size specification
+    box = relationship('Box', back_populates='contents')
+
+class Container(ContainerTotalsMixin, db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    container_number = db.Column(db.String(50), unique=True, nullable=True)
+    name = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.DateTime, default=datetime.utcnow)
+    boxes = relationship('Box', backref='container', lazy=True)
+    custom_boxes = relationship('CustomBox', backref='container', lazy=True)
+
 class CustomBox(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
-    container_id = db.Column(db.Integer, db.ForeignKey('container.id'), nullable=False)
+    container_id = db.Column(db.Integer, db.ForeignKey('container.id'), nullable=False, index=True)
+    weight = db.Column(db.Float, nullable=False)
+    product_type = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+def _archive_fk(column):
+    return f'{ARCHIVE_PREFIX}{column}'
+
+class ArchivedContainer(ContainerTotalsMixin, db.Model):
+    """A shipped container moved out of the live tables, keeping its original ID."""
+    __tablename__ = 'archived_container'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    container_number = db.Column(db.String(50), nullable=True, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    boxes = relationship('ArchivedBox', backref='container', lazy=True)
+    custom_boxes = relationship('ArchivedCustomBox', backref='container', lazy=True)
+
+class ArchivedBox(BoxTotalsMixin, db.Model):
+    __tablename__ = 'archived_box'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    box_number = db.Column(db.String(50), nullable=False, index=True)
+    weight = db.Column(db.Float, nullable=False)
+    box_type = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    container_id = db.Column(db.Integer, db.ForeignKey(_archive_fk('archived_container.id')), nullable=False, index=True)
+    contents = relationship('ArchivedBoxContent', back_populates='box')
+
+class ArchivedBoxContent(db.Model):
+    __tablename__ = 'archived_box_content'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    box_id = db.Column(db.Integer, db.ForeignKey(_archive_fk('archived_box.id')), nullable=False, index=True)
+    section = db.Column(db.String(20), nullable=False)
+    product_type = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    lcd_size = db.Column(db.String(50), nullable=True)
+    box = relationship('ArchivedBox', back_populates='contents')
+
+class ArchivedCustomBox(db.Model):
+    __tablename__ = 'archived_custom_box'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    container_id = db.Column(db.Integer, db.ForeignKey(_archive_fk('archived_container.id')), nullable=False, index=True)
     weight = db.Column(db.Float, nullable=False)
     product_type = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
 
+class InventoryEvent(db.Model):
+    """A box or container change, stored for the live dashboard feed (see inventory_events.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    event_type = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+
+class InventorySnapshot(db.Model):
+    """Daily inventory totals per status, product type and LCD size (see inventory_snapshots.py)."""
+    __table_args__ = (db.UniqueConstraint('snapshot_date', 'status', 'product_type', 'lcd_size'),)
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # available or containerized
+    product_type = db.Column(db.String(100), nullable=False, default='')  # '' for the status totals row
+    lcd_size = db.Column(db.String(50), nullable=False, default='')  # set only on LCD size rows
+    box_count = db.Column(db.Integer, nullable=False, default=0)
+    custom_box_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Float, nullable=False, default=0.0)
+
+with app.app_context():
+    for site, engine in site_engines():
+        InventoryEvent.__table__.create(engine, checkfirst=True)
+        InventorySnapshot.__table__.create(engine, checkfirst=True)
+        for archive_model in (ArchivedContainer, ArchivedBox, ArchivedBoxContent, ArchivedCustomBox):
+            archive_model.__table__.create(engine, checkfirst=True)
+
+# Full-text search over boxes (see search_index.py); False if SQLite lacks FTS5
+with app.app_context():
+    for site, engine in site_engines():
+        with engine.begin() as connection:
+            search_index_available = create_search_index(connection)
+
+# Responses remembered per idempotency key (see idempotency.py)
+with app.app_context():
+    for site, engine in site_engines():
+        with engine.begin() as connection:
+            idempotency.create_idempotency_table(connection)
+
+# Background job queue (see jobs.py)
+with app.app_context():
+    for site, engine in site_engines():
+        with engine.begin() as connection:
+            create_job_table(connection)
+
+# Progress of resumable maintenance commands (see maintenance.py)
+with app.app_context():
+    for site, engine in site_engines():
+        with engine.begin() as connection:
+            create_checkpoint_table(connection)
+
+# A request picks its site with ?site= (remembered in a cookie), the X-Site
+# header or that cookie; otherwise it gets DEFAULT_SITE
+SITE_COOKIE = 'site'
+
+@app.before_request
+def select_site():
+    site = request.args.get('site') or request.headers.get('X-Site')
+    if site is not None and site not in app.config['SITES']:
+        message = f'Unknown site {site!r}; expected one of {", ".join(app.config["SITES"])}'
+        if request.is_json or request.path.startswith('/api/'):
+            raise ApiError(message)
+        # Returned rather than raised: the catch-all error handler would turn it into a redirect
+        return NotFound(message).get_response()
+    if site is None and request.cookies.get(SITE_COOKIE) in app.config['SITES']:
+        site = request.cookies.get(SITE_COOKIE)
+    g.site = site or app.config['DEFAULT_SITE']
+
+@app.after_request
+def remember_site(response):
+    if MULTI_SITE and request.endpoint not in ('static', 'fingerprinted_asset'):
+        # Pages and API responses differ per site at the same URL
+        response.vary.update(('Cookie', 'X-Site'))
+        if request.args.get('site') and g.get('site'):
+            response.set_cookie(SITE_COOKIE, g.site, max_age=365 * 24 * 3600, samesite='Lax')
+    return response
+
+@app.context_processor
+def inject_sites():
+    return {'current_site': g.get('site'), 'sites': app.config['SITES'] if MULTI_SITE else []}
+
+@event.listens_for(Session, 'after_flush')
+def update_search_index(session, flush_context):
+    """Re-index boxes touched by a flush, including boxes of renamed containers."""
+    if not search_index_available:
+        return
+    box_ids = set()
+    renamed_container_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Box):
+            box_ids.add(obj.id)
+        elif isinstance(obj, BoxContent):
+            box_ids.add(obj.box_id)
+        elif isinstance(obj, Container) and db.inspect(obj).attrs.name.history.has_changes():
+            renamed_container_ids.add(obj.id)
+    connection = session.connection()
+    if renamed_container_ids:
+        box_ids.update(connection.execute(
+            select(Box.id).where(Box.container_id.in_(renamed_container_ids))
+        ).scalars())
+    box_ids.discard(None)
+    if box_ids:
+        reindex_boxes(connection, box_ids)
+
+def _box_snapshots(connection, box_ids):
+    """Current state of the given boxes as plain dicts; deleted boxes map to None."""
+    snapshots = {box_id: None for box_id in box_ids}
+    if not box_ids:
+        return snapshots
+    for row in connection.execute(
+        select(Box.id, Box.box_number, Box.weight, Box.box_type, Box.container_id, Box.created_at)
+        .where(Box.id.in_(box_ids))
+    ):
+        snapshots[row.id] = {
+            'id': row.id,
+            'box_number': row.box_number,
+            'weight': row.weight,
+            'box_type': row.box_type,
+            'container_id': row.container_id,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'totals': {},
+            'lcd_sizes': {},
+        }
+    for box_id, product_type, quantity, lcd_size in connection.execute(
+        select(BoxContent.box_id, BoxContent.product_type, BoxContent.quantity, BoxContent.lcd_size)
+        .where(BoxContent.box_id.in_(box_ids))
+    ):
+        snapshot = snapshots[box_id]
+        if snapshot is None:
+            continue
+        _add_quantity(snapshot['totals'], product_type, quantity)
+        if product_type == 'LCDs' and lcd_size:
+            _add_quantity(snapshot['lcd_sizes'], lcd_size, quantity)
+    return snapshots
+
+def _container_snapshots(connection, container_ids):
+    """Current name, number and custom box totals of the given containers; deleted ones map to None."""
+    snapshots = {container_id: None for container_id in container_ids}
+    if not container_ids:
+        return snapshots
+    for row in connection.execute(
+        select(Container.id, Container.name, Container.container_number).where(Container.id.in_(container_ids))
+    ):
+        snapshots[row.id] = {
+            'id': row.id,
+            'name': row.name,
+            'container_number': row.container_number,
+            'custom_box_count': 0,
+            'custom_weight': 0.0,
+            'custom_totals': {},
+        }
+    for container_id, weight, product_type, quantity in connection.execute(
+        select(CustomBox.container_id, CustomBox.weight, CustomBox.product_type, CustomBox.quantity)
+        .where(CustomBox.container_id.in_(container_ids))
+    ):
+        snapshot = snapshots[container_id]
+        if snapshot is None:
+            continue
+        snapshot['custom_box_count'] += 1
+        snapshot['custom_weight'] += weight
+        _add_quantity(snapshot['custom_totals'], product_type, quantity)
+    return snapshots
+
+def _pending_inventory_changes(session):
+    return session.info.setdefault('inventory_changes', {'boxes': {}, 'containers': {}})
+
+@event.listens_for(Session, 'before_flush')
+def snapshot_inventory_before_flush(session, flush_context, instances):
+    """Remember how touched boxes and containers looked before this transaction changed them."""
+    box_ids = set()
+    container_ids = set()
+    for obj in list(session.dirty) + list(session.deleted) + list(session.new):
+        if isinstance(obj, Box):
+            box_ids.add(obj.id)
+        elif isinstance(obj, BoxContent):
+            box_ids.add(obj.box_id if obj.box_id is not None else (obj.box.id if obj.box else None))
+        elif isinstance(obj, Container):
+            container_ids.add(obj.id)
+        elif isinstance(obj, CustomBox):
+            container_ids.add(obj.container_id if obj.container_id is not None
+                              else (obj.container.id if obj.container else None))
+    if not box_ids and not container_ids:
+        return
+    changes = _pending_inventory_changes(session)
+    # Objects that are new to the database have no ID yet; after_flush records them
+    box_ids = {box_id for box_id in box_ids if box_id is not None and box_id not in changes['boxes']}
+    container_ids = {container_id for container_id in container_ids
+                     if container_id is not None and container_id not in changes['containers']}
+    connection = session.connection()
+    changes['boxes'].update(_box_snapshots(connection, box_ids))
+    changes['containers'].update(_container_snapshots(connection, container_ids))
+
+@event.listens_for(Session, 'after_flush')
+def record_new_inventory_objects(session, flush_context):
+    """Boxes and containers inserted by this transaction had no earlier state."""
+    for obj in session.new:
+        if isinstance(obj, (Box, Container)):
+            changes = _pending_inventory_changes(session)
+            kind = 'boxes' if isinstance(obj, Box) else 'containers'
+            changes[kind].setdefault(obj.id, None)
+
+@event.listens_for(Session, 'before_commit')
+def write_inventory_events(session):
+    """Store one event per changed box or container, in the transaction being committed."""
+    session.flush()
+    if 'inventory_changes' not in session.info:
+        return
+    changes = session.info.pop('inventory_changes')
+    connection = session.connection()
+    events = []
+    after = _box_snapshots(connection, list(changes['boxes']))
+    for box_id, before in sorted(changes['boxes'].items()):
+        events.append(box_event(before, after[box_id]))
+    after = _container_snapshots(connection, list(changes['containers']))
+    for container_id, before in sorted(changes['containers'].items()):
+        events.append(container_event(before, after[container_id]))
+    rows = [{'event_type': e['type'], 'payload': fast_json.dumps(e).decode('utf-8'), 'created_at': datetime.utcnow()}
+            for e in events if e is not None]
+    if rows:
+        connection.execute(insert(InventoryEvent), rows)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_inventory_changes(session):
+    session.info.pop('inventory_changes', None)
+
 @app.cli.command('init-db')
 def init_db_command():
     """Initialize the database."""
-    db.create_all()
-    print('Initialized the database.')
+    for site, engine in site_engines():
+        db.metadata.create_all(engine)
+        print(f'Initialized the database for site {site}.')
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text box search index from the box tables."""
+    if not search_index_available:
+        print('This SQLite build does not include FTS5; search is unavailable.')
+        return
+    with site_engine(db).begin() as connection:
+        indexed = rebuild_search_index(connection)
+    print(f'Indexed {indexed} boxes.')
+
+@app.cli.command('cleanup-jobs')
+def cleanup_jobs_command():
+    """Delete background jobs and result files older than JOBS_RETENTION_HOURS."""
+    removed = _cleanup_old_jobs(active_site())
+    print(f'Removed {removed} old jobs.')
 
 @app.cli.command('assign-container-numbers')
-def assign_container_numbers_command():
+@click.option('--batch-size', default=100, show_default=True, help='Containers numbered per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report which numbers would be assigned.')
+@click.option('--yes', is_flag=True, help='Assign without asking for confirmation.')
+def assign_container_numbers_command(batch_size, dry_run, yes):
     """Assign container numbers to existing containers that don't have them. (Optional - for tracking purposes only)"""
-    containers_without_numbers = Container.query.filter_by(container_number=None).all()
-    
-    if not containers_without_numbers:
+    with site_engine(db).connect() as connection:
+        remaining = count_unnumbered_containers(connection)
+        next_number = highest_container_number(connection, ARCHIVE_PREFIX) + 1
+    if not remaining:
         print('All containers already have container numbers.')
         return
-    
-    print(f'Found {len(containers_without_numbers)} containers without container numbers:')
-    for container in containers_without_numbers:
-        print(f'  - "{container.name}"')
-    
+
+    print(f'Found {remaining} containers without container numbers; '
+          f'they would get numbers {next_number} to {next_number + remaining - 1}.')
+    if dry_run:
+        return
+
     print('\nNote: Container numbers are optional and only needed for tracking shipping containers.')
-    confirm = input('Do you want to assign sequential numbers to these containers? (y/n): ').lower().strip()
-    
-    if confirm != 'y':
-        print('Operation cancelled.')
+    if not yes:
+        confirm = input('Do you want to assign sequential numbers to these containers? (y/n): ').lower().strip()
+        if confirm != 'y':
+            print('Operation cancelled.')
+            return
+
+    # Each batch is committed on its own, so an interrupted run simply
+    # continues with the containers that are still unnumbered
+    assigned = 0
+    while True:
+        containers = db.session.execute(
+            select(Container).where(Container.container_number.is_(None)).order_by(Container.id).limit(batch_size)
+        ).scalars().all()
+        if not containers:
+            break
+        first_number = highest_container_number(db.session.connection(), ARCHIVE_PREFIX) + 1
+        for offset, container in enumerate(containers):
+            container.container_number = str(first_number + offset)
+        db.session.commit()
+        assigned += len(containers)
+        print(f'Assigned numbers {first_number} to {first_number + len(containers) - 1} '
+              f'({assigned}/{remaining} containers).')
+    print(f'Assigned container numbers to {assigned} containers.')
+
+@app.cli.command('find-orphans')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows scanned per transaction.')
+@click.option('--delete', is_flag=True, help='Delete the orphaned rows that are found.')
+@click.option('--dry-run', is_flag=True, help='With --delete, only report what would be deleted.')
+@click.option('--restart', is_flag=True, help='Start over instead of resuming an interrupted run.')
+def find_orphans_command(batch_size, delete, dry_run, restart):
+    """Find box contents and custom boxes whose box or container no longer exists."""
+    deleting = delete and not dry_run
+    for table in ORPHAN_CHECKS:
+        # Dry runs change nothing, not even the checkpoints
+        task = f"{'delete' if deleting else 'find'}-orphans:{table}"
+        with site_engine(db).begin() as connection:
+            checkpoint = None if restart or dry_run else load_checkpoint(connection, task)
+        last_id, found = checkpoint or (0, 0)
+        if checkpoint:
+            print(f'{table}: resuming after id {last_id} ({found} orphaned rows found before).')
+
+        while True:
+            with site_engine(db).begin() as connection:
+                end_id = chunk_end(connection, table, last_id, batch_size)
+                if end_id is None:
+                    if not dry_run:
+                        clear_checkpoint(connection, task)
+                    break
+                orphans = orphaned_ids(connection, table, last_id, end_id)
+                if deleting:
+                    delete_rows(connection, table, orphans)
+                if not dry_run:
+                    save_checkpoint(connection, task, end_id, found + len(orphans))
+            last_id, found = end_id, found + len(orphans)
+            if orphans:
+                print(f'{table}: ids {orphans[0]}..{orphans[-1]}: {len(orphans)} orphaned rows'
+                      f'{" deleted" if deleting else ""} (scanned up to id {end_id}).')
+            else:
+                print(f'{table}: scanned up to id {end_id}, {found} orphaned rows so far.')
+
+        action = 'Deleted' if deleting else 'Would delete' if delete else 'Found'
+        print(f'{action} {found} orphaned {table} rows.')
+
+@app.cli.command('optimize-db')
+@click.option('--analyze', 'full', is_flag=True, help='Run a full ANALYZE instead of PRAGMA optimize.')
+@click.option('--dry-run', is_flag=True, help='Only print the statement that would run.')
+def optimize_db_command(full, dry_run):
+    """Refresh the query planner statistics."""
+    # PRAGMA optimize only re-analyzes tables whose statistics look stale,
+    # reading at most analysis_limit rows of each index
+    statements = ['ANALYZE'] if full else ['PRAGMA analysis_limit = 1000', 'PRAGMA optimize']
+    if dry_run:
+        print(f'Would run on site {active_site()}: {"; ".join(statements)}')
         return
-    
-    # Find the highest existing container number
-    max_number = 0
-    containers_with_numbers = Container.query.filter(Container.container_number != None).all()
-    for container in containers_with_numbers:
-        try:
-            number = int(container.container_number)
-            if number > max_number:
-                max_number = number
-        except ValueError:
+    start = time.perf_counter()
+    with site_engine(db).begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    print(f'Ran {"; ".join(statements)} on site {active_site()} in {time.perf_counter() - start:.2f}s.')
+
+# Seconds between progress lines of vacuum-db
+VACUUM_PROGRESS_INTERVAL = 5
+
+@app.cli.command('vacuum-db')
+@click.option('--pages', default=1000, show_default=True, help='Free pages released per step.')
+@click.option('--enable-incremental', is_flag=True,
+              help='Switch the database to incremental auto-vacuum first (one full VACUUM).')
+@click.option('--dry-run', is_flag=True, help='Only report how much space would be released.')
+def vacuum_db_command(pages, enable_incremental, dry_run):
+    """Give the free pages of the database file back to the file system, a few at a time."""
+    with site_engine(db).connect() as connection:
+        stats = database_stats(connection)
+    free_mb = stats['freelist_count'] * stats['page_size'] / 1024 / 1024
+    print(f"{stats['freelist_count']} of {stats['page_count']} pages are free ({free_mb:.1f} MB).")
+
+    if stats['auto_vacuum'] != 2:
+        if not enable_incremental:
+            print('Incremental vacuum is not enabled for this database; run with --enable-incremental once '
+                  '(it rewrites the whole file with VACUUM, so do it when the app is idle).')
+            return
+        if dry_run:
+            print('Would enable incremental auto-vacuum and run VACUUM.')
+            return
+        # VACUUM cannot run inside a transaction
+        with site_engine(db).connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            connection.exec_driver_sql('VACUUM')
+        print('Enabled incremental auto-vacuum; the free pages were released by VACUUM.')
+        return
+
+    if dry_run:
+        print(f'Would release {stats["freelist_count"]} pages, {pages} per step.')
+        return
+    released = 0
+    last_report = time.monotonic()
+    while True:
+        with site_engine(db).connect() as connection:
+            before = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+            if not before:
+                break
+            # The pragma frees one page per step of the statement, and only
+            # executescript() steps it to the end; each call is its own transaction
+            connection.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+            freed = before - connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+        if freed <= 0:
+            # auto_vacuum was switched off meanwhile, or other writers free pages as fast
+            print(f'A step released no pages ({before} still free); stopping.')
+            break
+        released += freed
+        if time.monotonic() - last_report >= VACUUM_PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            print(f'Released {released}/{stats["freelist_count"]} pages.')
+    print(f'Released {released} pages.')
+
+@app.cli.command('check-db')
+@click.option('--quick', is_flag=True, help='Use PRAGMA quick_check, which skips the index contents.')
+def check_db_command(quick):
+    """Run SQLite's integrity and foreign key checks; exits non-zero if anything is wrong."""
+    start = time.perf_counter()
+    with site_engine(db).connect() as connection:
+        problems = integrity_problems(connection, quick)
+    for problem in problems[:100]:
+        print(problem)
+    if len(problems) > 100:
+        print(f'... and {len(problems) - 100} more.')
+    if problems:
+        raise click.ClickException(f'{len(problems)} problems found on site {active_site()}.')
+    print(f'Site {active_site()} is healthy ({time.perf_counter() - start:.2f}s).')
+
+# Relative frequency of each product type in generated boxes, with a typical
+# per-unit weight in lbs and the range of quantities found in one box
+SYNTHETIC_PRODUCTS = {
+    'Laptops': (25, 5.0, (5, 40)),
+    'PCs': (20, 18.0, (2, 15)),
+    'LCDs': (30, 9.0, (5, 30)),
+    'Servers': (5, 45.0, (1, 6)),
+    'Switches': (5, 8.0, (2, 20)),
+    'Wires': (7, 1.0, (10, 80)),
+    'Keyboards': (5, 2.0, (10, 60)),
+    'Stands': (3, 3.0, (5, 30)),
+}
+
+# Relative frequency of each LCD size in generated boxes
+SYNTHETIC_LCD_SIZES = {
+    '24"': 30, '22"': 15, '19"W': 12, '20"W': 10, '17"S': 8,
+    '19"S': 8, '20"S': 7, '23"': 5, 'Borderless 24"': 5,
+}
+
+# Empty gaylord/pallet weight in lbs added to every generated box
+SYNTHETIC_TARE_WEIGHT = 40.0
+
+def generate_warehouse_data(box_count, container_count=0, container_fill=0.5,
+                            custom_boxes_per_container=2, days=365, seed=None,
+                            batch_size=5000):
+    """Insert synthetic boxes, contents, containers and custom boxes.
+
+    Rows are appended to whatever is already in the database, using bulk
+    inserts with explicit primary keys so 100k boxes load in seconds.
+    Returns a dict with the number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    products = list(SYNTHETIC_PRODUCTS)
+    product_weights = [SYNTHETIC_PRODUCTS[p][0] for p in products]
+    sizes = list(SYNTHETIC_LCD_SIZES)
+    size_weights = list(SYNTHETIC_LCD_SIZES.values())
+
+    # IDs and box numbers continue after the live and archived rows
+    def next_id(model, archived_model):
+        return max(db.session.query(func.max(m.id)).scalar() or 0 for m in (model, archived_model)) + 1
+
+    next_box_id = next_id(Box, ArchivedBox)
+    next_content_id = next_id(BoxContent, ArchivedBoxContent)
+    next_container_id = next_id(Container, ArchivedContainer)
+    max_number = int(_next_box_number()) - 1
+
+    # Containers are spread over the same period as boxes; boxes are only
+    # assigned to containers dated after the box was created
+    container_rows = []
+    for i in range(container_count):
+        container_rows.append({
+            'id': next_container_id + i,
+            'name': f'Synthetic Container {next_container_id + i}',
+            'date': now - timedelta(days=rng.uniform(0, days)),
+        })
+    container_rows.sort(key=lambda row: row['date'])
+    container_dates = [row['date'] for row in container_rows]
+    if container_rows:
+        db.session.execute(insert(Container), container_rows)
+
+    custom_box_rows = []
+    for row in container_rows:
+        for _ in range(custom_boxes_per_container):
+            product = rng.choices(products, product_weights)[0]
+            low, high = SYNTHETIC_PRODUCTS[product][2]
+            quantity = rng.randint(low, high)
+            custom_box_rows.append({
+                'container_id': row['id'],
+                'product_type': product,
+                'quantity': quantity,
+                'weight': round(quantity * SYNTHETIC_PRODUCTS[product][1] + SYNTHETIC_TARE_WEIGHT, 1),
+            })
+    if custom_box_rows:
+        db.session.execute(insert(CustomBox), custom_box_rows)
+
+    inserted = {'boxes': 0, 'contents': 0, 'containers': len(container_rows),
+                'custom_boxes': len(custom_box_rows)}
+    for start in range(0, box_count, batch_size):
+        box_rows = []
+        content_rows = []
+        for offset in range(start, min(start + batch_size, box_count)):
+            box_id = next_box_id + offset
+            created_at = now - timedelta(days=rng.uniform(0, days))
+            box_type = 'detailed' if rng.random() < 0.3 else 'simple'
+            sections = ['bottom', 'middle', 'top'] if box_type == 'detailed' else ['total']
+
+            weight = SYNTHETIC_TARE_WEIGHT
+            for section in sections:
+                for product in set(rng.choices(products, product_weights, k=rng.randint(1, 3))):
+                    low, high = SYNTHETIC_PRODUCTS[product][2]
+                    quantity = rng.randint(low, high)
+                    weight += quantity * SYNTHETIC_PRODUCTS[product][1]
+                    content_rows.append({
+                        'id': next_content_id,
+                        'box_id': box_id,
+                        'section': section,
+                        'product_type': product,
+                        'quantity': quantity,
+                        'lcd_size': rng.choices(sizes, size_weights)[0] if product == 'LCDs' else None,
+                    })
+                    next_content_id += 1
+
+            container_id = None
+            if container_dates and rng.random() < container_fill:
+                # Pick any container dated after the box was created
+                first = bisect.bisect_left(container_dates, created_at)
+                if first < len(container_rows):
+                    container_id = container_rows[rng.randrange(first, len(container_rows))]['id']
+
+            box_rows.append({
+                'id': box_id,
+                'box_number': str(max_number + offset + 1),
+                'weight': round(weight * rng.uniform(0.95, 1.05), 1),
+                'box_type': box_type,
+                'created_at': created_at,
+                'container_id': container_id,
+            })
+
+        db.session.execute(insert(Box), box_rows)
+        db.session.execute(insert(BoxContent), content_rows)
+        db.session.commit()
+        inserted['boxes'] += len(box_rows)
+        inserted['contents'] += len(content_rows)
+
+    db.session.commit()
+    return inserted
+
+@app.cli.command('generate-data')
+@click.option('--boxes', default=1000, show_default=True, help='Number of boxes to create.')
+@click.option('--containers', default=None, type=int, help='Number of containers to create (default: one per 100 boxes).')
+@click.option('--container-fill', default=0.5, show_default=True, help='Fraction of boxes assigned to containers.')
+@click.option('--custom-boxes', default=2, show_default=True, help='Custom boxes per container.')
+@click.option('--days', default=365, show_default=True, help='Spread creation dates over this many past days.')
+@click.option('--seed', default=None, type=int, help='Random seed for reproducible data.')
+def generate_data_command(boxes, containers, container_fill, custom_boxes, days, seed):
+    """Fill the database with synthetic boxes and containers for local testing."""
+    if containers is None:
+        containers = max(1, boxes // 100)
+    for site, engine in site_engines():
+        db.metadata.create_all(engine)
+    inserted = generate_warehouse_data(
+        boxes,
+        container_count=containers,
+        container_fill=container_fill,
+        custom_boxes_per_container=custom_boxes,
+        days=days,
+        seed=seed,
+    )
+    print(f"Created {inserted['boxes']} boxes ({inserted['contents']} content rows), "
+          f"{inserted['containers']} containers and {inserted['custom_boxes']} custom boxes.")
+    # Bulk inserts bypass the ORM events that maintain the search index
+    if search_index_available:
+        with site_engine(db).begin() as connection:
+            rebuild_search_index(connection)
+        print('Rebuilt the search index.')
+
+def _as_date(value):
+    return date.fromisoformat(value) if value else None
+
+def _snapshot_groups(box_model, content_model, container_model, custom_model, end):
+    """Box, content and custom box groups for daily_rollups from one set of tables (live or archived)."""
+    created_day = func.date(box_model.created_at)
+    # Boxes in a container count as containerized from the container's date
+    containerized_day = case(
+        (box_model.container_id.is_(None), None),
+        else_=func.coalesce(func.date(container_model.date), created_day),
+    )
+    in_range = and_(box_model.created_at.isnot(None), created_day <= end.isoformat())
+    connection = db.session.connection()
+
+    box_groups = [
+        (_as_date(created), _as_date(containerized), count, weight)
+        for created, containerized, count, weight in connection.execute(
+            select(created_day, containerized_day, func.count(box_model.id), func.sum(box_model.weight))
+            .outerjoin(container_model, container_model.id == box_model.container_id)
+            .where(in_range)
+            .group_by(created_day, containerized_day)
+        )
+    ]
+    content_groups = [
+        (_as_date(created), _as_date(containerized), product_type, lcd_size, quantity)
+        for created, containerized, product_type, lcd_size, quantity in connection.execute(
+            select(created_day, containerized_day, content_model.product_type, content_model.lcd_size,
+                   func.sum(content_model.quantity))
+            .join(content_model, content_model.box_id == box_model.id)
+            .outerjoin(container_model, container_model.id == box_model.container_id)
+            .where(in_range)
+            .group_by(created_day, containerized_day, content_model.product_type, content_model.lcd_size)
+        )
+    ]
+    container_day = func.date(container_model.date)
+    custom_groups = [
+        (_as_date(day), count, weight, product_type, quantity)
+        for day, count, weight, product_type, quantity in connection.execute(
+            select(container_day, func.count(custom_model.id), func.sum(custom_model.weight),
+                   custom_model.product_type, func.sum(custom_model.quantity))
+            .join(container_model, container_model.id == custom_model.container_id)
+            .where(container_model.date.isnot(None), container_day <= end.isoformat())
+            .group_by(container_day, custom_model.product_type)
+        )
+    ]
+    return box_groups, content_groups, custom_groups
+
+def compute_daily_snapshots(start, end):
+    """
+    Reconstruct daily totals from `start` to `end` with three grouped queries
+    over the live tables and three over the archive, so archiving containers
+    does not change the days they were counted in.
+    """
+    live = _snapshot_groups(Box, BoxContent, Container, CustomBox, end)
+    archived = _snapshot_groups(ArchivedBox, ArchivedBoxContent, ArchivedContainer, ArchivedCustomBox, end)
+    return daily_rollups(*(live_groups + archived_groups for live_groups, archived_groups in zip(live, archived)),
+                         start, end)
+
+@app.cli.command('snapshot-inventory')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Day to snapshot (default: today, UTC).')
+@click.option('--backfill-days', default=0, show_default=True,
+              help='Also reconstruct snapshots for this many earlier days that have none.')
+@click.option('--overwrite', is_flag=True, help='Replace existing snapshots of earlier days as well.')
+def snapshot_inventory_command(day, backfill_days, overwrite):
+    """Write daily inventory rollups. Safe to re-run; the target day is always replaced."""
+    end = day.date() if day else datetime.utcnow().date()
+    start = end - timedelta(days=backfill_days)
+    existing = set(db.session.execute(
+        select(InventorySnapshot.snapshot_date.distinct())
+        .where(InventorySnapshot.snapshot_date.between(start, end))
+    ).scalars())
+
+    written = 0
+    for snapshot_date, snapshot in compute_daily_snapshots(start, end).items():
+        if snapshot_date != end and snapshot_date in existing and not overwrite:
             continue
-    
-    # Assign numbers to containers without them
-    next_number = max_number + 1
-    for container in containers_without_numbers:
-        container.container_number = str(next_number)
-        print(f'Assigned container number {next_number} to container "{container.name}"')
-        next_number += 1
-    
+        db.session.execute(InventorySnapshot.__table__.delete()
+                           .where(InventorySnapshot.snapshot_date == snapshot_date))
+        db.session.execute(insert(InventorySnapshot), snapshot_rows(snapshot_date, snapshot))
+        written += 1
     db.session.commit()
-    print(f'Assigned container numbers to {len(containers_without_numbers)} containers.')
+    print(f'Wrote inventory snapshots for {written} day(s) ending {end.isoformat()}.')
+
+@app.cli.command('archive-containers')
+@click.option('--older-than-days', default=365, show_default=True,
+              help='Archive containers dated more than this many days ago.')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Archive containers dated before this day instead.')
+@click.option('--batch-size', default=50, show_default=True, help='Containers moved per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be moved.')
+def archive_containers_command(older_than_days, before, batch_size, dry_run):
+    """Move old containers with their boxes and contents into the archive tables."""
+    cutoff = before or datetime.utcnow() - timedelta(days=older_than_days)
+    with site_engine(db).connect() as connection:
+        outdated = tables_reusing_ids(connection)
+    if outdated:
+        raise click.ClickException(f'{", ".join(outdated)} would reuse archived IDs; run `flask db upgrade` first.')
+
+    if dry_run:
+        with site_engine(db).connect() as connection:
+            container_ids = archivable_container_ids(connection, cutoff, limit=2 ** 31)
+            totals = {}
+            for start in range(0, len(container_ids), batch_size):
+                for table, count in count_owned_rows(connection, container_ids[start:start + batch_size]).items():
+                    totals[table] = totals.get(table, 0) + count
+        print(f'Would archive {len(container_ids)} containers dated before {cutoff:%Y-%m-%d}: '
+              + ', '.join(f'{count} {table} rows' for table, count in totals.items()))
+        return
+
+    archived = 0
+    while True:
+        # One transaction per batch keeps write locks short for the running app
+        with site_engine(db).begin() as connection:
+            container_ids = archivable_container_ids(connection, cutoff, batch_size)
+            if not container_ids:
+                break
+            box_ids = list(connection.execute(select(Box.id).where(Box.container_id.in_(container_ids))).scalars())
+            containers_moved = connection.execute(
+                select(Container.id, Container.name, Container.container_number)
+                .where(Container.id.in_(container_ids))
+            ).all()
+            moved = archive_containers(connection, container_ids, ARCHIVE_PREFIX)
+            if search_index_available and box_ids:
+                reindex_boxes(connection, box_ids)
+            connection.execute(insert(InventoryEvent), [
+                {'event_type': 'container_archived', 'created_at': datetime.utcnow(),
+                 'payload': fast_json.dumps({
+                     'type': 'container_archived',
+                     'container': {'id': row.id, 'name': row.name, 'container_number': row.container_number},
+                     'deltas': [],
+                 }).decode('utf-8')}
+                for row in containers_moved
+            ])
+        archived += len(container_ids)
+        print(f"Archived {archived} containers so far ({moved['box']} boxes, "
+              f"{moved['box_content']} content rows in this batch).")
+    print(f'Archived {archived} containers dated before {cutoff:%Y-%m-%d}.')
+
+def database_files(site):
+    """(snapshot prefix, file path) of each SQLite file `site` uses."""
+    files = [(site, site_engine(db, site).url.database)]
+    if ARCHIVE_SCHEMA:
+        files.append((f'{site}-archive', archive_database_path(site)))
+    return [(prefix, path) for prefix, path in files if path and path != ':memory:']
+
+def backup_site(site, compress=None, keep=None):
+    """Snapshot every database file of `site` and prune old snapshots; returns the BackupResults."""
+    results = []
+    for prefix, path in database_files(site):
+        if not os.path.exists(path):
+            continue
+        result = backup_database(
+            path, app.config['BACKUP_DIR'], prefix,
+            step_pages=app.config['BACKUP_STEP_PAGES'],
+            pause=app.config['BACKUP_STEP_PAUSE'],
+            compress=app.config['BACKUP_COMPRESS'] if compress is None else compress,
+        )
+        prune_snapshots(app.config['BACKUP_DIR'], prefix, app.config['BACKUP_KEEP'] if keep is None else keep)
+        logger.info(f'Backed up {path} to {result.path} in {result.seconds:.2f}s '
+                    f'({result.megabytes_per_second:.1f} MB/s, {result.restarts} restarts)')
+        results.append(result)
+    return results
+
+def backup_due():
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['BACKUP_INTERVAL_HOURS'])
+    for site in app.config['SITES']:
+        latest = latest_snapshot_time(app.config['BACKUP_DIR'], site)
+        if latest is None or latest < cutoff:
+            return True
+    return False
+
+def scheduled_backup():
+    with app.app_context():
+        for site in app.config['SITES']:
+            backup_site(site)
+
+backup_scheduler = BackupScheduler(
+    run=scheduled_backup,
+    due=backup_due,
+    lock_path=os.path.join(app.config['BACKUP_DIR'], '.backup.lock'),
+)
+
+@app.before_request
+def start_backup_scheduler():
+    if app.config['BACKUP_INTERVAL_HOURS'] > 0:
+        backup_scheduler.start()
+
+@app.cli.command('backup-db')
+@click.option('--site', 'sites', multiple=True, help='Site to back up (repeatable; default: every site).')
+@click.option('--compress/--no-compress', default=None, help='Gzip the snapshots (default: BACKUP_COMPRESS).')
+@click.option('--keep', type=int, default=None, help='Snapshots to keep per database (default: BACKUP_KEEP).')
+@click.option('--dry-run', is_flag=True, help='Only list what would be backed up.')
+def backup_db_command(sites, compress, keep, dry_run):
+    """Take consistent snapshots of the databases without stopping the app."""
+    unknown = [site for site in sites if site not in app.config['SITES']]
+    if unknown:
+        raise click.BadParameter(f'Unknown site(s): {", ".join(unknown)}', param_hint='--site')
+    for site in sites or app.config['SITES']:
+        if dry_run:
+            for prefix, path in database_files(site):
+                print(f'Would back up {path} to {app.config["BACKUP_DIR"]} as {prefix}-<timestamp>.db')
+            continue
+        for result in backup_site(site, compress, keep):
+            print(f'{result.path}: {result.database_bytes / 1024 / 1024:.1f} MB copied in {result.seconds:.2f}s '
+                  f'({result.megabytes_per_second:.1f} MB/s, {result.snapshot_bytes / 1024 / 1024:.1f} MB on disk, '
+                  f'{result.restarts} restarts).')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress CSS/JS for long-lived browser caching."""
+    manifest = build_assets(app.static_folder, app.config['ASSETS_DIR'])
+    for original, fingerprinted in sorted(manifest.items()):
+        print(f'{original} -> {fingerprinted}')
+    print(f'Built {len(manifest)} assets into {app.config["ASSETS_DIR"]}. Restart the app to use them.')
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template into the bytecode cache so workers start warm."""
+    if app.jinja_env.bytecode_cache is None:
+        print('Set TEMPLATE_CACHE_DIR to a directory to turn on the bytecode cache first.')
+        return
+    start = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    elapsed = time.perf_counter() - start
+    print(f'Compiled {len(names)} templates into {app.config["TEMPLATE_CACHE_DIR"]} in {elapsed:.2f}s.')
+
+@app.template_global()
+def asset_url(filename):
+    """URL for a static file, fingerprinted once `flask build-assets` has been run."""
+    fingerprinted = asset_manifest.get(filename)
+    if fingerprinted:
+        return url_for('fingerprinted_asset', filename=fingerprinted)
+    return url_for('static', filename=filename)
+
+# Size of the pieces a streamed page is sent in
+STREAM_BUFFER_SIZE = 8 * 1024
+
+def stream_page(template_name, **context):
+    """Render a large page incrementally instead of building it in memory first."""
+    # The session cookie is sent before the body streams, so consume the
+    # flashed messages now; base.html then reads them from the request.
+    get_flashed_messages(with_categories=True)
+
+    def buffered(chunks):
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_BUFFER_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    return Response(buffered(stream_template(template_name, **context)), mimetype='text/html')
 
 # Routes
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted asset, precompressed when the client accepts it."""
+    accepted = [encoding for encoding in ('br', 'gzip') if request.accept_encodings[encoding]]
+    variant, encoding = choose_variant(app.config['ASSETS_DIR'], filename, accepted)
+    response = send_from_directory(
+        app.config['ASSETS_DIR'],
+        variant,
+        mimetype=mimetypes.guess_type(filename)[0],
+    )
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # The file name changes whenever the content does, so it never needs revalidating
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/boxes')
 def boxes():
     # Get query parameter for showing boxes in containers (default: False)
     show_in_containers = request.args.get('show_in_containers', 'false')
     
     # Filter boxes based on toggle state
+    # Load every box's contents in one extra query instead of one per box
+    query = Box.query.options(selectinload(Box.contents))
     if show_in_containers == 'true':
-        all_boxes = Box.query.all()
+        all_boxes = query.all()
     else:
         # Default: only show available boxes (not in containers)
-        all_boxes = Box.query.filter_by(container_id=None).all()
+        all_boxes = query.filter_by(container_id=None).all()
     
     # Separate numeric and non-numeric box numbers for proper sorting
     numeric_boxes = []
@@ -213,7 +1217,7 @@ def boxes():
     # Combine with numeric first, then non-numeric
     boxes = numeric_boxes + non_numeric_boxes
     
-    return render_template('boxes.html', boxes=boxes, show_in_containers=show_in_containers)
+    return stream_page('boxes.html', boxes=boxes, show_in_containers=show_in_containers)
 
 
 @app.route('/api/voice/interpret-box', methods=['POST'])
@@ -244,59 +1248,325 @@ def api_voice_interpret_box():
     except ValueError as exc:
         return jsonify({'error': f'LLM parsing error: {exc}'}), 400
 
-    # If LLM chose to return an explicit error, pass it through
-    if isinstance(llm_result, dict) and llm_result.get('error'):
-        return jsonify({'error': llm_result.get('error')}), 400
+    merged = normalize_interpretation(llm_result, normalized_current, PRODUCT_TYPES)
+    if merged.get('error'):
+        return jsonify({'error': merged['error']}), 400
+    return jsonify(merged)
 
-    # Validate and normalize the successful structure
-    box_number = llm_result.get('box_number', normalized_current['box_number'])
-    weight = llm_result.get('weight', normalized_current['weight'])
-    contents = llm_result.get('contents', normalized_current['contents'])
-    notes = llm_result.get('notes', [])
+# Writes from routes (see write_queue.py)
 
-    # Normalize contents list
-    normalized_contents = []
-    for item in contents or []:
-        product_type = item.get('product_type')
-        quantity = item.get('quantity')
-        lcd_size = item.get('lcd_size')
+@contextmanager
+def _site_session(site):
+    with app.app_context(), use_site(site):
+        yield db.session
 
-        if not product_type or quantity is None:
-            continue
+write_queue = WriteQueue(
+    _site_session,
+    max_batch=app.config['WRITE_QUEUE_MAX_BATCH'],
+    max_delay=app.config['WRITE_QUEUE_MAX_DELAY'],
+    max_pending=app.config['WRITE_QUEUE_MAX_PENDING'],
+)
+
+def _claim_then(claim, fn):
+    idempotency.claim(db.session.connection(), *claim)
+    return fn()
+
+def write(fn):
+    """
+    Run `fn`, which changes the database through db.session, and commit it;
+    returns what fn returns. With WRITE_QUEUE_ENABLED fn runs in the site's
+    writer thread and is committed together with other requests' writes, so
+    it must load the objects it changes itself, must not use `request`, and
+    should return plain values rather than ORM objects.
+
+    In a request with an Idempotency-Key (see `idempotent`) the first write
+    also claims the key, in the same transaction; if another request with
+    that key committed first, nothing is written and KeyTaken is raised.
+    """
+    claim = g.pop('idempotency_claim', None) if has_request_context() else None
+    if claim is not None:
+        fn = partial(_claim_then, claim, fn)
+    try:
+        if not app.config['WRITE_QUEUE_ENABLED']:
+            try:
+                result = fn()
+                db.session.commit()
+            except idempotency.KeyTaken:
+                db.session.rollback()
+                raise
+        else:
+            # End this request's read transaction first; its shared lock would hold up the writer's commit
+            db.session.rollback()
+            result = write_queue.run(active_site(), fn, app.config['WRITE_QUEUE_TIMEOUT'])
+    except idempotency.KeyTaken:
+        g.idempotency_key_taken = True
+        raise
+    except BaseException:
+        if claim is not None:
+            g.idempotency_claim = claim
+        raise
+    if claim is not None:
+        g.idempotency_claimed = True
+    return result
+
+@app.errorhandler(WriteQueueBusy)
+def handle_write_queue_busy(error):
+    logger.warning(f'Write turned away: {error}')
+    if request.is_json or request.path.startswith('/api/'):
+        response = json_response({'error': str(error)}, 503)
+        response.headers['Retry-After'] = '1'
+        return response
+    flash(f'The database is busy: {error}', 'error')
+    return redirect(request.referrer or url_for('index'), 303)
+
+# Idempotency-Key support for write endpoints (see idempotency.py)
+
+IDEMPOTENCY_EVICT_INTERVAL = 60  # seconds between evictions of old keys, per site
+_last_idempotency_eviction = {}
+
+def _idempotency_key():
+    """Key from the Idempotency-Key header, or an idempotency_key JSON/form field."""
+    key = request.headers.get('Idempotency-Key')
+    if key is None and request.is_json:
+        data = request.get_json(silent=True)
+        key = data.get('idempotency_key') if isinstance(data, dict) else None
+    elif key is None:
+        key = request.form.get('idempotency_key')
+    return key or None
+
+def _request_fingerprint():
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = {name: value for name, value in payload.items() if name != 'idempotency_key'}
+    else:
+        payload = {name: request.form.getlist(name) for name in request.form if name != 'idempotency_key'}
+    return idempotency.fingerprint(payload)
+
+def _idempotency_error(message, status):
+    if request.is_json:
+        return json_response({'error': message}, status)
+    flash(message, 'error')
+    return redirect(request.path, 303)
+
+def _replay_response(stored):
+    if stored.status_code == idempotency.RESPONSE_PENDING:
+        pending = (datetime.utcnow() - stored.created_at).total_seconds()
+        if pending < app.config['IDEMPOTENCY_PENDING_SECONDS']:
+            return _idempotency_error('This request is still being processed; try again shortly.', 409)
+        # The write committed but its request died before storing the response
+        if not request.is_json:
+            flash('This form was already submitted; nothing was saved twice.', 'info')
+            return redirect(request.path, 303)
+        response = json_response({'success': True, 'message': 'This request was already processed; '
+                                  'its original response was not kept.'}, 200)
+    elif 300 <= stored.status_code < 400:
+        flash('This form was already submitted; nothing was saved twice.', 'info')
+        return redirect(stored.body, 303)
+    else:
+        response = app.response_class(stored.body, status=stored.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _stored_response(response):
+    """(status, body) to replay; a rendered page is replayed as a redirect back to the form."""
+    if response.is_json:
+        return response.status_code, response.get_data(as_text=True)
+    if 300 <= response.status_code < 400:
+        return response.status_code, response.location
+    return 303, request.path
+
+def _replay_for_taken_key(stored, request_fingerprint):
+    """Response to a request whose key another request used first."""
+    if stored is None:
+        # Evicted in the meantime; the write still happened
+        return _idempotency_error('This request was already processed.', 409)
+    if stored.fingerprint != request_fingerprint:
+        return _idempotency_error('Idempotency-Key was already used for a different request', 422)
+    return _replay_response(stored)
+
+def _complete_idempotency_key(scope, key, stored_response):
+    """Store the response for a claimed key, evicting old keys in the same transaction when due."""
+    site = active_site()
+    now = time.monotonic()
+    evict = now - _last_idempotency_eviction.get(site, 0.0) >= IDEMPOTENCY_EVICT_INTERVAL
+    if evict:
+        _last_idempotency_eviction[site] = now
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['IDEMPOTENCY_TTL_HOURS'])
+
+    def save():
+        connection = db.session.connection()
+        idempotency.complete(connection, scope, key, *stored_response)
+        return idempotency.evict(connection, cutoff, app.config['IDEMPOTENCY_MAX_KEYS']) if evict else 0
+
+    evicted = write(save)
+    if evicted:
+        logger.info(f'Evicted {evicted} idempotency keys')
+
+def _discard_flashes(keep):
+    """Drop the messages flashed after the first `keep`, e.g. a duplicate's own validation error."""
+    flashes = session.get('_flashes')
+    if flashes and len(flashes) > keep:
+        session['_flashes'] = flashes[:keep]
+
+def idempotent(view):
+    """
+    Let clients retry a POST safely by sending an Idempotency-Key header (or
+    idempotency_key field). The view's first write() claims the key in the
+    same transaction, and its response is stored once the view returns;
+    later requests with the same key and body get that response back
+    without running the view. Requests that wrote nothing (e.g. failed
+    validation) never take the key. The view must commit through write().
+    """
+    scope = view.__name__
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _idempotency_key() if request.method == 'POST' else None
+        if key is None:
+            return view(*args, **kwargs)
+        if not idempotency.valid_key(key):
+            return _idempotency_error(
+                f'Idempotency-Key must be 1 to {idempotency.MAX_KEY_LENGTH} characters', 400)
 
+        request_fingerprint = _request_fingerprint()
+        stored = idempotency.lookup(db.session.connection(), scope, key)
+        if stored is not None:
+            if stored.fingerprint != request_fingerprint:
+                return _idempotency_error('Idempotency-Key was already used for a different request', 422)
+            return _replay_response(stored)
+
+        g.idempotency_claim = (scope, key, request_fingerprint)
+        flashed = len(session.get('_flashes', ()))
         try:
-            quantity_int = int(quantity)
-        except (TypeError, ValueError):
-            continue
-        if quantity_int <= 0:
-            continue
+            response = app.make_response(view(*args, **kwargs))
+        except idempotency.KeyTaken:
+            response = None
+        finally:
+            g.pop('idempotency_claim', None)
+        if g.pop('idempotency_key_taken', False):
+            # The view may have caught KeyTaken and rendered an error; the duplicate gets the replay instead
+            db.session.rollback()
+            _discard_flashes(flashed)
+            return _replay_for_taken_key(idempotency.lookup(db.session.connection(), scope, key),
+                                         request_fingerprint)
+        if g.pop('idempotency_claimed', False):
+            _complete_idempotency_key(scope, key, _stored_response(response))
+        else:
+            # A duplicate running alongside the first request can fail the view's own checks
+            # (e.g. "box number exists") once that request has written, and form views report
+            # that with a redirect or a re-rendered form rather than an error status; it gets
+            # the replay too
+            db.session.rollback()
+            stored = idempotency.lookup(db.session.connection(), scope, key)
+            if stored is not None:
+                _discard_flashes(flashed)
+                return _replay_for_taken_key(stored, request_fingerprint)
+        return response
+    return wrapper
 
-        # Only allow known product types
-        if product_type not in ['Laptops', 'PCs', 'LCDs', 'Servers',
-                                'Switches', 'Wires', 'Keyboards', 'Stands']:
-            continue
+# <option> lists for the box forms' selects, keyed by the name passed to select_options()
+SELECT_OPTIONS = {
+    'product': ('Select Product Type', PRODUCT_TYPES, ('Other', 'Other (specify)')),
+    'lcd_size': ('Select LCD Size', LCD_SIZES, ('Custom', 'Custom Size')),
+}
 
-        normalized_contents.append(
-            {
-                'product_type': product_type,
-                'quantity': quantity_int,
-                'lcd_size': lcd_size if product_type == 'LCDs' else None,
-            }
-        )
+@app.template_global()
+def select_options(name, selected=None):
+    """
+    The options of a box form select, with `selected` chosen; a value not in
+    the standard list selects the Other/Custom entry. Memoised, since there
+    are only a dozen distinct lists and every box form row renders one.
+    """
+    values = SELECT_OPTIONS[name][1]
+    if selected and selected not in values:
+        selected = SELECT_OPTIONS[name][2][0]
+    return _render_select_options(name, selected or None)
 
-    if not normalized_contents and not box_number and weight is None:
-        return jsonify({'error': 'Could not parse any usable data from speech'}), 400
+app.jinja_env.globals.update(PRODUCT_TYPES=PRODUCT_TYPES, LCD_SIZES=LCD_SIZES)
 
-    return jsonify(
-        {
-            'box_number': box_number,
-            'weight': weight,
-            'contents': normalized_contents,
-            'notes': notes,
-        }
+@lru_cache(maxsize=None)
+def _render_select_options(name, selected):
+    placeholder, values, (other_value, other_label) = SELECT_OPTIONS[name]
+    options = [Markup('<option value="">{}</option>').format(placeholder)]
+    for value, label in [(value, value) for value in values] + [(other_value, other_label)]:
+        options.append(Markup('<option value="{}"{}>{}</option>').format(
+            value, Markup(' selected') if value == selected else '', label))
+    return Markup('\n').join(options)
+
+@app.template_global()
+def new_idempotency_key():
+    """A fresh key for a form's hidden idempotency_key field."""
+    return uuid.uuid4().hex
+
+def _archived_box_number(box_number):
+    """
+    Whether an archived box has `box_number`. Archived boxes keep their
+    numbers, so a new or renamed box may not take one of them either.
+    """
+    return db.session.execute(
+        select(ArchivedBox.id).where(ArchivedBox.box_number == str(box_number)).limit(1)
+    ).first() is not None
+
+def _next_box_number():
+    """
+    Number suggested for a new box: one past the highest all-digit box
+    number, live or archived, since archived numbers stay reserved.
+    """
+    numbers = union_all(*(
+        select(model.box_number.label('box_number'))
+        .where(model.box_number != '', model.box_number.op('NOT GLOB')('*[^0-9]*'))
+        for model in (Box, ArchivedBox)
+    )).subquery()
+    highest = db.session.execute(select(func.max(cast(numbers.c.box_number, Integer)))).scalar()
+    return str((highest or 0) + 1)
+
+def _archived_container_number(container_number):
+    """Whether an archived container has `container_number`, which stays reserved like box numbers."""
+    return db.session.execute(
+        select(ArchivedContainer.id).where(ArchivedContainer.container_number == container_number).limit(1)
+    ).first() is not None
+
+def _api_box_error(data):
+    """Why a box payload from voice entry can't be saved, or None if it can."""
+    if not data.get('box_number'):
+        return 'Box number is required'
+    if data.get('weight') is None:
+        return 'Weight is required'
+    try:
+        float(data['weight'])
+        for item in data.get('contents') or []:
+            if item.get('product_type') and item.get('quantity'):
+                int(item['quantity'])
+    except (TypeError, ValueError, AttributeError):
+        return 'Weight and quantities must be numbers'
+    return None
+
+def _add_api_box(data):
+    """Add a simple box with 'total' contents from a validated voice entry payload."""
+    box = Box(
+        box_number=str(data['box_number']),
+        weight=float(data['weight']),
+        box_type='simple'
     )
+    db.session.add(box)
+    for item in data.get('contents') or []:
+        product_type = item.get('product_type')
+        quantity = item.get('quantity')
+        lcd_size = item.get('lcd_size')
+
+        if product_type and quantity:
+            db.session.add(BoxContent(
+                box=box,
+                section='total',
+                product_type=product_type,
+                quantity=int(quantity),
+                lcd_size=lcd_size
+            ))
+    return box
 
 @app.route('/api/boxes', methods=['POST'])
+@idempotent
 def api_create_box():
     """API endpoint for creating boxes via JSON (used by voice entry)"""
     data = request.get_json()
@@ -304,76 +1574,970 @@ def api_create_box():
     if not data:
         return jsonify({'error': 'No JSON data provided'}), 400
     
-    box_number = data.get('box_number')
-    weight = data.get('weight')
-    contents = data.get('contents', [])
-    
-    if not box_number:
-        return jsonify({'error': 'Box number is required'}), 400
-    if weight is None:
-        return jsonify({'error': 'Weight is required'}), 400
+    error = _api_box_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+    box_number = data['box_number']
     
     # Check if box number already exists
     if Box.query.filter_by(box_number=str(box_number)).first():
         return jsonify({'error': f'Box number {box_number} already exists'}), 400
+    if _archived_box_number(box_number):
+        return jsonify({'error': f'Box number {box_number} belongs to an archived box'}), 400
     
+    def save():
+        box = _add_api_box(data)
+        db.session.flush()
+        return box.id
+
     try:
-        box = Box(
-            box_number=str(box_number),
-            weight=float(weight),
-            box_type='simple'
-        )
-        db.session.add(box)
-        
-        # Process contents
-        for item in contents:
-            product_type = item.get('product_type')
-            quantity = item.get('quantity')
-            lcd_size = item.get('lcd_size')
-            
-            if product_type and quantity:
-                content = BoxContent(
-                    box=box,
-                    section='total',
-                    product_type=product_type,
-                    quantity=int(quantity),
-                    lcd_size=lcd_size
-                )
-                db.session.add(content)
-        
-        db.session.commit()
+        box_id = write(save)
         return jsonify({
             'success': True,
             'message': f'Box {box_number} created successfully',
-            'box_id': box.id
+            'box_id': box_id
         }), 201
+    except WriteQueueBusy:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Largest batch the voice entry outbox may sync in one request
+BOX_BATCH_MAX = 100
+
+# Idempotency scope of boxes synced from the voice entry outbox
+BOX_IDEMPOTENCY_SCOPE = 'api_boxes'
+
+def _synced_batch_box(key, request_fingerprint):
+    """The result for a batch box whose key is already stored, or None if it isn't."""
+    stored = idempotency.lookup(db.session.connection(), BOX_IDEMPOTENCY_SCOPE, key)
+    if stored is None:
+        return None
+    if stored.fingerprint != request_fingerprint:
+        return {'idempotency_key': key, 'status': 'conflict',
+                'error': 'Idempotency key was already used for a different box'}
+    return dict(fast_json.loads(stored.body), status='already_synced')
+
+def _create_batch_box(item):
+    """
+    Create one box of a sync batch inside its own savepoint and return its
+    result. A key that already created a box returns that box again
+    ('already_synced'), so retrying a batch never creates a box twice.
+    """
+    key = item.get('idempotency_key') if isinstance(item, dict) else None
+    if not idempotency.valid_key(key):
+        return {'idempotency_key': key, 'status': 'invalid',
+                'error': f'idempotency_key must be a string of 1 to {idempotency.MAX_KEY_LENGTH} characters'}
+    box_data = {field: item.get(field) for field in ('box_number', 'weight', 'contents')}
+    request_fingerprint = idempotency.fingerprint(box_data)
+
+    synced = _synced_batch_box(key, request_fingerprint)
+    if synced is not None:
+        return synced
+
+    error = _api_box_error(box_data)
+    if error:
+        return {'idempotency_key': key, 'status': 'invalid', 'error': error}
+    box_number = str(box_data['box_number'])
+    existing_id = db.session.execute(select(Box.id).where(Box.box_number == box_number)).scalar()
+    if existing_id is not None:
+        # A sync of the same batch running alongside may have saved this very box since the lookup
+        return _synced_batch_box(key, request_fingerprint) or {
+            'idempotency_key': key, 'status': 'conflict', 'box_number': box_number,
+            'existing_box_id': existing_id, 'error': f'Box number {box_number} already exists'}
+    if _archived_box_number(box_number):
+        return {'idempotency_key': key, 'status': 'conflict', 'box_number': box_number,
+                'error': f'Box number {box_number} belongs to an archived box'}
+
+    try:
+        with db.session.begin_nested():
+            box = _add_api_box(box_data)
+            db.session.flush()
+            result = {'idempotency_key': key, 'status': 'created', 'box_id': box.id, 'box_number': box_number}
+            idempotency.remember(db.session.connection(), BOX_IDEMPOTENCY_SCOPE, key, request_fingerprint,
+                                 201, fast_json.dumps(result).decode('utf-8'))
+    except IntegrityError:
+        # Another request took the box number or the key between the check and the insert;
+        # if it was a sync of the same box, this box is saved
+        return _synced_batch_box(key, request_fingerprint) or {
+            'idempotency_key': key, 'status': 'conflict', 'box_number': box_number,
+            'error': f'Box number {box_number} already exists'}
+    return result
+
+@app.route('/api/boxes/batch', methods=['POST'])
+def api_create_boxes_batch():
+    """
+    Create boxes queued offline by voice entry, in one transaction. Each box
+    carries a client-generated idempotency_key and gets its own result:
+    created, already_synced, conflict (e.g. the box number exists) or invalid.
+    """
+    data = request.get_json(silent=True) or {}
+    boxes = data.get('boxes')
+    if not isinstance(boxes, list):
+        raise ApiError('boxes must be a list')
+    if len(boxes) > BOX_BATCH_MAX:
+        raise ApiError(f'At most {BOX_BATCH_MAX} boxes can be synced at once')
+
+    results = write(lambda: [_create_batch_box(item) for item in boxes])
+    created = sum(1 for result in results if result['status'] == 'created')
+    if created:
+        logger.info(f'Synced {created} boxes from a voice entry batch of {len(boxes)}')
+    return json_response({'results': results})
+
+
+# Page size limits for the read-only JSON API
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+
+BOX_API_FIELDS = ('id', 'box_number', 'weight', 'box_type', 'created_at', 'container_id', 'contents')
+CONTAINER_API_FIELDS = ('id', 'name', 'container_number', 'date', 'box_count', 'custom_box_count',
+                        'total_weight', 'totals', 'lcd_sizes')
+INVENTORY_API_FIELDS = ('box_count', 'total_weight', 'totals', 'lcd_sizes')
+
+class ApiError(Exception):
+    """A client error in an API request, returned as JSON with status 400."""
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return json_response({'error': str(error)}, 400)
+
+def json_response(payload, status=200):
+    return app.response_class(fast_json.dumps(payload), status=status, mimetype='application/json')
+
+def cached_json_response(payload):
+    """JSON response with an ETag; answers 304 if the client already has this version."""
+    response = json_response(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
+def _parse_fields(allowed, always=('id',)):
+    """Fields requested with ?fields=a,b (all of `allowed` when absent)."""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return [field for field in always if field not in fields] + fields
+
+def _parse_page():
+    try:
+        limit = int(request.args.get('limit', API_DEFAULT_LIMIT))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        raise ApiError('limit and after must be integers')
+    return max(1, min(limit, API_MAX_LIMIT)), after
+
+def _parse_datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f'{name} must be an ISO 8601 date or datetime')
+
+def _page_payload(rows, limit, endpoint):
+    """Trim rows fetched with limit + 1 and add the cursor for the next page."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = rows[-1]['id'] if has_more else None
+    next_url = url_for(endpoint, **{**request.args.to_dict(), 'after': next_after}) if has_more else None
+    return {'data': rows, 'next_after': next_after, 'next': next_url}
+
+def box_contents_by_id(box_ids):
+    """Content rows for the given boxes as plain dicts, keyed by box ID."""
+    contents = {box_id: [] for box_id in box_ids}
+    if not box_ids:
+        return contents
+    rows = db.session.execute(
+        select(BoxContent.box_id, BoxContent.section, BoxContent.product_type,
+               BoxContent.quantity, BoxContent.lcd_size)
+        .where(BoxContent.box_id.in_(box_ids))
+        .order_by(BoxContent.id)
+    )
+    for row in rows:
+        contents[row.box_id].append({
+            'section': row.section,
+            'product_type': row.product_type,
+            'quantity': row.quantity,
+            'lcd_size': row.lcd_size,
+        })
+    return contents
+
+def _empty_rollup():
+    return {'box_count': 0, 'custom_box_count': 0, 'total_weight': 0.0, 'totals': {}, 'lcd_sizes': {}}
+
+def _add_quantity(counts, key, quantity):
+    counts[key] = counts.get(key, 0) + (quantity or 0)
+
+# (box, box content, custom box) models for container_rollups
+LIVE_MODELS = (Box, BoxContent, CustomBox)
+ARCHIVED_MODELS = (ArchivedBox, ArchivedBoxContent, ArchivedCustomBox)
+
+def container_rollups(container_ids, models=None):
+    """
+    Box counts, weights and product/LCD totals per container, from grouped
+    queries. `models` are the (box, box content, custom box) models: the live
+    ones by default, or ARCHIVED_MODELS for archived containers.
+    """
+    box_model, content_model, custom_model = models or LIVE_MODELS
+    rollups = {container_id: _empty_rollup() for container_id in container_ids}
+    if not container_ids:
+        return rollups
+
+    for container_id, count, weight in db.session.execute(
+        select(box_model.container_id, func.count(box_model.id), func.sum(box_model.weight))
+        .where(box_model.container_id.in_(container_ids))
+        .group_by(box_model.container_id)
+    ):
+        rollups[container_id]['box_count'] = count
+        rollups[container_id]['total_weight'] += weight or 0
+
+    for container_id, count, weight in db.session.execute(
+        select(custom_model.container_id, func.count(custom_model.id), func.sum(custom_model.weight))
+        .where(custom_model.container_id.in_(container_ids))
+        .group_by(custom_model.container_id)
+    ):
+        rollups[container_id]['custom_box_count'] = count
+        rollups[container_id]['total_weight'] += weight or 0
+
+    for container_id, product_type, quantity in db.session.execute(
+        select(box_model.container_id, content_model.product_type, func.sum(content_model.quantity))
+        .join(content_model, content_model.box_id == box_model.id)
+        .where(box_model.container_id.in_(container_ids))
+        .group_by(box_model.container_id, content_model.product_type)
+    ):
+        _add_quantity(rollups[container_id]['totals'], product_type, quantity)
+
+    for container_id, product_type, quantity in db.session.execute(
+        select(custom_model.container_id, custom_model.product_type, func.sum(custom_model.quantity))
+        .where(custom_model.container_id.in_(container_ids))
+        .group_by(custom_model.container_id, custom_model.product_type)
+    ):
+        _add_quantity(rollups[container_id]['totals'], product_type, quantity)
+
+    for container_id, lcd_size, quantity in db.session.execute(
+        select(box_model.container_id, content_model.lcd_size, func.sum(content_model.quantity))
+        .join(content_model, content_model.box_id == box_model.id)
+        .where(box_model.container_id.in_(container_ids),
+               content_model.product_type == 'LCDs',
+               content_model.lcd_size.isnot(None),
+               content_model.lcd_size != '')
+        .group_by(box_model.container_id, content_model.lcd_size)
+    ):
+        _add_quantity(rollups[container_id]['lcd_sizes'], lcd_size, quantity)
+
+    for rollup in rollups.values():
+        rollup['total_weight'] = round(rollup['total_weight'], 2)
+    return rollups
+
+def inventory_rollup():
+    """Warehouse-wide totals split into available and containerized inventory."""
+    rollup = {'available': _empty_rollup(), 'containerized': _empty_rollup()}
+    status = case((Box.container_id.is_(None), 'available'), else_='containerized')
+
+    for row_status, count, weight in db.session.execute(
+        select(status, func.count(Box.id), func.sum(Box.weight)).group_by(status)
+    ):
+        rollup[row_status]['box_count'] = count
+        rollup[row_status]['total_weight'] += weight or 0
+
+    count, weight = db.session.execute(select(func.count(CustomBox.id), func.sum(CustomBox.weight))).one()
+    rollup['containerized']['custom_box_count'] = count
+    rollup['containerized']['total_weight'] += weight or 0
+
+    for row_status, product_type, quantity in db.session.execute(
+        select(status, BoxContent.product_type, func.sum(BoxContent.quantity))
+        .join(BoxContent, BoxContent.box_id == Box.id)
+        .group_by(status, BoxContent.product_type)
+    ):
+        _add_quantity(rollup[row_status]['totals'], product_type, quantity)
+
+    for product_type, quantity in db.session.execute(
+        select(CustomBox.product_type, func.sum(CustomBox.quantity)).group_by(CustomBox.product_type)
+    ):
+        _add_quantity(rollup['containerized']['totals'], product_type, quantity)
+
+    for row_status, lcd_size, quantity in db.session.execute(
+        select(status, BoxContent.lcd_size, func.sum(BoxContent.quantity))
+        .join(BoxContent, BoxContent.box_id == Box.id)
+        .where(BoxContent.product_type == 'LCDs',
+               BoxContent.lcd_size.isnot(None),
+               BoxContent.lcd_size != '')
+        .group_by(status, BoxContent.lcd_size)
+    ):
+        _add_quantity(rollup[row_status]['lcd_sizes'], lcd_size, quantity)
+
+    for totals in rollup.values():
+        totals['total_weight'] = round(totals['total_weight'], 2)
+    return rollup
+
+# Reads every site at once for cross-site totals
+site_executor = ThreadPoolExecutor(max_workers=len(app.config['SITES']), thread_name_prefix='site-read')
+
+def _merge_rollup(target, rollup):
+    for field in ('box_count', 'custom_box_count', 'total_weight'):
+        target[field] += rollup[field]
+    for field in ('totals', 'lcd_sizes'):
+        for key, quantity in rollup[field].items():
+            _add_quantity(target[field], key, quantity)
+
+@app.route('/api/sites/inventory', methods=['GET'])
+def api_sites_inventory():
+    """
+    Inventory totals of every site, read from the site databases in parallel,
+    plus the totals across all sites. A site that can't be read is reported
+    with an error and left out of the combined totals.
+    """
+    combined = {'available': _empty_rollup(), 'containerized': _empty_rollup()}
+    sites = {}
+    for site, outcome in gather_sites(app, site_executor, inventory_rollup).items():
+        if 'error' in outcome:
+            sites[site] = {'error': outcome['error']}
+            continue
+        sites[site] = outcome['result']
+        for status, rollup in outcome['result'].items():
+            _merge_rollup(combined[status], rollup)
+    for totals in combined.values():
+        totals['total_weight'] = round(totals['total_weight'], 2)
+    return cached_json_response({'sites': sites, 'combined': combined})
+
+@app.route('/api/boxes', methods=['GET'])
+def api_list_boxes():
+    """
+    Page through boxes, with their contents unless excluded via ?fields=.
+
+    Filters: container_id (an ID or "none" for available boxes), box_type,
+    product_type, created_after, created_before. Paginate with ?limit= and
+    ?after=<last id seen>.
+    """
+    fields = _parse_fields(BOX_API_FIELDS)
+    limit, after = _parse_page()
+
+    query = select(*[getattr(Box, field) for field in fields if field != 'contents']).where(Box.id > after)
+    container_id = request.args.get('container_id')
+    if container_id == 'none':
+        query = query.where(Box.container_id.is_(None))
+    elif container_id:
+        try:
+            query = query.where(Box.container_id == int(container_id))
+        except ValueError:
+            raise ApiError('container_id must be an integer or "none"')
+    if request.args.get('box_type'):
+        query = query.where(Box.box_type == request.args['box_type'])
+    if request.args.get('product_type'):
+        query = query.where(
+            select(BoxContent.id)
+            .where(BoxContent.box_id == Box.id, BoxContent.product_type == request.args['product_type'])
+            .exists()
+        )
+    created_after = _parse_datetime_arg('created_after')
+    if created_after:
+        query = query.where(Box.created_at >= created_after)
+    created_before = _parse_datetime_arg('created_before')
+    if created_before:
+        query = query.where(Box.created_at < created_before)
+
+    rows = [dict(row._mapping) for row in db.session.execute(query.order_by(Box.id).limit(limit + 1))]
+    payload = _page_payload(rows, limit, 'api_list_boxes')
+    if 'contents' in fields:
+        contents = box_contents_by_id([row['id'] for row in payload['data']])
+        for row in payload['data']:
+            row['contents'] = contents[row['id']]
+    return cached_json_response(payload)
+
+@app.route('/api/containers', methods=['GET'])
+def api_list_containers():
+    """
+    Page through containers with box counts, weights and product totals.
+
+    Filters: container_number, date_from, date_to. Paginate with ?limit= and
+    ?after=<last id seen>.
+    """
+    fields = _parse_fields(CONTAINER_API_FIELDS)
+    limit, after = _parse_page()
+
+    columns = [getattr(Container, field) for field in fields if field in ('id', 'name', 'container_number', 'date')]
+    query = select(*columns).where(Container.id > after)
+    if request.args.get('container_number'):
+        query = query.where(Container.container_number == request.args['container_number'])
+    date_from = _parse_datetime_arg('date_from')
+    if date_from:
+        query = query.where(Container.date >= date_from)
+    date_to = _parse_datetime_arg('date_to')
+    if date_to:
+        query = query.where(Container.date < date_to)
+
+    rows = [dict(row._mapping) for row in db.session.execute(query.order_by(Container.id).limit(limit + 1))]
+    payload = _page_payload(rows, limit, 'api_list_containers')
+    rollup_fields = [field for field in fields if field in _empty_rollup()]
+    if rollup_fields:
+        rollups = container_rollups([row['id'] for row in payload['data']])
+        for row in payload['data']:
+            for field in rollup_fields:
+                row[field] = rollups[row['id']][field]
+    return cached_json_response(payload)
+
+# Longest range the trend endpoint returns in one response
+TREND_MAX_DAYS = 3660
+
+def _parse_date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f'{name} must be a date (YYYY-MM-DD)')
+
+@app.route('/api/inventory/trend', methods=['GET'])
+def api_inventory_trend():
+    """
+    Daily inventory totals from the snapshot table: ?from=, ?to= (default
+    the last 30 days), optional status, product_type and lcd_size filters.
+    """
+    end = _parse_date_arg('to', datetime.utcnow().date())
+    start = _parse_date_arg('from', end - timedelta(days=29))
+    if start > end:
+        raise ApiError('from must not be after to')
+    if (end - start).days >= TREND_MAX_DAYS:
+        raise ApiError(f'Ranges are limited to {TREND_MAX_DAYS} days')
+
+    query = (select(InventorySnapshot.snapshot_date, InventorySnapshot.status, InventorySnapshot.product_type,
+                    InventorySnapshot.lcd_size, InventorySnapshot.box_count, InventorySnapshot.custom_box_count,
+                    InventorySnapshot.quantity, InventorySnapshot.weight)
+             .where(InventorySnapshot.snapshot_date.between(start, end)))
+    status = request.args.get('status')
+    if status:
+        if status not in ('available', 'containerized'):
+            raise ApiError('status must be available or containerized')
+        query = query.where(InventorySnapshot.status == status)
+    # The status totals rows are always returned; filters narrow the product rows
+    item_filters = []
+    if request.args.get('product_type'):
+        item_filters.append(InventorySnapshot.product_type == request.args['product_type'])
+    if request.args.get('lcd_size'):
+        item_filters.append(InventorySnapshot.lcd_size == request.args['lcd_size'])
+    if item_filters:
+        query = query.where(or_(InventorySnapshot.product_type == '', and_(*item_filters)))
+
+    rows = db.session.execute(query.order_by(InventorySnapshot.snapshot_date))
+    return cached_json_response({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'series': trend_series(rows),
+    })
+
+# Upper bound on containers planned in one request
+PLAN_MAX_CONTAINERS = 20
+
+def load_plan_candidates():
+    """Available boxes as (id, weight, {product type: quantity}) for the load planner."""
+    # Plain Core rows; ORM result processing would dominate for tens of thousands of boxes
+    connection = db.session.connection()
+    candidates = connection.execute(
+        select(Box.id, Box.weight).where(Box.container_id.is_(None)).order_by(Box.id)
+    ).all()
+    totals = {box_id: {} for box_id, _ in candidates}
+    for box_id, product_type, quantity in connection.execute(
+        select(BoxContent.box_id, BoxContent.product_type, BoxContent.quantity)
+        .join(Box, Box.id == BoxContent.box_id)
+        .where(Box.container_id.is_(None))
+    ):
+        _add_quantity(totals[box_id], product_type, quantity)
+    return [(box_id, weight, totals[box_id]) for box_id, weight in candidates]
+
+@app.route('/api/containers/plan', methods=['POST'])
+def api_plan_containers():
+    """
+    Propose available boxes to load into containers without exceeding a weight limit.
+
+    JSON body: {"weight_limit": lbs, "containers": 1, "targets": {"LCDs": 200, ...}}.
+    Nothing is assigned; the planned box IDs can be submitted to /containers/new.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError('No JSON data provided')
+    try:
+        weight_limit = float(data.get('weight_limit'))
+        container_count = int(data.get('containers', 1))
+        targets = {str(product): int(quantity) for product, quantity in (data.get('targets') or {}).items()}
+    except (TypeError, ValueError, AttributeError):
+        raise ApiError('weight_limit must be a number, containers an integer and targets an object of integers')
+    if weight_limit <= 0:
+        raise ApiError('weight_limit must be positive')
+    if not 1 <= container_count <= PLAN_MAX_CONTAINERS:
+        raise ApiError(f'containers must be between 1 and {PLAN_MAX_CONTAINERS}')
+
+    candidates = load_plan_candidates()
+    plans = plan_containers(candidates, weight_limit, container_count, targets)
+    planned = sum(plan['box_count'] for plan in plans)
+    logger.info(f"Planned {container_count} container(s) from {len(candidates)} available boxes")
+    return json_response({
+        'weight_limit': weight_limit,
+        'candidate_count': len(candidates),
+        'remaining_count': len(candidates) - planned,
+        'containers': plans,
+    })
+
+# Most box numbers one scan request may send, and how many are assigned per transaction
+SCAN_BATCH_MAX = 500
+SCAN_COMMIT_SIZE = 50
+
+def _scan_totals(container_id):
+    rollup = container_rollups([container_id])[container_id]
+    return {
+        'box_count': rollup['box_count'],
+        'custom_box_count': rollup['custom_box_count'],
+        'total_weight': round(rollup['total_weight'], 2),
+        'totals': rollup['totals'],
+    }
+
+def _assign_scanned_boxes(container_id, box_numbers, move):
+    """Assign one micro-batch of scanned box numbers in a single transaction."""
+    boxes = {box.box_number: box for box in db.session.scalars(
+        select(Box).where(Box.box_number.in_(set(box_numbers)))
+    )}
+    results = []
+    for box_number in box_numbers:
+        box = boxes.get(box_number)
+        if box is None:
+            results.append({'box_number': box_number, 'status': 'not_found'})
+        elif box.container_id == container_id:
+            results.append({'box_number': box_number, 'status': 'already_assigned', 'box_id': box.id})
+        elif box.container_id is not None and not move:
+            results.append({'box_number': box_number, 'status': 'in_other_container', 'box_id': box.id,
+                            'container_id': box.container_id})
+        else:
+            result = {'box_number': box_number, 'status': 'assigned', 'box_id': box.id, 'weight': box.weight}
+            if box.container_id is not None:
+                result['moved_from'] = box.container_id
+            box.container_id = container_id
+            results.append(result)
+    return results
+
+@app.route('/api/containers/<int:container_id>/scan', methods=['POST'])
+def api_scan_boxes(container_id):
+    """
+    Assign scanned boxes to a container by box number.
+
+    JSON body: {"box_number": "1221"} or {"box_numbers": [...], "move": false}.
+    Boxes already in another container are only moved when "move" is true.
+    Returns a result per scan and the container's totals after the batch.
+    """
+    if db.session.get(Container, container_id) is None:
+        return json_response({'error': f'Container {container_id} not found'}, 404)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError('No JSON data provided')
+    box_numbers = data.get('box_numbers')
+    if box_numbers is None and data.get('box_number') is not None:
+        box_numbers = [data['box_number']]
+    if not isinstance(box_numbers, list) or not box_numbers:
+        raise ApiError('box_number or a list of box_numbers is required')
+    if len(box_numbers) > SCAN_BATCH_MAX:
+        raise ApiError(f'At most {SCAN_BATCH_MAX} box numbers can be sent at once')
+    box_numbers = [str(box_number).strip() for box_number in box_numbers]
+
+    results = []
+    for start in range(0, len(box_numbers), SCAN_COMMIT_SIZE):
+        results.extend(write(partial(_assign_scanned_boxes, container_id,
+                                     box_numbers[start:start + SCAN_COMMIT_SIZE], bool(data.get('move')))))
+    assigned = sum(1 for result in results if result['status'] == 'assigned')
+    if assigned:
+        logger.info(f'Assigned {assigned} scanned boxes to container {container_id}')
+    return json_response({'results': results, 'container': _scan_totals(container_id)})
+
+@app.route('/api/inventory', methods=['GET'])
+def api_inventory():
+    """Warehouse totals for available and containerized inventory (?status= picks one)."""
+    fields = _parse_fields(INVENTORY_API_FIELDS, always=())
+    status = request.args.get('status')
+    if status not in (None, '', 'available', 'containerized'):
+        raise ApiError('status must be "available" or "containerized"')
+
+    rollup = inventory_rollup()
+    payload = {
+        name: {field: totals[field] for field in fields}
+        for name, totals in rollup.items()
+        if not status or name == status
+    }
+    return cached_json_response(payload)
+
+# Most outlier boxes returned by the unit weight analysis
+UNIT_WEIGHT_MAX_OUTLIERS = 500
+
+@app.route('/api/analytics/unit-weights', methods=['GET'])
+def api_unit_weights():
+    """
+    Per-product unit weights fitted over all live boxes, and the boxes whose
+    recorded weight is furthest from what their contents should weigh:
+    ?threshold= (robust standard deviations, default 3.5), ?limit= (default
+    50) and ?min_boxes= (products in fewer boxes are skipped, default 20).
+    """
+    if not numpy_available:
+        return json_response({'error': 'Unit weight analysis needs the optional numpy package'}, 503)
+    try:
+        threshold = float(request.args.get('threshold', 3.5))
+        limit = int(request.args.get('limit', 50))
+        min_boxes = int(request.args.get('min_boxes', 20))
+    except ValueError:
+        raise ApiError('threshold, limit and min_boxes must be numbers')
+    if threshold <= 0 or not 1 <= limit <= UNIT_WEIGHT_MAX_OUTLIERS or min_boxes < 1:
+        raise ApiError(f'threshold must be positive, limit between 1 and {UNIT_WEIGHT_MAX_OUTLIERS} '
+                       'and min_boxes at least 1')
+
+    fit = fit_unit_weights(load_content_rows(db.session.connection()), min_boxes=min_boxes)
+    outliers = ranked_outliers(fit, threshold, limit)
+
+    boxes = {row.id: row for row in db.session.execute(
+        select(Box.id, Box.box_number, Box.container_id)
+        .where(Box.id.in_([outlier['box_id'] for outlier in outliers]))
+    )}
+    for outlier in outliers:
+        outlier['box_number'] = boxes[outlier['box_id']].box_number
+        outlier['container_id'] = boxes[outlier['box_id']].container_id
+    return cached_json_response({
+        'unit_weights': fit.unit_weights,
+        'boxes_used': fit.boxes_used,
+        'products_skipped': fit.products_skipped,
+        'threshold': threshold,
+        'outliers': outliers,
+    })
+
+
+def latest_inventory_event_id():
+    return db.session.execute(select(func.max(InventoryEvent.id))).scalar() or 0
+
+def _fetch_inventory_events(site, after_id, limit=None):
+    with app.app_context(), use_site(site), site_engine(db).connect() as connection:
+        query = (select(InventoryEvent.id, InventoryEvent.payload)
+                 .where(InventoryEvent.id > after_id).order_by(InventoryEvent.id))
+        if limit is not None:
+            query = query.limit(limit)
+        return [tuple(row) for row in connection.execute(query)]
+
+def _latest_inventory_event_id(site):
+    with app.app_context(), use_site(site):
+        return latest_inventory_event_id()
+
+def _prune_inventory_events(site):
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['EVENTS_RETENTION_HOURS'])
+    with app.app_context(), use_site(site), site_engine(db).begin() as connection:
+        connection.execute(InventoryEvent.__table__.delete().where(InventoryEvent.created_at < cutoff))
+
+# One poller per site and process fans stored events out to every connected stream
+inventory_broadcasters = {
+    site: EventBroadcaster(
+        partial(_fetch_inventory_events, site),
+        partial(_latest_inventory_event_id, site),
+        poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+        prune=partial(_prune_inventory_events, site),
+    )
+    for site in app.config['SITES']
+}
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Server-sent event stream of inventory changes ('inventory' events).
+
+    Clients resume from the Last-Event-ID header (sent automatically by
+    EventSource on reconnect) or ?last_event_id=; if too many events were
+    missed a 'reset' event tells them to reload instead.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise ApiError('Last-Event-ID must be an integer')
+
+    site = active_site()
+    inventory_broadcaster = inventory_broadcasters[site]
+    subscription = inventory_broadcaster.subscribe()
+    replay = []
+    if last_event_id is not None:
+        replay = _fetch_inventory_events(site, last_event_id, limit=app.config['EVENTS_REPLAY_LIMIT'] + 1)
+    heartbeat = app.config['EVENTS_HEARTBEAT']
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            if len(replay) > app.config['EVENTS_REPLAY_LIMIT']:
+                yield format_sse(None, '{}', event='reset')
+                return
+            sent_id = last_event_id or 0
+            for event_id, payload in replay:
+                yield format_sse(event_id, payload, event='inventory')
+                sent_id = event_id
+            while not subscription.overflowed:
+                try:
+                    event_id, payload = subscription.queue.get(timeout=heartbeat)
+                except Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                if event_id <= sent_id:
+                    continue
+                yield format_sse(event_id, payload, event='inventory')
+                sent_id = event_id
+            # The client fell behind; closing makes EventSource reconnect and replay
+        finally:
+            inventory_broadcaster.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Background jobs (see jobs.py)
+
+JOBS_CLEANUP_INTERVAL = 600  # seconds between cleanups of old jobs, per site
+_last_jobs_cleanup = {}
+
+@contextmanager
+def _site_transaction(site):
+    with app.app_context(), use_site(site), site_engine(db).begin() as connection:
+        yield connection
+
+def _run_in_site(site, fn):
+    with app.app_context(), use_site(site):
+        return fn()
+
+job_runner = JobRunner(
+    _site_transaction,
+    _run_in_site,
+    artifact_dir=app.config['JOBS_DIR'],
+    max_workers=app.config['JOBS_MAX_WORKERS'],
+    max_pending=app.config['JOBS_MAX_PENDING'],
+)
+
+def container_export_job(container_id):
+    container = db.session.get(Container, container_id) or db.session.get(ArchivedContainer, container_id)
+    if container is None:
+        raise ValueError(f'Container {container_id} not found')
+    return JobResult(container_report_filename(container), 'text/csv', container_report_csv(container))
+
+# Containers summarized per grouped-query round trip in the all-containers report
+REPORT_BATCH_SIZE = 500
+
+def containers_report_job():
+    """Every live container with its box counts, weight and product totals, as CSV."""
+    containers = db.session.execute(
+        select(Container.id, Container.name, Container.container_number, Container.date).order_by(Container.date, Container.id)
+    ).all()
+    si = StringIO()
+    writer = csv.writer(si)
+    writer.writerow(['Container', 'Container Number', 'Date', 'Boxes', 'Custom Boxes', 'Total Weight (lbs)']
+                    + PRODUCT_TYPES + ['Other'])
+    for start in range(0, len(containers), REPORT_BATCH_SIZE):
+        batch = containers[start:start + REPORT_BATCH_SIZE]
+        rollups = container_rollups([row.id for row in batch])
+        for row in batch:
+            rollup = rollups[row.id]
+            other = sum(quantity for product, quantity in rollup['totals'].items() if product not in PRODUCT_TYPES)
+            writer.writerow([row.name, row.container_number or '', row.date.strftime('%Y-%m-%d') if row.date else '',
+                             rollup['box_count'], rollup['custom_box_count'], round(rollup['total_weight'], 2)]
+                            + [rollup['totals'].get(product, 0) for product in PRODUCT_TYPES] + [other])
+    return JobResult(f'containers_report_{datetime.utcnow():%Y%m%d}.csv', 'text/csv', si.getvalue())
+
+job_runner.register('container_export', container_export_job)
+job_runner.register('containers_report', containers_report_job)
+
+def _cleanup_old_jobs(site):
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['JOBS_RETENTION_HOURS'])
+    with _site_transaction(site) as connection:
+        return cleanup_jobs(connection, cutoff)
+
+def enqueue_job(kind, params):
+    """Queue a job for the current site, first removing expired ones every few minutes."""
+    site = active_site()
+    now = time.monotonic()
+    if now - _last_jobs_cleanup.get(site, 0.0) >= JOBS_CLEANUP_INTERVAL:
+        _last_jobs_cleanup[site] = now
+        _cleanup_old_jobs(site)
+    return job_runner.enqueue(site, kind, params)
+
+def _job_payload(job):
+    payload = {field: job[field] for field in ('id', 'kind', 'status', 'created_at', 'started_at',
+                                                'finished_at', 'error')}
+    payload['status_url'] = url_for('api_job_status', job_id=job['id'])
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('api_job_download', job_id=job['id'])
+    return payload
+
+def _job_accepted(job_id):
+    response = json_response({'id': job_id, 'status': 'queued',
+                              'status_url': url_for('api_job_status', job_id=job_id)}, 202)
+    response.headers['Location'] = url_for('api_job_status', job_id=job_id)
+    return response
+
+@app.errorhandler(JobQueueFull)
+def handle_job_queue_full(error):
+    response = json_response({'error': str(error)}, 503)
+    response.headers['Retry-After'] = '30'
+    return response
+
+@app.route('/api/jobs', methods=['POST'])
+def api_create_job():
+    """
+    Start a background job. JSON body: {"kind": "containers_report"} or
+    {"kind": "container_export", "params": {"container_id": 5}}.
+    Returns 202 with the job's status URL to poll.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError('No JSON data provided')
+    kind = data.get('kind')
+    params = data.get('params') or {}
+    if kind not in job_runner.handlers:
+        raise ApiError(f'kind must be one of {", ".join(sorted(job_runner.handlers))}')
+    if not isinstance(params, dict):
+        raise ApiError('params must be an object')
+    if kind == 'container_export':
+        try:
+            params = {'container_id': int(params.get('container_id'))}
+        except (TypeError, ValueError):
+            raise ApiError('container_export needs an integer params.container_id')
+    else:
+        params = {}
+    return _job_accepted(enqueue_job(kind, params))
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Status of a job: queued, running, done (with download_url) or failed (with error)."""
+    job = job_status(db.session.connection(), job_id)
+    if job is None:
+        return json_response({'error': f'Job {job_id} not found'}, 404)
+    response = json_response(_job_payload(job))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/jobs/<int:job_id>/download', methods=['GET'])
+def api_job_download(job_id):
+    job = job_status(db.session.connection(), job_id)
+    if job is None:
+        return json_response({'error': f'Job {job_id} not found'}, 404)
+    if job['status'] != 'done':
+        return json_response({'error': f'Job {job_id} is {job["status"]}'}, 409)
+    if not job['artifact_path'] or not os.path.exists(job['artifact_path']):
+        return json_response({'error': f'The result of job {job_id} has expired'}, 410)
+    return send_file(job['artifact_path'], mimetype=job['mimetype'], as_attachment=True,
+                     download_name=job['artifact_name'])
+
+# Results per page for box search
+SEARCH_PAGE_SIZE = 50
+
+def _run_box_search():
+    """Run the search described by the request's query string."""
+    query = request.args.get('q', '').strip()
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        limit = max(1, min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), API_MAX_LIMIT))
+    except ValueError:
+        raise ApiError('page and limit must be integers')
+    result = search_boxes(
+        db.session.connection(),
+        query,
+        product_type=request.args.get('product_type') or None,
+        lcd_size=request.args.get('lcd_size') or None,
+        available_only=request.args.get('available') == 'true',
+        limit=limit,
+        offset=(page - 1) * limit,
+    )
+
+    # Load the page of boxes in relevance order
+    rows = db.session.execute(
+        select(Box.id, Box.box_number, Box.weight, Box.box_type, Box.container_id,
+               Container.name.label('container_name'))
+        .outerjoin(Container, Container.id == Box.container_id)
+        .where(Box.id.in_(result['box_ids']))
+    )
+    boxes_by_id = {row.id: dict(row._mapping) for row in rows}
+    contents = box_contents_by_id(result['box_ids'])
+    boxes = []
+    for box_id in result['box_ids']:
+        if box_id in boxes_by_id:
+            box = boxes_by_id[box_id]
+            box['contents'] = contents[box_id]
+            boxes.append(box)
+    return {'query': query, 'page': page, 'limit': limit, 'total': result['total'],
+            'results': boxes, 'facets': result['facets']}
+
+@app.route('/search')
+def search():
+    """Full-text search over boxes with product type and LCD size facets."""
+    if not search_index_available:
+        flash('Search is unavailable: this SQLite build does not include FTS5.', 'error')
+        return redirect(url_for('boxes'))
+    return render_template('search.html', **_run_box_search())
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """JSON box search: ?q=, product_type, lcd_size, available=true, page, limit."""
+    if not search_index_available:
+        return jsonify({'error': 'Search unavailable'}), 503
+    return json_response(_run_box_search())
+
 
 @app.route('/boxes/voice')
 def voice_entry():
     """Voice-powered box entry page"""
-    # Get the next box number suggestion
-    try:
-        numeric_boxes = db.session.query(Box.box_number).all()
-        max_number = 0
-        for box in numeric_boxes:
-            try:
-                number = int(box.box_number)
-                if number > max_number:
-                    max_number = number
-            except ValueError:
-                continue
-        next_box_number = str(max_number + 1)
-    except:
-        next_box_number = "1"
-    
-    return render_template('voice_entry.html', next_box_number=next_box_number)
+    return render_template('voice_entry.html', next_box_number=_next_box_number())
+
+
+def _form_box_contents(box_type):
+    """
+    The filled-in content rows of a box form as dicts, read before the box
+    is saved so the write itself doesn't need the request.
+    """
+    sections = ['bottom', 'middle', 'top'] if box_type == 'detailed' else ['simple']
+    contents = []
+    for section in sections:
+        products = request.form.getlist(f'{section}_product[]')
+        quantities = request.form.getlist(f'{section}_quantity[]')
+        lcd_sizes = request.form.getlist(f'{section}_lcd_size[]')
+        
+        # Process products in pairs (select value, custom input value)
+        # Since both select and custom input have same name, they appear consecutively
+        i = 0
+        while i < len(products) and i // 2 < len(quantities):
+            quantity_index = i // 2
+            quantity = quantities[quantity_index] if quantity_index < len(quantities) else None
+            
+            # Get product name - either from select (even index) or custom input (odd index)
+            product = products[i] if products[i] else (products[i + 1] if i + 1 < len(products) else None)
+            
+            if product and quantity:
+                try:
+                    # Get LCD size - also comes in pairs
+                    lcd_size = None
+                    if product == 'LCDs' and quantity_index * 2 < len(lcd_sizes):
+                        lcd_size = lcd_sizes[quantity_index * 2] if lcd_sizes[quantity_index * 2] else (
+                            lcd_sizes[quantity_index * 2 + 1] if quantity_index * 2 + 1 < len(lcd_sizes) else None
+                        )
+                    
+                    contents.append({
+                        'section': section if box_type == 'detailed' else 'total',  # Use 'total' for simple boxes
+                        'product_type': product,
+                        'quantity': int(quantity),
+                        'lcd_size': lcd_size,
+                    })
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Error processing content item: {e}, product={product}, quantity={quantity}")
+            
+            i += 2  # Skip to next pair
+    return contents
 
+def _add_box_contents(box, contents):
+    for content in contents:
+        db.session.add(BoxContent(box=box, **content))
 
 @app.route('/boxes/new', methods=['GET', 'POST'])
+@idempotent
 def new_box():
     if request.method == 'POST':
         try:
@@ -402,156 +2566,43 @@ def new_box():
             if Box.query.filter_by(box_number=box_number).first():
                 flash('Box number already exists!', 'error')
                 return redirect(url_for('new_box'))
+            if _archived_box_number(box_number):
+                flash('Box number belongs to an archived box!', 'error')
+                return redirect(url_for('new_box'))
             
-            box = Box(
-                box_number=box_number, 
-                weight=weight, 
-                box_type=box_type,
-                container_id=int(container_id) if container_id else None
-            )
-            db.session.add(box)
-            
-            # Process contents based on box type
-            if box_type == 'detailed':
-                # Process contents for each section
-                sections = ['bottom', 'middle', 'top']
-                for section in sections:
-                    products = request.form.getlist(f'{section}_product[]')
-                    quantities = request.form.getlist(f'{section}_quantity[]')
-                    lcd_sizes = request.form.getlist(f'{section}_lcd_size[]')
-                    
-                    # Process products in pairs (select value, custom input value)
-                    # Since both select and custom input have same name, they appear consecutively
-                    i = 0
-                    while i < len(products) and i // 2 < len(quantities):
-                        quantity_index = i // 2
-                        quantity = quantities[quantity_index] if quantity_index < len(quantities) else None
-                        
-                        # Get product name - either from select (even index) or custom input (odd index)
-                        product = products[i] if products[i] else (products[i + 1] if i + 1 < len(products) else None)
-                        
-                        if product and quantity:
-                            try:
-                                # Get LCD size - also comes in pairs
-                                lcd_size = None
-                                if product == 'LCDs' and quantity_index * 2 < len(lcd_sizes):
-                                    lcd_size = lcd_sizes[quantity_index * 2] if lcd_sizes[quantity_index * 2] else (
-                                        lcd_sizes[quantity_index * 2 + 1] if quantity_index * 2 + 1 < len(lcd_sizes) else None
-                                    )
-                                
-                                content = BoxContent(
-                                    box=box,
-                                    section=section,
-                                    product_type=product,
-                                    quantity=int(quantity),
-                                    lcd_size=lcd_size
-                                )
-                                db.session.add(content)
-                            except (ValueError, TypeError) as e:
-                                logger.warning(f"Error processing content item: {e}, product={product}, quantity={quantity}")
-                                continue
-                        
-                        i += 2  # Skip to next pair
-            else:  # simple box type
-                products = request.form.getlist('simple_product[]')
-                quantities = request.form.getlist('simple_quantity[]')
-                lcd_sizes = request.form.getlist('simple_lcd_size[]')
-                
-                # Process products in pairs (select value, custom input value)
-                i = 0
-                while i < len(products) and i // 2 < len(quantities):
-                    quantity_index = i // 2
-                    quantity = quantities[quantity_index] if quantity_index < len(quantities) else None
-                    
-                    # Get product name - either from select (even index) or custom input (odd index)
-                    product = products[i] if products[i] else (products[i + 1] if i + 1 < len(products) else None)
-                    
-                    if product and quantity:
-                        try:
-                            # Get LCD size - also comes in pairs
-                            lcd_size = None
-                            if product == 'LCDs' and quantity_index * 2 < len(lcd_sizes):
-                                lcd_size = lcd_sizes[quantity_index * 2] if lcd_sizes[quantity_index * 2] else (
-                                    lcd_sizes[quantity_index * 2 + 1] if quantity_index * 2 + 1 < len(lcd_sizes) else None
-                                )
-                            
-                            content = BoxContent(
-                                box=box,
-                                section='total',  # Use 'total' for simple boxes
-                                product_type=product,
-                                quantity=int(quantity),
-                                lcd_size=lcd_size
-                            )
-                            db.session.add(content)
-                        except (ValueError, TypeError) as e:
-                            logger.warning(f"Error processing content item: {e}, product={product}, quantity={quantity}")
-                            continue
-                    
-                    i += 2  # Skip to next pair
-            
-            db.session.commit()
-            logger.info(f"Box {box_number} created successfully")
+            contents = _form_box_contents(box_type)
+
+            def save():
+                box = Box(
+                    box_number=box_number, 
+                    weight=weight, 
+                    box_type=box_type,
+                    container_id=int(container_id) if container_id else None
+                )
+                db.session.add(box)
+                _add_box_contents(box, contents)
+                db.session.flush()
+                return box.id
+
+            box_id = write(save)
+            logger.info(f"Box {box_number} created successfully", extra={'box_id': box_id})
             flash('Box created successfully!', 'success')
             
-            # Calculate next box number for staying on the page
-            try:
-                numeric_boxes = db.session.query(Box.box_number).all()
-                max_number = 0
-                for box in numeric_boxes:
-                    try:
-                        number = int(box.box_number)
-                        if number > max_number:
-                            max_number = number
-                    except ValueError:
-                        continue
-                next_box_number = str(max_number + 1)
-            except:
-                next_box_number = "1"
-            
             containers = Container.query.all()
-            return render_template('new_box.html', containers=containers, next_box_number=next_box_number, box_created=True)
+            return render_template('new_box.html', containers=containers, next_box_number=_next_box_number(),
+                                   box_created=True)
+        except WriteQueueBusy:
+            raise
         except Exception as e:
             db.session.rollback()
             logger.exception(f"Error creating box: {e}")
             flash('An error occurred while creating the box. Please try again.', 'error')
             
-            # Calculate next box number even on error
-            try:
-                numeric_boxes = db.session.query(Box.box_number).all()
-                max_number = 0
-                for box in numeric_boxes:
-                    try:
-                        number = int(box.box_number)
-                        if number > max_number:
-                            max_number = number
-                    except ValueError:
-                        continue
-                next_box_number = str(max_number + 1)
-            except:
-                next_box_number = "1"
-            
             containers = Container.query.all()
-            return render_template('new_box.html', containers=containers, next_box_number=next_box_number)
-    
-    # Get the highest box number and calculate next number for pre-filling
-    try:
-        # Try to find the highest numeric box number
-        numeric_boxes = db.session.query(Box.box_number).all()
-        max_number = 0
-        for box in numeric_boxes:
-            try:
-                number = int(box.box_number)
-                if number > max_number:
-                    max_number = number
-            except ValueError:
-                # Skip non-numeric box numbers
-                continue
-        next_box_number = str(max_number + 1)
-    except:
-        next_box_number = "1"
+            return render_template('new_box.html', containers=containers, next_box_number=_next_box_number())
     
     containers = Container.query.all()
-    return render_template('new_box.html', containers=containers, next_box_number=next_box_number)
+    return render_template('new_box.html', containers=containers, next_box_number=_next_box_number())
 
 @app.route('/boxes/<int:box_id>/edit', methods=['GET', 'POST'])
 def edit_box(box_id):
@@ -568,84 +2619,24 @@ def edit_box(box_id):
         if existing_box and existing_box.id != box.id:
             flash('Box number already exists!', 'error')
             return redirect(url_for('edit_box', box_id=box_id))
+        if box_number != box.box_number and _archived_box_number(box_number):
+            flash('Box number belongs to an archived box!', 'error')
+            return redirect(url_for('edit_box', box_id=box_id))
         
-        box.box_number = box_number
-        box.weight = weight
-        box.box_type = box_type
-        box.container_id = int(container_id) if container_id else None
-        
-        # Clear existing contents
-        BoxContent.query.filter_by(box_id=box.id).delete()
-        
-        # Process contents based on box type
-        if box_type == 'detailed':
-            sections = ['bottom', 'middle', 'top']
-            for section in sections:
-                products = request.form.getlist(f'{section}_product[]')
-                quantities = request.form.getlist(f'{section}_quantity[]')
-                lcd_sizes = request.form.getlist(f'{section}_lcd_size[]')
-                
-                # Process products in pairs (select value, custom input value)
-                i = 0
-                while i < len(products) and i // 2 < len(quantities):
-                    quantity_index = i // 2
-                    quantity = quantities[quantity_index] if quantity_index < len(quantities) else None
-                    
-                    # Get product name - either from select (even index) or custom input (odd index)
-                    product = products[i] if products[i] else (products[i + 1] if i + 1 < len(products) else None)
-                    
-                    if product and quantity:
-                        # Get LCD size - also comes in pairs
-                        lcd_size = None
-                        if product == 'LCDs' and quantity_index * 2 < len(lcd_sizes):
-                            lcd_size = lcd_sizes[quantity_index * 2] if lcd_sizes[quantity_index * 2] else (
-                                lcd_sizes[quantity_index * 2 + 1] if quantity_index * 2 + 1 < len(lcd_sizes) else None
-                            )
-                        
-                        content = BoxContent(
-                            box=box,
-                            section=section,
-                            product_type=product,
-                            quantity=int(quantity),
-                            lcd_size=lcd_size
-                        )
-                        db.session.add(content)
-                    
-                    i += 2  # Skip to next pair
-        else:  # simple box type
-            products = request.form.getlist('simple_product[]')
-            quantities = request.form.getlist('simple_quantity[]')
-            lcd_sizes = request.form.getlist('simple_lcd_size[]')
-            
-            # Process products in pairs (select value, custom input value)
-            i = 0
-            while i < len(products) and i // 2 < len(quantities):
-                quantity_index = i // 2
-                quantity = quantities[quantity_index] if quantity_index < len(quantities) else None
-                
-                # Get product name - either from select (even index) or custom input (odd index)
-                product = products[i] if products[i] else (products[i + 1] if i + 1 < len(products) else None)
-                
-                if product and quantity:
-                    # Get LCD size - also comes in pairs
-                    lcd_size = None
-                    if product == 'LCDs' and quantity_index * 2 < len(lcd_sizes):
-                        lcd_size = lcd_sizes[quantity_index * 2] if lcd_sizes[quantity_index * 2] else (
-                            lcd_sizes[quantity_index * 2 + 1] if quantity_index * 2 + 1 < len(lcd_sizes) else None
-                        )
-                    
-                    content = BoxContent(
-                        box=box,
-                        section='total',
-                        product_type=product,
-                        quantity=int(quantity),
-                        lcd_size=lcd_size
-                    )
-                    db.session.add(content)
-                
-                i += 2  # Skip to next pair
-        
-        db.session.commit()
+        contents = _form_box_contents(box_type)
+
+        def save():
+            box = db.get_or_404(Box, box_id)
+            box.box_number = box_number
+            box.weight = weight
+            box.box_type = box_type
+            box.container_id = int(container_id) if container_id else None
+
+            # Clear existing contents
+            BoxContent.query.filter_by(box_id=box.id).delete()
+            _add_box_contents(box, contents)
+
+        write(save)
         flash('Box updated successfully!', 'success')
         return redirect(url_for('boxes'))
     
@@ -654,18 +2645,37 @@ def edit_box(box_id):
 
 @app.route('/boxes/<int:box_id>/delete', methods=['POST'])
 def delete_box(box_id):
-    box = Box.query.get_or_404(box_id)
-    db.session.delete(box)
-    db.session.commit()
+    Box.query.get_or_404(box_id)
+    write(lambda: db.session.delete(db.get_or_404(Box, box_id)))
     flash('Box deleted successfully!', 'success')
     return redirect(url_for('boxes'))
 
 @app.route('/containers')
 def containers():
+    last_event_id = latest_inventory_event_id()
     containers = Container.query.all()
-    return render_template('containers.html', containers=containers)
+    return render_template('containers.html', containers=containers, last_event_id=last_event_id)
+
+def _form_custom_boxes():
+    """(product type, quantity, weight) of each filled-in custom box row of a container form."""
+    custom_products = request.form.getlist('custom_product[]')
+    custom_quantities = request.form.getlist('custom_quantity[]')
+    custom_weights = request.form.getlist('custom_weight[]')
+    return [(product, int(quantity), float(weight))
+            for product, quantity, weight in zip(custom_products, custom_quantities, custom_weights)
+            if product and quantity and weight]
+
+def _fill_container(container, box_ids, custom_boxes):
+    """Put the selected boxes and the custom boxes from a container form into `container`."""
+    for box_id in box_ids:
+        box = Box.query.get(box_id)
+        if box:
+            box.container = container
+    for product, quantity, weight in custom_boxes:
+        db.session.add(CustomBox(container=container, product_type=product, quantity=quantity, weight=weight))
 
 @app.route('/containers/new', methods=['GET', 'POST'])
+@idempotent
 def new_container():
     if request.method == 'POST':
         container_number = request.form.get('container_number')
@@ -675,48 +2685,109 @@ def new_container():
         if container_number and Container.query.filter_by(container_number=container_number).first():
             flash('Container number already exists!', 'error')
             boxes = Box.query.filter_by(container_id=None).all()
-            return render_template('new_container.html', boxes=boxes)
-        
-        # Create container with or without container number
-        container = Container(
-            container_number=container_number if container_number else None, 
-            name=name
-        )
-        db.session.add(container)
+            return render_template('new_container.html', boxes=boxes, product_types=PRODUCT_TYPES)
+        if container_number and _archived_container_number(container_number):
+            flash('Container number belongs to an archived container!', 'error')
+            boxes = Box.query.filter_by(container_id=None).all()
+            return render_template('new_container.html', boxes=boxes, product_types=PRODUCT_TYPES)
         
-        # Process selected boxes
         box_ids = request.form.getlist('box_ids[]')
-        for box_id in box_ids:
-            box = Box.query.get(box_id)
-            if box:
-                box.container = container
-        
-        # Process custom boxes
-        custom_products = request.form.getlist('custom_product[]')
-        custom_quantities = request.form.getlist('custom_quantity[]')
-        custom_weights = request.form.getlist('custom_weight[]')
-        
-        for product, quantity, weight in zip(custom_products, custom_quantities, custom_weights):
-            if product and quantity and weight:
-                custom_box = CustomBox(
-                    container=container,
-                    product_type=product,
-                    quantity=int(quantity),
-                    weight=float(weight)
-                )
-                db.session.add(custom_box)
-        
-        db.session.commit()
+        custom_boxes = _form_custom_boxes()
+
+        def save():
+            # Create container with or without container number
+            container = Container(
+                container_number=container_number if container_number else None, 
+                name=name
+            )
+            db.session.add(container)
+            _fill_container(container, box_ids, custom_boxes)
+
+        write(save)
         flash('Container created successfully!', 'success')
         return redirect(url_for('containers'))
     
     boxes = Box.query.filter_by(container_id=None).all()
-    return render_template('new_container.html', boxes=boxes)
+    return render_template('new_container.html', boxes=boxes, product_types=PRODUCT_TYPES)
+
+def get_container_or_archived(container_id):
+    """A live container, or the archived one with that ID; 404 if neither exists."""
+    container = db.session.get(Container, container_id)
+    if container is None:
+        container = db.get_or_404(ArchivedContainer, container_id)
+    return container
+
+@app.route('/containers/archived')
+def archived_containers():
+    page = db.paginate(
+        select(ArchivedContainer).order_by(ArchivedContainer.date.desc(), ArchivedContainer.id.desc()),
+        per_page=100,
+    )
+    return render_template('archived_containers.html', page=page)
+
+# Numbered boxes listed per page (and per "Show more" fragment) on the container details page
+CONTAINER_BOX_PAGE_SIZE = 100
+
+def _container_box_page(container_id, archived, after=0):
+    """One page of lightweight box rows (no contents) and the ID to continue after, if any."""
+    box_model = ArchivedBox if archived else Box
+    rows = db.session.execute(
+        select(box_model.id, box_model.box_number, box_model.weight, box_model.box_type)
+        .where(box_model.container_id == container_id, box_model.id > after)
+        .order_by(box_model.id)
+        .limit(CONTAINER_BOX_PAGE_SIZE + 1)
+    ).all()
+    next_after = rows[CONTAINER_BOX_PAGE_SIZE - 1].id if len(rows) > CONTAINER_BOX_PAGE_SIZE else None
+    return rows[:CONTAINER_BOX_PAGE_SIZE], next_after
+
+def fragment_response(html, archived):
+    """
+    HTML fragment with an ETag. Archived containers never change, so their
+    fragments may be cached; live ones are revalidated on every request.
+    """
+    response = app.make_response(html)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.private = True
+    if archived:
+        response.cache_control.max_age = 86400
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/containers/<int:container_id>')
 def container_details(container_id):
-    container = Container.query.get_or_404(container_id)
-    return render_template('container_details.html', container=container)
+    container = get_container_or_archived(container_id)
+    archived = isinstance(container, ArchivedContainer)
+    rollup = container_rollups([container.id], ARCHIVED_MODELS if archived else None)[container.id]
+    boxes, next_after = _container_box_page(container.id, archived)
+    return render_template('container_details.html', container=container, archived=archived,
+                           rollup=rollup, boxes=boxes, next_after=next_after)
+
+@app.route('/containers/<int:container_id>/boxes')
+def container_box_rows(container_id):
+    """The next page of box rows for the container details page."""
+    container = get_container_or_archived(container_id)
+    archived = isinstance(container, ArchivedContainer)
+    boxes, next_after = _container_box_page(container.id, archived, request.args.get('after', 0, type=int))
+    return fragment_response(render_template('_container_box_rows.html', container=container,
+                                             boxes=boxes, next_after=next_after), archived)
+
+@app.route('/containers/<int:container_id>/boxes/<int:box_id>')
+def container_box_detail(container_id, box_id):
+    """Section contents and LCD sizes of one box, loaded when its row is expanded."""
+    container = get_container_or_archived(container_id)
+    archived = isinstance(container, ArchivedContainer)
+    box_model = ArchivedBox if archived else Box
+    box = db.session.get(box_model, box_id)
+    if box is None or box.container_id != container.id:
+        return Response('Box not found in this container', status=404, mimetype='text/plain')
+    return fragment_response(render_template('_box_detail.html', box=box), archived)
+
+@app.route('/containers/<int:container_id>/scan')
+def scan_container(container_id):
+    container = db.get_or_404(Container, container_id)
+    return render_template('scan_container.html', container=container,
+                           totals=_scan_totals(container_id))
 
 @app.route('/containers/<int:container_id>/edit', methods=['GET', 'POST'])
 def edit_container(container_id):
@@ -735,40 +2806,30 @@ def edit_container(container_id):
                     (Box.container_id == None) | (Box.container_id == container.id)
                 ).all()
                 return render_template('edit_container.html', container=container, boxes=available_boxes)
+            if container_number != container.container_number and _archived_container_number(container_number):
+                flash('Container number belongs to an archived container!', 'error')
+                available_boxes = Box.query.filter(
+                    (Box.container_id == None) | (Box.container_id == container.id)
+                ).all()
+                return render_template('edit_container.html', container=container, boxes=available_boxes)
         
-        container.container_number = container_number if container_number else None
-        container.name = name
-        
-        # Clear existing box assignments
-        for box in container.boxes:
-            box.container_id = None
-        
-        # Clear existing custom boxes
-        CustomBox.query.filter_by(container_id=container.id).delete()
-        
-        # Process selected boxes
         box_ids = request.form.getlist('box_ids[]')
-        for box_id in box_ids:
-            box = Box.query.get(box_id)
-            if box:
-                box.container = container
-        
-        # Process custom boxes
-        custom_products = request.form.getlist('custom_product[]')
-        custom_quantities = request.form.getlist('custom_quantity[]')
-        custom_weights = request.form.getlist('custom_weight[]')
-        
-        for product, quantity, weight in zip(custom_products, custom_quantities, custom_weights):
-            if product and quantity and weight:
-                custom_box = CustomBox(
-                    container=container,
-                    product_type=product,
-                    quantity=int(quantity),
-                    weight=float(weight)
-                )
-                db.session.add(custom_box)
-        
-        db.session.commit()
+        custom_boxes = _form_custom_boxes()
+
+        def save():
+            container = db.get_or_404(Container, container_id)
+            container.container_number = container_number if container_number else None
+            container.name = name
+            
+            # Clear existing box assignments
+            for box in container.boxes:
+                box.container_id = None
+            
+            # Clear existing custom boxes
+            CustomBox.query.filter_by(container_id=container.id).delete()
+            _fill_container(container, box_ids, custom_boxes)
+
+        write(save)
         flash('Container updated successfully!', 'success')
         return redirect(url_for('containers'))
     
@@ -781,21 +2842,24 @@ def edit_container(container_id):
 
 @app.route('/containers/<int:container_id>/delete', methods=['POST'])
 def delete_container(container_id):
-    container = Container.query.get_or_404(container_id)
-    
-    # Remove container assignment from all boxes
-    for box in container.boxes:
-        box.container_id = None
-    
-    # Delete the container (custom boxes will be deleted due to cascade)
-    db.session.delete(container)
-    db.session.commit()
+    Container.query.get_or_404(container_id)
+
+    def delete():
+        container = db.get_or_404(Container, container_id)
+        
+        # Remove container assignment from all boxes
+        for box in container.boxes:
+            box.container_id = None
+        
+        # Delete the container (custom boxes will be deleted due to cascade)
+        db.session.delete(container)
+
+    write(delete)
     flash('Container deleted successfully!', 'success')
     return redirect(url_for('containers'))
 
-@app.route('/containers/<int:container_id>/export')
-def export_container(container_id):
-    container = Container.query.get_or_404(container_id)
+def container_report_csv(container):
+    """CSV report of a container's product totals."""
     totals = container.calculate_totals()
     
     # Create CSV content
@@ -810,19 +2874,33 @@ def export_container(container_id):
     
     output = si.getvalue()
     si.close()
+    return output
+
+def container_report_filename(container):
+    return f'container_report_{container.name}_{container.date.strftime("%Y%m%d")}.csv'
+
+@app.route('/containers/<int:container_id>/export')
+def export_container(container_id):
+    container = get_container_or_archived(container_id)
+
+    # ?async=1 builds the report in the background (see /api/jobs)
+    if request.args.get('async'):
+        return _job_accepted(enqueue_job('container_export', {'container_id': container.id}))
     
     # Create response with CSV content
-    from flask import Response
     return Response(
-        output,
+        container_report_csv(container),
         mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=container_report_{container.name}_{container.date.strftime("%Y%m%d")}.csv'}
+        headers={'Content-Disposition': f'attachment; filename={container_report_filename(container)}'}
     )
 
 @app.route('/warehouse')
 def warehouse():
+    # Read before the boxes so the page's live feed replays anything committed meanwhile
+    last_event_id = latest_inventory_event_id()
+
     # Get all boxes that are not assigned to any container (Available boxes)
-    available_boxes = Box.query.filter_by(container_id=None).all()
+    available_boxes = Box.query.options(selectinload(Box.contents)).filter_by(container_id=None).all()
     
     # Calculate totals for available boxes
     totals = {}
@@ -847,12 +2925,13 @@ def warehouse():
                 lcd_sizes[size] = 0
             lcd_sizes[size] += quantity
     
-    return render_template('warehouse.html', 
+    return stream_page('warehouse.html',
                          available_boxes=available_boxes,
                          totals=totals, 
                          lcd_sizes=lcd_sizes,
                          total_weight=total_weight,
-                         total_box_count=len(available_boxes))
+                         total_box_count=len(available_boxes),
+                         last_event_id=last_event_id)
 
 @app.errorhandler(500)
 def internal_error(error):
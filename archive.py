@@ -0,0 +1,99 @@
+"""
+Archive tier for shipped containers.
+
+Old containers are moved, with their boxes, box contents and custom boxes,
+from the live tables into `archived_*` tables with the same columns and IDs,
+so the live tables and their indexes only hold current inventory. The
+archive tables live either in the main database or in a separate SQLite
+file attached as schema "archive" (prefix "archive.").
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+
+
+# (live table, archive table, columns copied as-is)
+ARCHIVE_TABLES = (
+    ("container", "archived_container", ("id", "container_number", "name", "date")),
+    ("box", "archived_box", ("id", "box_number", "weight", "box_type", "created_at", "container_id")),
+    ("box_content", "archived_box_content", ("id", "box_id", "section", "product_type", "quantity", "lcd_size")),
+    ("custom_box", "archived_custom_box", ("id", "container_id", "weight", "product_type", "quantity")),
+)
+
+# Rows of each live table that belong to the containers in :ids
+_OWNED_ROWS = {
+    "container": "id IN ({ids})",
+    "box": "container_id IN ({ids})",
+    "box_content": "box_id IN (SELECT id FROM box WHERE container_id IN ({ids}))",
+    "custom_box": "container_id IN ({ids})",
+}
+
+
+def _id_params(ids: Sequence[int]):
+    params = {f"id{i}": value for i, value in enumerate(ids)}
+    return params, ", ".join(f":{name}" for name in params)
+
+
+def tables_reusing_ids(connection: Connection) -> List[str]:
+    """
+    Live tables created without AUTOINCREMENT.
+
+    SQLite gives such tables max(id) + 1 for new rows, so once the newest
+    rows are archived or deleted their IDs are handed out again and the
+    live and archived rows collide. Archiving needs every live table to be
+    AUTOINCREMENT, which never reuses an ID.
+    """
+    schema = dict(connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).all())
+    return [table for table, _, _ in ARCHIVE_TABLES if "AUTOINCREMENT" not in schema.get(table, "").upper()]
+
+
+def archivable_container_ids(connection: Connection, cutoff: datetime, limit: int) -> List[int]:
+    """IDs of up to `limit` containers dated before `cutoff`, oldest first."""
+    return list(connection.execute(text(
+        "SELECT id FROM container WHERE date < :cutoff ORDER BY date, id LIMIT :limit"
+    ).bindparams(bindparam("cutoff", type_=DateTime)), {"cutoff": cutoff, "limit": limit}).scalars())
+
+
+def count_owned_rows(connection: Connection, container_ids: Sequence[int]) -> Dict[str, int]:
+    """Number of live rows per table that archiving `container_ids` would move."""
+    params, placeholders = _id_params(container_ids)
+    return {
+        table: connection.execute(
+            text(f"SELECT COUNT(*) FROM {table} WHERE " + _OWNED_ROWS[table].format(ids=placeholders)), params
+        ).scalar()
+        for table, _, _ in ARCHIVE_TABLES
+    }
+
+
+def archive_containers(connection: Connection, container_ids: Sequence[int], prefix: str = "",
+                       archived_at: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Copy the containers and everything they hold into the archive tables and
+    delete them from the live tables, within the caller's transaction.
+    Returns the number of rows moved per live table.
+    """
+    if not container_ids:
+        return {table: 0 for table, _, _ in ARCHIVE_TABLES}
+    params, placeholders = _id_params(container_ids)
+    params["archived_at"] = archived_at or datetime.utcnow()
+
+    moved = {}
+    for table, archive_table, columns in ARCHIVE_TABLES:
+        column_list = ", ".join(columns)
+        where = _OWNED_ROWS[table].format(ids=placeholders)
+        if table == "container":
+            moved[table] = connection.execute(text(
+                f"INSERT INTO {prefix}{archive_table} ({column_list}, archived_at) "
+                f"SELECT {column_list}, :archived_at FROM {table} WHERE {where}"
+            ).bindparams(bindparam("archived_at", type_=DateTime)), params).rowcount
+        else:
+            moved[table] = connection.execute(text(
+                f"INSERT INTO {prefix}{archive_table} ({column_list}) SELECT {column_list} FROM {table} WHERE {where}"
+            ), params).rowcount
+
+    # Children first; box_content is found through box, so it goes before box
+    for table in ("box_content", "custom_box", "box", "container"):
+        connection.execute(text(f"DELETE FROM {table} WHERE " + _OWNED_ROWS[table].format(ids=placeholders)), params)
+    return moved
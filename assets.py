@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always built
+    brotli = None
+
+
+MANIFEST_NAME = "manifest.json"
+ASSET_EXTENSIONS = (".css", ".js")
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _fingerprinted_name(relative_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{digest}{ext}"
+
+
+def build_assets(static_folder: str, output_dir: str) -> Dict[str, str]:
+    """
+    Copy CSS/JS under `static_folder` into `output_dir` with a content hash in
+    the file name, alongside gzip (and brotli, if installed) variants.
+
+    Writes and returns the manifest mapping original to fingerprinted paths.
+    Files in `output_dir` from previous builds are removed.
+    """
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    manifest: Dict[str, str] = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        # Never fingerprint our own output
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != output_dir]
+        for filename in sorted(filenames):
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            source = os.path.join(dirpath, filename)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            target_name = _fingerprinted_name(relative, digest)
+            target = os.path.join(output_dir, target_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            # mtime=0 keeps the gzip output identical across builds
+            with open(target + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+
+            manifest[relative] = target_name
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(output_dir: str) -> Dict[str, str]:
+    """Return the manifest written by build_assets, or {} if assets were not built."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def choose_variant(output_dir: str, filename: str, accepted: List[str]) -> Tuple[str, Optional[str]]:
+    """
+    Pick the precompressed file to send for `filename`.
+
+    `accepted` lists the encodings the client accepts. Returns the file name
+    relative to `output_dir` and the Content-Encoding to send (None for the
+    uncompressed file).
+    """
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(os.path.join(output_dir, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
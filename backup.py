@@ -0,0 +1,198 @@
+"""
+Online backups of the SQLite database files.
+
+Snapshots are taken with SQLite's backup API a few pages per step, pausing
+between steps. The source is only read-locked during a step, so writers
+wait for one step at most, never for the whole copy. A write from another
+connection makes SQLite restart the copy. After `max_restarts` restarts,
+the rest is copied in a single step, so a busy database still gets backed
+up.
+
+Each snapshot is written to a temporary file, checked with PRAGMA
+quick_check, optionally gzipped, and then renamed into place. A backup
+directory therefore never holds a partial snapshot.
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; scheduled backups then aren't coordinated between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+
+class BackupResult(NamedTuple):
+    path: str
+    database_bytes: int
+    snapshot_bytes: int
+    restarts: int
+    seconds: float
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.database_bytes / 1024 / 1024 / max(self.seconds, 1e-6)
+
+
+class BackupError(Exception):
+    """The snapshot failed its integrity check."""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _snapshot_pattern(prefix: str) -> "re.Pattern[str]":
+    return re.compile(rf"^{re.escape(prefix)}-(\d{{8}}T\d{{6}})\.db(\.gz)?$")
+
+
+def _copy_database(source_path: str, target_path: str, step_pages: int, pause: float,
+                   max_restarts: int) -> int:
+    """Copy `source_path` to `target_path` with the backup API; returns the number of restarts."""
+    restarts = 0
+    remaining_before: Optional[int] = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, remaining_before
+        # SQLite starts over when another connection wrote to the source
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        remaining_before = remaining
+        if remaining:
+            time.sleep(pause)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=step_pages, progress=progress)
+        except _TooManyRestarts:
+            logger.info(f"{source_path} kept changing during the backup; copying the rest in one step")
+            source.backup(target, pages=-1)
+        problems = [row[0] for row in target.execute("PRAGMA quick_check") if row[0] != "ok"]
+        if problems:
+            raise BackupError(f"Snapshot of {source_path} failed its check: {'; '.join(problems[:5])}")
+    finally:
+        target.close()
+        source.close()
+    return restarts
+
+
+def backup_database(source_path: str, directory: str, prefix: str, step_pages: int = 1024,
+                    pause: float = 0.05, compress: bool = True, max_restarts: int = 10) -> BackupResult:
+    """Write a consistent snapshot of `source_path` to `directory` as <prefix>-<timestamp>.db[.gz]."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{prefix}-{datetime.utcnow():{TIMESTAMP_FORMAT}}.db"
+    partial = os.path.join(directory, f".{name}.partial")
+    started = time.perf_counter()
+    try:
+        restarts = _copy_database(source_path, partial, step_pages, pause, max_restarts)
+        database_bytes = os.path.getsize(partial)
+        if compress:
+            name += ".gz"
+            with open(partial, "rb") as raw, gzip.open(f"{partial}.gz", "wb", compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            os.remove(partial)
+            partial += ".gz"
+        path = os.path.join(directory, name)
+        os.replace(partial, path)
+    finally:
+        for leftover in (partial, f"{partial}.gz"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return BackupResult(path, database_bytes, os.path.getsize(path), restarts, time.perf_counter() - started)
+
+
+def list_snapshots(directory: str, prefix: str) -> List[str]:
+    """Paths of the snapshots of `prefix` in `directory`, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    pattern = _snapshot_pattern(prefix)
+    names = sorted((pattern.match(name).group(1), name) for name in os.listdir(directory) if pattern.match(name))
+    return [os.path.join(directory, name) for _, name in names]
+
+
+def latest_snapshot_time(directory: str, prefix: str) -> Optional[datetime]:
+    snapshots = list_snapshots(directory, prefix)
+    if not snapshots:
+        return None
+    stamp = _snapshot_pattern(prefix).match(os.path.basename(snapshots[-1])).group(1)
+    return datetime.strptime(stamp, TIMESTAMP_FORMAT)
+
+
+def prune_snapshots(directory: str, prefix: str, keep: int) -> List[str]:
+    """Delete all but the newest `keep` snapshots of `prefix`; returns the deleted paths."""
+    snapshots = list_snapshots(directory, prefix)
+    doomed = snapshots[:max(len(snapshots) - keep, 0)]
+    for path in doomed:
+        os.remove(path)
+    return doomed
+
+
+@contextmanager
+def _exclusive_lock(path: str) -> Iterator[bool]:
+    """Hold an exclusive lock on `path` if no other process does; yields whether it was taken."""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class BackupScheduler:
+    """
+    Background thread that calls `run()` whenever `due()` says a backup is
+    due, checking every `check_every` seconds. A lock file makes sure only
+    one of the app's worker processes runs it; `due()` is asked again once
+    the lock is held, so a backup another worker just finished is not repeated.
+    """
+
+    def __init__(self, run: Callable[[], None], due: Callable[[], bool], lock_path: str,
+                 check_every: float = 60.0):
+        self.run = run
+        self.due = due
+        self.lock_path = lock_path
+        self.check_every = check_every
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="backup-scheduler", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.check_every)
+            try:
+                if not self.due():
+                    continue
+                with _exclusive_lock(self.lock_path) as locked:
+                    if locked and self.due():
+                        self.run()
+            except Exception:
+                logger.exception("Scheduled backup failed")
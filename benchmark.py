@@ -0,0 +1,185 @@
+"""
+Route-level benchmark for the warehouse app.
+
+Builds a throwaway SQLite database, grows it to each requested size with
+synthetic data (see the `generate-data` CLI command) and measures latency
+and SQL query counts for the main pages. Results are written as JSON so
+runs can be compared:
+
+    python benchmark.py --sizes 1000,10000,100000 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _measure(client, counter: Dict[str, int], method: str, url: str,
+             repeat: int, payload: Optional[Callable[[int], Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Issue the same request `repeat` times and summarize latency and queries."""
+    latencies = []
+    queries = []
+    status = None
+    size = 0
+    for i in range(repeat):
+        counter['queries'] = 0
+        start = time.perf_counter()
+        if method == 'POST':
+            response = client.post(url, json=payload(i) if payload else None)
+        else:
+            response = client.get(url)
+        body = response.get_data()  # Consume streamed bodies inside the timing
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter['queries'])
+        status = response.status_code
+        size = len(body)
+
+    return {
+        'method': method,
+        'url': url,
+        'status': status,
+        'bytes': size,
+        'queries': max(queries),
+        'min_ms': round(min(latencies), 2),
+        'median_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+def run(sizes: List[int], repeat: int, database: str, seed: int) -> Dict[str, Any]:
+    # The app reads DATABASE_URL at import time, so point it at the
+    # scratch database before importing anything from it.
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(database)}'
+    from sqlalchemy import event, func
+
+    from app import app, db, Box, Container, generate_warehouse_data
+
+    results: Dict[str, Any] = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': repeat,
+        'sizes': {},
+    }
+
+    with app.app_context():
+        db.create_all()
+        counter = {'queries': 0}
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args, **kwargs):
+            counter['queries'] += 1
+
+        client = app.test_client()
+        api_counter = {'next': 0}
+
+        def new_box_payload(i: int) -> Dict[str, Any]:
+            api_counter['next'] += 1
+            return {
+                'box_number': f'BENCH-{api_counter["next"]}',
+                'weight': 120.5,
+                'contents': [
+                    {'product_type': 'Laptops', 'quantity': 12},
+                    {'product_type': 'LCDs', 'quantity': 8, 'lcd_size': '24"'},
+                ],
+            }
+
+        for size in sizes:
+            existing = db.session.query(func.count(Box.id)).scalar()
+            if size > existing:
+                print(f'Generating {size - existing} boxes...', file=sys.stderr)
+                start = time.perf_counter()
+                generate_warehouse_data(
+                    size - existing,
+                    container_count=max(1, (size - existing) // 100),
+                    seed=seed + size,
+                )
+                print(f'  done in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+            # Benchmark the fullest container, which is the worst case for
+            # the details page and the export
+            container_id = (
+                db.session.query(Box.container_id)
+                .filter(Box.container_id.isnot(None))
+                .group_by(Box.container_id)
+                .order_by(func.count(Box.id).desc())
+                .limit(1)
+                .scalar()
+            ) or db.session.query(func.min(Container.id)).scalar()
+            db.session.remove()
+
+            routes = {
+                'boxes': ('GET', '/boxes', None),
+                'boxes_all': ('GET', '/boxes?show_in_containers=true', None),
+                'containers': ('GET', '/containers', None),
+                'container_details': ('GET', f'/containers/{container_id}', None),
+                'warehouse': ('GET', '/warehouse', None),
+                'container_export': ('GET', f'/containers/{container_id}/export', None),
+                'api_create_box': ('POST', '/api/boxes', new_box_payload),
+            }
+
+            size_results = {
+                'boxes': db.session.query(func.count(Box.id)).scalar(),
+                'containers': db.session.query(func.count(Container.id)).scalar(),
+                'routes': {},
+            }
+            db.session.remove()
+            for name, (method, url, payload) in routes.items():
+                print(f'[{size}] {method} {url}', file=sys.stderr)
+                size_results['routes'][name] = _measure(client, counter, method, url, repeat, payload)
+            results['sizes'][str(size)] = size_results
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma separated box counts to benchmark (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Requests per route (default: %(default)s)')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file (default: %(default)s)')
+    parser.add_argument('--database', default=None,
+                        help='SQLite file to build the data in (default: a temporary file)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for generated data')
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(',') if size.strip())
+    if args.database:
+        database = args.database
+    else:
+        fd, database = tempfile.mkstemp(prefix='warehouse-bench-', suffix='.db')
+        os.close(fd)
+        os.unlink(database)
+
+    results = run(sizes, args.repeat, database, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for size, size_results in results['sizes'].items():
+        print(f'\n{size} boxes')
+        for name, stats in size_results['routes'].items():
+            print(f"  {name:<18} median {stats['median_ms']:>9.1f} ms  p95 {stats['p95_ms']:>9.1f} ms  "
+                  f"queries {stats['queries']:>6}  status {stats['status']}")
+    print(f'\nResults written to {args.output}')
+
+    if not args.database:
+        os.unlink(database)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
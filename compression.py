@@ -0,0 +1,128 @@
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import Flask, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+}
+
+# Streamed bodies are compressed and flushed in blocks of about this size,
+# so the client gets early bytes without one tiny frame per template chunk
+STREAM_BLOCK_SIZE = 16 * 1024
+
+
+class _GzipStream:
+    def __init__(self, level: int) -> None:
+        # wbits=31 selects the gzip container instead of raw zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _choose_encoding(app: Flask) -> Optional[str]:
+    for encoding in app.config["COMPRESS_ALGORITHMS"]:
+        if encoding == "br" and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _stream_compressor(app: Flask, encoding: str):
+    if encoding == "br":
+        return _BrotliStream(app.config["COMPRESS_BR_LEVEL"])
+    return _GzipStream(app.config["COMPRESS_LEVEL"])
+
+
+def _compress_stream(body: Iterable[bytes], compressor) -> Iterator[bytes]:
+    buffer = []
+    buffered = 0
+    try:
+        for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= STREAM_BLOCK_SIZE:
+                yield compressor.compress(b"".join(buffer))
+                buffer = []
+                buffered = 0
+        yield compressor.compress(b"".join(buffer)) + compressor.finish()
+    finally:
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+
+
+def configure_compression(app: Flask) -> None:
+    """
+    Compress text responses with brotli or gzip when the client accepts it.
+
+    Buffered responses are compressed when at least COMPRESS_MIN_SIZE bytes;
+    streamed responses are always compressed block by block as they are
+    generated. Reads COMPRESS_ENABLED, COMPRESS_ALGORITHMS (preference
+    order), COMPRESS_LEVEL (gzip), COMPRESS_BR_LEVEL and COMPRESS_MIN_SIZE
+    from the app config.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config["COMPRESS_ENABLED"] or request.method == "HEAD":
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = _choose_encoding(app)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, _stream_compressor(app, encoding))
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+                return response
+            compressor = _stream_compressor(app, encoding)
+            response.set_data(compressor.compress(data) + compressor.finish())
+
+        response.headers["Content-Encoding"] = encoding
+        # The compressed bytes differ from the original, so a strong ETag no longer holds
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
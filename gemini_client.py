@@ -6,6 +6,9 @@ import requests
 
 
 GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+# Override to point voice parsing at a local stub (see gemini_stub.py)
+GEMINI_API_BASE_ENV = "GEMINI_API_BASE"
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com"
 
 
 class GeminiUnavailable(Exception):
@@ -19,32 +22,7 @@ def _get_api_key() -> str:
     return api_key
 
 
-def interpret_box_speech(transcript: str, current_state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Call Gemini to interpret spoken warehouse box description into structured JSON.
-
-    Returns a dict with:
-      {
-        "box_number": Optional[str],
-        "weight": Optional[float],
-        "contents": [
-          {"product_type": str, "quantity": int, "lcd_size": Optional[str]}
-        ],
-        "notes": [str]
-      }
-
-    Raises:
-      GeminiUnavailable: if key is missing or Gemini is unreachable.
-      ValueError: if the returned JSON is invalid.
-    """
-    api_key = _get_api_key()
-
-    # Normalize current state to keep prompt small and predictable
-    box_number = current_state.get("box_number")
-    weight = current_state.get("weight")
-    contents = current_state.get("contents") or []
-
-    system_instructions = """
+SYSTEM_INSTRUCTIONS = """
 You are a warehouse box data parser for a tech recycling company.
 
 Your ONLY job is to convert the operator's spoken description of a single box
@@ -77,76 +55,85 @@ Output RULES (very important):
       { "error": "human friendly message" }
 """
 
-    examples = [
-        {
-            "input": "box 1221, 45 pounds, 12 laptops and 15 twenty inch square LCDs",
-            "current_box": {"box_number": None, "weight": None, "contents": []},
-            "output": {
-                "box_number": "1221",
-                "weight": 45,
-                "contents": [
-                    {"product_type": "Laptops", "quantity": 12, "lcd_size": None},
-                    {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
-                ],
-                "notes": ["Parsed 20 inch square as 20\"S"],
-            },
+# Worked examples sent with every prompt; voice_corpus.jsonl starts with these
+PROMPT_EXAMPLES: List[Dict[str, Any]] = [
+    {
+        "input": "box 1221, 45 pounds, 12 laptops and 15 twenty inch square LCDs",
+        "current_box": {"box_number": None, "weight": None, "contents": []},
+        "output": {
+            "box_number": "1221",
+            "weight": 45,
+            "contents": [
+                {"product_type": "Laptops", "quantity": 12, "lcd_size": None},
+                {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
+            ],
+            "notes": ["Parsed 20 inch square as 20\"S"],
         },
+    },
+    {
+        "input": "add 10 more laptops and 5 twenty four inch LCD monitors",
+        "current_box": {
+            "box_number": "1221",
+            "weight": 45,
+            "contents": [
+                {"product_type": "Laptops", "quantity": 12, "lcd_size": None},
+                {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
+            ],
+        },
+        "output": {
+            "box_number": "1221",
+            "weight": 45,
+            "contents": [
+                {"product_type": "Laptops", "quantity": 22, "lcd_size": None},
+                {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
+                {"product_type": "LCDs", "quantity": 5, "lcd_size": "24\""},
+            ],
+            "notes": ["Accumulated laptops quantity from 12 to 22"],
+        },
+    },
+]
+
+# Use current free-tier friendly model + stable v1 endpoint.
+# You can swap the model name if Google updates recommendations.
+MODEL_NAME = "gemini-2.5-flash-lite"
+
+
+def build_prompt(transcript: str, current_state: Dict[str, Any]) -> str:
+    """The prompt text sent to Gemini for `transcript` spoken over `current_state`."""
+    # Normalize current state to keep prompt small and predictable
+    return json.dumps(
         {
-            "input": "add 10 more laptops and 5 twenty four inch LCD monitors",
+            "instructions": SYSTEM_INSTRUCTIONS,
             "current_box": {
-                "box_number": "1221",
-                "weight": 45,
-                "contents": [
-                    {"product_type": "Laptops", "quantity": 12, "lcd_size": None},
-                    {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
-                ],
-            },
-            "output": {
-                "box_number": "1221",
-                "weight": 45,
-                "contents": [
-                    {"product_type": "Laptops", "quantity": 22, "lcd_size": None},
-                    {"product_type": "LCDs", "quantity": 15, "lcd_size": "20\"S"},
-                    {"product_type": "LCDs", "quantity": 5, "lcd_size": "24\""},
-                ],
-                "notes": ["Accumulated laptops quantity from 12 to 22"],
+                "box_number": current_state.get("box_number"),
+                "weight": current_state.get("weight"),
+                "contents": current_state.get("contents") or [],
             },
+            "examples": PROMPT_EXAMPLES,
+            "transcript": transcript,
         },
-    ]
+        ensure_ascii=False,
+    )
+
+
+def request_interpretation(prompt: str) -> Dict[str, Any]:
+    """
+    Send `prompt` to Gemini and return its raw generateContent response,
+    including `usageMetadata` with the prompt and response token counts.
 
+    Raises:
+      GeminiUnavailable: if key is missing or Gemini is unreachable.
+    """
+    api_key = _get_api_key()
     payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {
-                        "text": json.dumps(
-                            {
-                                "instructions": system_instructions,
-                                "current_box": {
-                                    "box_number": box_number,
-                                    "weight": weight,
-                                    "contents": contents,
-                                },
-                                "examples": examples,
-                                "transcript": transcript,
-                            },
-                            ensure_ascii=False,
-                        )
-                    }
-                ],
-            }
-        ],
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
         "generationConfig": {
             "temperature": 0.1,
             "maxOutputTokens": 512,
         },
     }
-
-    # Use current free-tier friendly model + stable v1 endpoint.
-    # You can swap the model name if Google updates recommendations.
-    model_name = "gemini-2.5-flash-lite"
-    url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:generateContent"
+    api_base = os.getenv(GEMINI_API_BASE_ENV, DEFAULT_API_BASE).rstrip("/")
+    url = f"{api_base}/v1/models/{MODEL_NAME}:generateContent"
     try:
         response = requests.post(url, params={"key": api_key}, json=payload, timeout=10)
     except requests.RequestException as exc:
@@ -155,8 +142,16 @@ Output RULES (very important):
     if response.status_code != 200:
         raise GeminiUnavailable(f"Gemini HTTP {response.status_code}: {response.text}")
 
-    data = response.json()
+    return response.json()
 
+
+def parse_interpretation(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The JSON object the model answered with in a generateContent response.
+
+    Raises:
+      ValueError: if the returned JSON is invalid.
+    """
     try:
         text = data["candidates"][0]["content"]["parts"][0]["text"]
     except (KeyError, IndexError) as exc:
@@ -170,3 +165,75 @@ Output RULES (very important):
     return parsed
 
 
+def interpret_box_speech(transcript: str, current_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Call Gemini to interpret spoken warehouse box description into structured JSON.
+
+    Returns a dict with:
+      {
+        "box_number": Optional[str],
+        "weight": Optional[float],
+        "contents": [
+          {"product_type": str, "quantity": int, "lcd_size": Optional[str]}
+        ],
+        "notes": [str]
+      }
+
+    Raises:
+      GeminiUnavailable: if key is missing or Gemini is unreachable.
+      ValueError: if the returned JSON is invalid.
+    """
+    return parse_interpretation(request_interpretation(build_prompt(transcript, current_state)))
+
+
+def normalize_interpretation(result: Any, current_state: Dict[str, Any],
+                             product_types: List[str]) -> Dict[str, Any]:
+    """
+    The merged box state to show the operator: the model's answer with
+    unknown product types and non-positive quantities dropped, falling back
+    to `current_state` for fields it left out. Returns {"error": message}
+    when the model reported an error or nothing usable was parsed.
+    """
+    # If LLM chose to return an explicit error, pass it through
+    if not isinstance(result, dict):
+        return {"error": "Could not parse any usable data from speech"}
+    if result.get("error"):
+        return {"error": result["error"]}
+
+    box_number = result.get("box_number", current_state.get("box_number"))
+    weight = result.get("weight", current_state.get("weight"))
+    contents = result.get("contents", current_state.get("contents"))
+    notes = result.get("notes", [])
+
+    normalized_contents = []
+    for item in contents or []:
+        product_type = item.get("product_type")
+        quantity = item.get("quantity")
+        lcd_size = item.get("lcd_size")
+
+        if not product_type or quantity is None:
+            continue
+
+        try:
+            quantity_int = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity_int <= 0:
+            continue
+
+        # Only allow known product types
+        if product_type not in product_types:
+            continue
+
+        normalized_contents.append(
+            {
+                "product_type": product_type,
+                "quantity": quantity_int,
+                "lcd_size": lcd_size if product_type == "LCDs" else None,
+            }
+        )
+
+    if not normalized_contents and not box_number and weight is None:
+        return {"error": "Could not parse any usable data from speech"}
+
+    return {"box_number": box_number, "weight": weight, "contents": normalized_contents, "notes": notes}
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the Gemini generateContent endpoint.
+
+Answers with the same response envelope as Gemini, merging a rough
+regex parse of the transcript into the current box state, after a
+log-normally distributed delay. Point the app at it with:
+
+    python gemini_stub.py --port 8081
+    GEMINI_API_BASE=http://127.0.0.1:8081 GEMINI_API_KEY=stub gunicorn -w 3 app:app
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+PRODUCT_PATTERNS = [
+    (re.compile(r"laptops?"), "Laptops"),
+    (re.compile(r"pcs?|computers?|desktops?"), "PCs"),
+    (re.compile(r"lcds?|monitors?|screens?|displays?"), "LCDs"),
+    (re.compile(r"servers?"), "Servers"),
+    (re.compile(r"switch(?:es)?"), "Switches"),
+    (re.compile(r"wires?|cables?"), "Wires"),
+    (re.compile(r"keyboards?"), "Keyboards"),
+    (re.compile(r"stands?"), "Stands"),
+]
+
+BOX_NUMBER_RE = re.compile(r"\bbox(?:\s+number)?\s+([a-z0-9-]+)")
+WEIGHT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:pounds|pound|lbs?)\b")
+ITEM_RE = re.compile(
+    r"(\d+)\s+(?:more\s+)?((?:[a-z0-9\"-]+\s+){0,4}?)("
+    + "|".join(pattern.pattern for pattern, _ in PRODUCT_PATTERNS)
+    + r")(?=[\s,.]|$)"
+)
+SIZE_RE = re.compile(r"(borderless\s+)?(\d{2})\s*(?:\"|inch|in)?\s*(square|wide|widescreen|s|w)?\b")
+
+
+def _lcd_size(descriptor: str) -> Optional[str]:
+    match = SIZE_RE.search(descriptor)
+    if not match:
+        return None
+    borderless, inches, shape = match.groups()
+    size = f'{inches}"'
+    if shape in ("square", "s"):
+        size += "S"
+    elif shape in ("wide", "widescreen", "w"):
+        size += "W"
+    return f"Borderless {size}" if borderless else size
+
+
+def parse_transcript(transcript: str, current_box: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a best-effort parse of `transcript` into `current_box`."""
+    text = transcript.lower()
+    box_number = current_box.get("box_number")
+    weight = current_box.get("weight")
+    contents: List[Dict[str, Any]] = [dict(item) for item in current_box.get("contents") or []]
+    notes: List[str] = []
+
+    match = BOX_NUMBER_RE.search(text)
+    if match:
+        box_number = match.group(1)
+    match = WEIGHT_RE.search(text)
+    if match:
+        weight = float(match.group(1))
+        text = text[:match.start()] + text[match.end():]
+
+    parsed_any = False
+    for quantity, descriptor, noun in ITEM_RE.findall(text):
+        for pattern, product_type in PRODUCT_PATTERNS:
+            if pattern.fullmatch(noun):
+                break
+        else:
+            continue
+        parsed_any = True
+        lcd_size = _lcd_size(descriptor) if product_type == "LCDs" else None
+        for item in contents:
+            if item.get("product_type") == product_type and item.get("lcd_size") == lcd_size:
+                item["quantity"] = int(item.get("quantity") or 0) + int(quantity)
+                notes.append(f"Accumulated {product_type} to {item['quantity']}")
+                break
+        else:
+            contents.append({"product_type": product_type, "quantity": int(quantity), "lcd_size": lcd_size})
+
+    if not parsed_any and box_number == current_box.get("box_number") and weight == current_box.get("weight"):
+        return {"error": "Could not understand the description"}
+    return {"box_number": box_number, "weight": weight, "contents": contents, "notes": notes}
+
+
+def gemini_envelope(text: str, prompt_chars: int) -> Dict[str, Any]:
+    """Wrap `text` the way Gemini's generateContent response does."""
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }
+        ],
+        "usageMetadata": {
+            # Roughly four characters per token, like Gemini's tokenizer on English/JSON
+            "promptTokenCount": math.ceil(prompt_chars / 4),
+            "candidatesTokenCount": math.ceil(len(text) / 4),
+            "totalTokenCount": math.ceil((prompt_chars + len(text)) / 4),
+        },
+        "modelVersion": "stub",
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "GeminiStub/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        if not self.path.split("?")[0].endswith(":generateContent"):
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        try:
+            payload = json.loads(raw)
+            prompt = json.loads(payload["contents"][0]["parts"][0]["text"])
+        except (ValueError, KeyError, IndexError):
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid request", "status": "INVALID_ARGUMENT"}})
+            return
+
+        delay = self.server.sample_latency()
+        time.sleep(delay)
+
+        if random.random() < self.server.error_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+            return
+
+        result = parse_transcript(prompt.get("transcript", ""), prompt.get("current_box") or {})
+        self._send_json(200, gemini_envelope(json.dumps(result), len(raw)))
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, median_ms: float, sigma: float, error_rate: float, quiet: bool):
+        super().__init__(address, StubHandler)
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.quiet = quiet
+
+    def sample_latency(self) -> float:
+        """Seconds to wait, log-normal around the configured median."""
+        return random.lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--median-ms", type=float, default=650.0,
+                        help="Median response latency in milliseconds (default: %(default)s)")
+    parser.add_argument("--sigma", type=float, default=0.35,
+                        help="Log-normal shape; larger values give a longer tail (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with HTTP 503 (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request")
+    args = parser.parse_args(argv)
+
+    server = StubServer((args.host, args.port), args.median_ms, args.sigma, args.error_rate, args.quiet)
+    print(f"Gemini stub listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Server-side store of idempotency keys and the responses they produced.
+
+A client that retries a write with the same key gets the stored response
+back instead of the write running twice. Keys are namespaced by a scope
+(usually the endpoint) and stored with a fingerprint of the request body,
+so reusing a key for a different request can be detected.
+
+A key is claimed in the same transaction as the write it guards, so it is
+taken exactly when the write commits: a request that fails leaves nothing
+behind, and of two concurrent requests with one key only the first to
+commit gets to write. The response is stored right after the commit; until
+then the row holds the RESPONSE_PENDING status code. Old rows are evicted
+by age and by count with `evict`.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+
+
+IDEMPOTENCY_TABLE = "idempotency_record"
+
+# Longest key accepted from clients
+MAX_KEY_LENGTH = 100
+
+# Status code stored with the write, until its response is stored
+RESPONSE_PENDING = 0
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: str
+    created_at: datetime
+
+
+class KeyTaken(Exception):
+    """Another request with the same key committed its write first."""
+
+
+def create_idempotency_table(connection: Connection) -> None:
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {IDEMPOTENCY_TABLE} ("
+        "key VARCHAR(150) NOT NULL PRIMARY KEY, "
+        "fingerprint VARCHAR(64) NOT NULL, "
+        "status_code INTEGER NOT NULL, "
+        "body TEXT NOT NULL, "
+        "created_at DATETIME NOT NULL)"
+    ))
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_{IDEMPOTENCY_TABLE}_created_at ON {IDEMPOTENCY_TABLE} (created_at)"
+    ))
+
+
+def valid_key(key: Any) -> bool:
+    return isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a JSON-compatible request body."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def lookup(connection: Connection, scope: str, key: str) -> Optional[StoredResponse]:
+    """The stored response for `key` in `scope`, with a single primary key read."""
+    row = connection.execute(text(
+        f"SELECT fingerprint, status_code, body, created_at FROM {IDEMPOTENCY_TABLE} WHERE key = :key"
+    ).columns(created_at=DateTime), {"key": f"{scope}:{key}"}).first()
+    return StoredResponse(*row) if row else None
+
+
+def claim(connection: Connection, scope: str, key: str, request_fingerprint: str) -> None:
+    """
+    Take `key` for the write in the current transaction, with RESPONSE_PENDING
+    until `complete` stores the response. Raises KeyTaken if the key is
+    already in the table; the caller must then roll the transaction back.
+    """
+    inserted = connection.execute(text(
+        f"INSERT INTO {IDEMPOTENCY_TABLE} (key, fingerprint, status_code, body, created_at) "
+        "VALUES (:key, :fingerprint, :status_code, '', :created_at) ON CONFLICT (key) DO NOTHING"
+    ).bindparams(bindparam("created_at", type_=DateTime)), {
+        "key": f"{scope}:{key}",
+        "fingerprint": request_fingerprint,
+        "status_code": RESPONSE_PENDING,
+        "created_at": datetime.utcnow(),
+    }).rowcount
+    if not inserted:
+        raise KeyTaken(f"Idempotency key {key!r} was used by another request")
+
+
+def complete(connection: Connection, scope: str, key: str, status_code: int, body: str) -> None:
+    """Store the response of the request that claimed `key`."""
+    connection.execute(text(
+        f"UPDATE {IDEMPOTENCY_TABLE} SET status_code = :status_code, body = :body WHERE key = :key"
+    ), {"key": f"{scope}:{key}", "status_code": status_code, "body": body})
+
+
+def remember(connection: Connection, scope: str, key: str, request_fingerprint: str,
+             status_code: int, body: str) -> None:
+    """Store the response for `key`, in the same transaction as the write it describes."""
+    connection.execute(text(
+        f"INSERT INTO {IDEMPOTENCY_TABLE} (key, fingerprint, status_code, body, created_at) "
+        "VALUES (:key, :fingerprint, :status_code, :body, :created_at)"
+    ).bindparams(bindparam("created_at", type_=DateTime)), {
+        "key": f"{scope}:{key}",
+        "fingerprint": request_fingerprint,
+        "status_code": status_code,
+        "body": body,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def evict(connection: Connection, older_than: datetime, max_keys: int) -> int:
+    """Delete keys created before `older_than`, then the oldest beyond `max_keys`."""
+    evicted = connection.execute(text(
+        f"DELETE FROM {IDEMPOTENCY_TABLE} WHERE created_at < :cutoff"
+    ).bindparams(bindparam("cutoff", type_=DateTime)), {"cutoff": older_than}).rowcount
+    evicted += connection.execute(text(
+        f"DELETE FROM {IDEMPOTENCY_TABLE} WHERE key IN ("
+        f"SELECT key FROM {IDEMPOTENCY_TABLE} ORDER BY created_at DESC LIMIT -1 OFFSET :max_keys)"
+    ), {"max_keys": max_keys}).rowcount
+    return evicted
@@ -0,0 +1,210 @@
+"""
+Inventory change events for live dashboards.
+
+Writes record a snapshot of each touched box and container before and after
+the transaction (see the session hooks in app.py); `box_event` and
+`container_event` turn a pair of snapshots into a small JSON-serializable
+event carrying the totals delta per container, where container_id None is
+the pool of available boxes. Events are stored in the `inventory_event`
+table in the same transaction as the change, and an `EventBroadcaster` in
+each process polls that table and fans new rows out to the connected
+server-sent event streams.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Optional[Dict[str, Any]]
+
+
+def _delta(container_id: Optional[int], sign: int, box_count: int, weight: float,
+           totals: Dict[str, int], lcd_sizes: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "container_id": container_id,
+        "box_count": sign * box_count,
+        "weight": sign * weight,
+        "totals": {key: sign * value for key, value in totals.items()},
+        "lcd_sizes": {key: sign * value for key, value in lcd_sizes.items()},
+    }
+
+
+def _merge_deltas(deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Combine deltas per container and drop the ones that cancel out."""
+    merged: Dict[Optional[int], Dict[str, Any]] = {}
+    for delta in deltas:
+        target = merged.setdefault(delta["container_id"], _delta(delta["container_id"], 1, 0, 0.0, {}, {}))
+        target["box_count"] += delta["box_count"]
+        target["weight"] += delta["weight"]
+        for field in ("totals", "lcd_sizes"):
+            for key, value in delta[field].items():
+                target[field][key] = target[field].get(key, 0) + value
+    result = []
+    for delta in merged.values():
+        delta["weight"] = round(delta["weight"], 2)
+        for field in ("totals", "lcd_sizes"):
+            delta[field] = {key: value for key, value in delta[field].items() if value}
+        if delta["box_count"] or delta["weight"] or delta["totals"] or delta["lcd_sizes"]:
+            result.append(delta)
+    return result
+
+
+def box_event(before: Snapshot, after: Snapshot) -> Optional[Dict[str, Any]]:
+    """
+    Describe how a box changed. Snapshots hold id, box_number, weight,
+    box_type, container_id, created_at, totals and lcd_sizes; None means the
+    box did not exist. Returns None when nothing visible changed.
+    """
+    if before == after:
+        return None
+    deltas = []
+    if before is not None:
+        deltas.append(_delta(before["container_id"], -1, 1, before["weight"], before["totals"], before["lcd_sizes"]))
+    if after is not None:
+        deltas.append(_delta(after["container_id"], 1, 1, after["weight"], after["totals"], after["lcd_sizes"]))
+
+    if before is None:
+        event_type = "box_created"
+    elif after is None:
+        event_type = "box_deleted"
+    elif before["container_id"] != after["container_id"]:
+        event_type = "box_moved"
+    else:
+        event_type = "box_updated"
+    event = {"type": event_type, "box": after or before, "deltas": _merge_deltas(deltas)}
+    if event_type == "box_moved":
+        event["from_container_id"] = before["container_id"]
+        event["to_container_id"] = after["container_id"]
+    return event
+
+
+def container_event(before: Snapshot, after: Snapshot) -> Optional[Dict[str, Any]]:
+    """
+    Describe how a container's own fields or custom boxes changed. Snapshots
+    hold id, name, container_number, custom_box_count, custom_weight and
+    custom_totals. Box moves are reported by box_event, not here.
+    """
+    if before == after:
+        return None
+    deltas = []
+    if before is not None:
+        deltas.append(_delta(before["id"], -1, before["custom_box_count"], before["custom_weight"],
+                             before["custom_totals"], {}))
+    if after is not None:
+        deltas.append(_delta(after["id"], 1, after["custom_box_count"], after["custom_weight"],
+                             after["custom_totals"], {}))
+
+    if before is None:
+        event_type = "container_created"
+    elif after is None:
+        event_type = "container_deleted"
+    else:
+        event_type = "container_updated"
+    current = after or before
+    return {
+        "type": event_type,
+        "container": {"id": current["id"], "name": current["name"], "container_number": current["container_number"]},
+        "deltas": _merge_deltas(deltas),
+    }
+
+
+def format_sse(event_id: Optional[int], data: str, event: Optional[str] = None) -> str:
+    """Format one server-sent event message; `data` must be a single line."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    """A connected stream's queue of (event_id, payload) pairs."""
+
+    def __init__(self, max_queued: int) -> None:
+        self.queue: "queue.Queue[Tuple[int, str]]" = queue.Queue(maxsize=max_queued)
+        # Set when the client fell too far behind; it should reconnect and replay
+        self.overflowed = False
+
+    def put(self, item: Tuple[int, str]) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+
+
+class EventBroadcaster:
+    """
+    Polls for new events on one background thread and copies them into every
+    subscriber's queue, so the database is queried once per interval no
+    matter how many displays are connected.
+
+    `fetch(after_id)` returns [(event_id, payload), ...] in id order and
+    `latest_id()` the newest stored event id. `prune()`, when given, is
+    called about once an hour to drop old events.
+    """
+
+    PRUNE_INTERVAL = 3600.0
+
+    def __init__(self, fetch: Callable[[int], List[Tuple[int, str]]], latest_id: Callable[[], int],
+                 poll_interval: float = 1.0, max_queued: int = 200,
+                 prune: Optional[Callable[[], None]] = None) -> None:
+        self._fetch = fetch
+        self._latest_id = latest_id
+        self._prune = prune
+        self.poll_interval = poll_interval
+        self.max_queued = max_queued
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_id = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_queued)
+        with self._lock:
+            self._subscribers.append(subscription)
+            if self._thread is None:
+                self.last_id = self._latest_id()
+                self._thread = threading.Thread(target=self._run, name="inventory-events", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, rows: List[Tuple[int, str]]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for row in rows:
+            for subscription in subscribers:
+                subscription.put(row)
+
+    def _run(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self._subscribers:
+                    rows = self._fetch(self.last_id)
+                    if rows:
+                        self.last_id = rows[-1][0]
+                        self.publish(rows)
+                else:
+                    # Nobody is listening; skip ahead instead of queueing history
+                    self.last_id = self._latest_id()
+                if self._prune is not None and time.monotonic() - last_prune >= self.PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    self._prune()
+            except Exception:
+                logger.exception("Polling inventory events failed")
+
@@ -0,0 +1,145 @@
+"""
+Daily inventory snapshot rollups.
+
+A snapshot row holds, for one day and status ('available' or
+'containerized'), either the status totals (product_type and lcd_size empty:
+box_count, custom_box_count, weight), one product type's quantity (lcd_size
+empty), or one LCD size's quantity (product_type 'LCDs').
+
+Past days are reconstructed from current data: a box counts from the day it
+was created, as available until its container's date and as containerized
+from then on; custom boxes count from their container's date. Archived
+containers still count (as containerized), so archiving changes no totals.
+Boxes deleted or moved since are not visible, so a day snapshotted on the
+day itself is more accurate than one backfilled later.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+AVAILABLE = "available"
+CONTAINERIZED = "containerized"
+STATUSES = (AVAILABLE, CONTAINERIZED)
+
+# (product_type, lcd_size) -> [box_count, custom_box_count, quantity, weight]
+RowKey = Tuple[str, str]
+TOTALS_KEY: RowKey = ("", "")
+
+# (created day, containerized day or None, box count, weight)
+BoxGroup = Tuple[date, Optional[date], int, float]
+# (created day, containerized day or None, product type, LCD size or None, quantity)
+ContentGroup = Tuple[date, Optional[date], str, Optional[str], int]
+# (container day, custom box count, weight, product type, quantity)
+CustomGroup = Tuple[date, int, float, str, int]
+
+
+def _spans(created: date, containerized: Optional[date]) -> Iterator[Tuple[str, date, Optional[date]]]:
+    """(status, first day, day it stops counting or None) for a box's history."""
+    if containerized is None:
+        yield AVAILABLE, created, None
+    elif containerized <= created:
+        yield CONTAINERIZED, created, None
+    else:
+        yield AVAILABLE, created, containerized
+        yield CONTAINERIZED, containerized, None
+
+
+def daily_rollups(box_groups: Iterable[BoxGroup], content_groups: Iterable[ContentGroup],
+                  custom_groups: Iterable[CustomGroup], start: date, end: date
+                  ) -> Dict[date, Dict[str, Dict[RowKey, List[float]]]]:
+    """
+    Totals per day from `start` to `end` inclusive, as
+    {day: {status: {(product_type, lcd_size): [box_count, custom_box_count, quantity, weight]}}}.
+
+    Every group is turned into +/- changes on the days it starts and stops
+    counting, and the days are then walked once with running sums, so the
+    cost grows with the number of groups and days rather than boxes x days.
+    """
+    changes: Dict[date, Dict[Tuple[str, RowKey], List[float]]] = defaultdict(
+        lambda: defaultdict(lambda: [0, 0, 0, 0.0]))
+
+    def add(day: date, status: str, key: RowKey, values: Tuple[float, ...], sign: int) -> None:
+        target = changes[day][(status, key)]
+        for i, value in enumerate(values):
+            target[i] += sign * value
+
+    def add_span(created: date, containerized: Optional[date], key: RowKey, values: Tuple[float, ...]) -> None:
+        for status, first, stop in _spans(created, containerized):
+            add(first, status, key, values, 1)
+            if stop is not None:
+                add(stop, status, key, values, -1)
+
+    for created, containerized, box_count, weight in box_groups:
+        add_span(created, containerized, TOTALS_KEY, (box_count, 0, 0, weight or 0.0))
+    for created, containerized, product_type, lcd_size, quantity in content_groups:
+        add_span(created, containerized, (product_type, ""), (0, 0, quantity or 0, 0.0))
+        if product_type == "LCDs" and lcd_size:
+            add_span(created, containerized, ("LCDs", lcd_size), (0, 0, quantity or 0, 0.0))
+    for container_day, custom_count, weight, product_type, quantity in custom_groups:
+        add(container_day, CONTAINERIZED, TOTALS_KEY, (0, custom_count, 0, weight or 0.0), 1)
+        add(container_day, CONTAINERIZED, (product_type, ""), (0, 0, quantity or 0, 0.0), 1)
+
+    running: Dict[Tuple[str, RowKey], List[float]] = defaultdict(lambda: [0, 0, 0, 0.0])
+
+    def apply(day: date) -> None:
+        for status_key, values in changes.get(day, {}).items():
+            target = running[status_key]
+            for i, value in enumerate(values):
+                target[i] += value
+
+    for day in sorted(day for day in changes if day < start):
+        apply(day)
+
+    rollups = {}
+    day = start
+    while day <= end:
+        apply(day)
+        snapshot: Dict[str, Dict[RowKey, List[float]]] = {status: {} for status in STATUSES}
+        for (status, key), values in running.items():
+            if any(values) or key == TOTALS_KEY:
+                snapshot[status][key] = list(values)
+        for status in STATUSES:
+            snapshot[status].setdefault(TOTALS_KEY, [0, 0, 0, 0.0])
+        rollups[day] = snapshot
+        day += timedelta(days=1)
+    return rollups
+
+
+def snapshot_rows(day: date, snapshot: Dict[str, Dict[RowKey, List[float]]]) -> List[Dict[str, Any]]:
+    """Flatten one day of `daily_rollups` into inventory_snapshot rows."""
+    rows = []
+    for status, entries in snapshot.items():
+        for (product_type, lcd_size), (box_count, custom_box_count, quantity, weight) in entries.items():
+            rows.append({
+                "snapshot_date": day,
+                "status": status,
+                "product_type": product_type,
+                "lcd_size": lcd_size,
+                "box_count": int(box_count),
+                "custom_box_count": int(custom_box_count),
+                "quantity": int(quantity),
+                "weight": round(weight, 2),
+            })
+    return rows
+
+
+def trend_series(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Group snapshot rows (with the inventory_snapshot columns as attributes)
+    into one point per day: {"date", status: {"box_count", "custom_box_count",
+    "total_weight", "totals", "lcd_sizes"}}.
+    """
+    points: Dict[date, Dict[str, Any]] = {}
+    for row in rows:
+        point = points.setdefault(row.snapshot_date, {"date": row.snapshot_date.isoformat()})
+        rollup = point.setdefault(row.status, {"box_count": 0, "custom_box_count": 0, "total_weight": 0.0,
+                                               "totals": {}, "lcd_sizes": {}})
+        if not row.product_type:
+            rollup["box_count"] = row.box_count
+            rollup["custom_box_count"] = row.custom_box_count
+            rollup["total_weight"] = row.weight
+        elif row.lcd_size:
+            rollup["lcd_sizes"][row.lcd_size] = row.quantity
+        else:
+            rollup["totals"][row.product_type] = row.quantity
+    return [points[day] for day in sorted(points)]
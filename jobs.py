@@ -0,0 +1,198 @@
+"""
+Background jobs for heavy reports and exports.
+
+Routes enqueue a job (a row in the `job` table) and return its ID at once;
+a small thread pool in each worker process runs it and writes the result to
+a file that clients download once the job is done. Claiming a job is a
+conditional UPDATE, so with several worker processes each job runs once.
+Threads are used rather than processes: jobs mostly wait on SQLite, and
+threads share the app's engines.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, ContextManager, Dict, NamedTuple, Optional, Union
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+JOB_TABLE = "job"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobResult(NamedTuple):
+    filename: str
+    mimetype: str
+    data: Union[str, bytes]
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting or running to accept another."""
+
+
+def create_job_table(connection: Connection) -> None:
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {JOB_TABLE} ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "kind VARCHAR(50) NOT NULL, "
+        "params TEXT NOT NULL, "
+        "status VARCHAR(20) NOT NULL, "
+        "created_at DATETIME NOT NULL, "
+        "started_at DATETIME, "
+        "finished_at DATETIME, "
+        "error TEXT, "
+        "artifact_path VARCHAR(500), "
+        "artifact_name VARCHAR(200), "
+        "mimetype VARCHAR(100))"
+    ))
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{JOB_TABLE}_status ON {JOB_TABLE} (status)"))
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{JOB_TABLE}_created_at ON {JOB_TABLE} (created_at)"))
+
+
+def _timestamp(statement: str):
+    return text(statement).bindparams(bindparam("now", type_=DateTime))
+
+
+class JobRunner:
+    """
+    Runs registered job kinds on a thread pool of `max_workers` threads per
+    process. `transaction(site)` must return a context manager giving a
+    Connection in a transaction on that site's database, and
+    `run_in_site(site, fn)` must call fn() with the app and site set up.
+    """
+
+    def __init__(self, transaction: Callable[[str], ContextManager[Connection]],
+                 run_in_site: Callable[[str, Callable[[], JobResult]], JobResult],
+                 artifact_dir: str, max_workers: int = 2, max_pending: int = 20,
+                 timeout: timedelta = timedelta(hours=1)):
+        self.transaction = transaction
+        self.run_in_site = run_in_site
+        self.artifact_dir = artifact_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.handlers: Dict[str, Callable[..., JobResult]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._recovered = set()
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: Callable[..., JobResult]) -> None:
+        """Register `handler(**params)` as the job kind `kind`."""
+        self.handlers[kind] = handler
+
+    def _submit(self, site: str, job_id: int) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._executor.submit(self._run, site, job_id)
+
+    def enqueue(self, site: str, kind: str, params: Dict[str, Any]) -> int:
+        """Store a queued job and hand it to this process's pool; returns the job ID."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        self.recover(site)
+        with self.transaction(site) as connection:
+            pending = connection.execute(text(
+                f"SELECT COUNT(*) FROM {JOB_TABLE} WHERE status IN (:queued, :running)"
+            ), {"queued": QUEUED, "running": RUNNING}).scalar()
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs are already queued or running; try again later")
+            job_id = connection.execute(_timestamp(
+                f"INSERT INTO {JOB_TABLE} (kind, params, status, created_at) VALUES (:kind, :params, :status, :now)"
+            ), {"kind": kind, "params": json.dumps(params), "status": QUEUED, "now": datetime.utcnow()}).lastrowid
+        self._submit(site, job_id)
+        return job_id
+
+    def recover(self, site: str) -> None:
+        """
+        Once per process and site: fail jobs that have been running longer
+        than the timeout (their process died), and pick up jobs still queued
+        (their process may have exited before running them).
+        """
+        if site in self._recovered:
+            return
+        self._recovered.add(site)
+        now = datetime.utcnow()
+        with self.transaction(site) as connection:
+            connection.execute(_timestamp(
+                f"UPDATE {JOB_TABLE} SET status = :failed, error = 'Interrupted', finished_at = :now "
+                "WHERE status = :running AND started_at < :cutoff"
+            ).bindparams(bindparam("cutoff", type_=DateTime)),
+                {"failed": FAILED, "running": RUNNING, "now": now, "cutoff": now - self.timeout})
+            queued = [row[0] for row in connection.execute(
+                text(f"SELECT id FROM {JOB_TABLE} WHERE status = :queued ORDER BY id"), {"queued": QUEUED})]
+        for job_id in queued:
+            self._submit(site, job_id)
+
+    def _run(self, site: str, job_id: int) -> None:
+        with self.transaction(site) as connection:
+            claimed = connection.execute(_timestamp(
+                f"UPDATE {JOB_TABLE} SET status = :running, started_at = :now WHERE id = :id AND status = :queued"
+            ), {"running": RUNNING, "queued": QUEUED, "now": datetime.utcnow(), "id": job_id}).rowcount
+            if not claimed:
+                return  # another process or thread got it first
+            kind, params = connection.execute(
+                text(f"SELECT kind, params FROM {JOB_TABLE} WHERE id = :id"), {"id": job_id}).one()
+
+        try:
+            handler = self.handlers[kind]
+            result = self.run_in_site(site, lambda: handler(**json.loads(params)))
+            path = self._write_artifact(site, job_id, result)
+        except Exception as exc:
+            logger.exception(f"Job {job_id} ({kind}) failed")
+            with self.transaction(site) as connection:
+                connection.execute(_timestamp(
+                    f"UPDATE {JOB_TABLE} SET status = :failed, error = :error, finished_at = :now WHERE id = :id"
+                ), {"failed": FAILED, "error": str(exc) or type(exc).__name__, "now": datetime.utcnow(), "id": job_id})
+            return
+
+        with self.transaction(site) as connection:
+            connection.execute(_timestamp(
+                f"UPDATE {JOB_TABLE} SET status = :done, finished_at = :now, artifact_path = :path, "
+                "artifact_name = :name, mimetype = :mimetype WHERE id = :id"
+            ), {"done": DONE, "now": datetime.utcnow(), "path": path, "name": result.filename,
+                "mimetype": result.mimetype, "id": job_id})
+        logger.info(f"Job {job_id} ({kind}) finished")
+
+    def _write_artifact(self, site: str, job_id: int, result: JobResult) -> str:
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", result.filename)
+        path = os.path.join(self.artifact_dir, f"{site}-{job_id}-{safe_name}")
+        data = result.data.encode("utf-8") if isinstance(result.data, str) else result.data
+        with open(path, "wb") as artifact:
+            artifact.write(data)
+        return path
+
+
+def job_status(connection: Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    """The job's row as a dict, or None if there is no such job."""
+    row = connection.execute(text(
+        f"SELECT id, kind, status, created_at, started_at, finished_at, error, artifact_path, artifact_name, "
+        f"mimetype FROM {JOB_TABLE} WHERE id = :id"
+    ).columns(created_at=DateTime, started_at=DateTime, finished_at=DateTime), {"id": job_id}).mappings().first()
+    return dict(row) if row else None
+
+
+def cleanup_jobs(connection: Connection, finished_before: datetime) -> int:
+    """Delete finished or failed jobs older than `finished_before`, with their files."""
+    rows = connection.execute(text(
+        f"SELECT id, artifact_path FROM {JOB_TABLE} WHERE status IN (:done, :failed) AND finished_at < :cutoff"
+    ).bindparams(bindparam("cutoff", type_=DateTime)),
+        {"done": DONE, "failed": FAILED, "cutoff": finished_before}).all()
+    for _, path in rows:
+        if path and os.path.exists(path):
+            os.remove(path)
+    if rows:
+        ids = [row[0] for row in rows]
+        connection.execute(text(f"DELETE FROM {JOB_TABLE} WHERE id IN ({', '.join(str(i) for i in ids)})"))
+    return len(rows)
@@ -0,0 +1,152 @@
+"""
+Weight-constrained container load planning.
+
+Proposes which available boxes to load into one or more containers so each
+is filled as close to its weight limit as possible without exceeding it,
+optionally meeting per-product quantity targets first. The heuristics run in
+O(n log n) per container, so tens of thousands of candidate boxes plan in
+well under a second.
+"""
+import heapq
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# (box ID, weight in lbs, {product type: quantity})
+Candidate = Tuple[int, float, Dict[str, int]]
+
+# Slack for floating point sums of box weights
+EPSILON = 1e-6
+
+
+def _target_value(totals: Dict[str, int], remaining: Dict[str, int]) -> int:
+    """How many still-missing target units a box would contribute."""
+    return sum(min(quantity, remaining[product]) for product, quantity in totals.items()
+               if remaining.get(product, 0) > 0)
+
+
+def _meet_targets(candidates: Sequence[Candidate], taken: List[bool], capacity: float,
+                  targets: Dict[str, int]) -> Tuple[List[int], float]:
+    """
+    Lazy greedy: repeatedly take the box adding the most missing target units
+    per pound. Scores only ever drop as targets fill up, so a popped box whose
+    recomputed score still beats the next best is the true best.
+    """
+    remaining = dict(targets)
+    heap = []
+    for index, (_, weight, totals) in enumerate(candidates):
+        if taken[index] or weight > capacity + EPSILON:
+            continue
+        value = _target_value(totals, remaining)
+        if value:
+            heap.append((-value / max(weight, EPSILON), index))
+    heapq.heapify(heap)
+
+    chosen = []
+    used = 0.0
+    while heap and any(quantity > 0 for quantity in remaining.values()):
+        _, index = heapq.heappop(heap)
+        _, weight, totals = candidates[index]
+        if used + weight > capacity + EPSILON:
+            continue
+        value = _target_value(totals, remaining)
+        if not value:
+            continue
+        score = -value / max(weight, EPSILON)
+        if heap and score > heap[0][0]:
+            heapq.heappush(heap, (score, index))
+            continue
+        chosen.append(index)
+        taken[index] = True
+        used += weight
+        for product, quantity in totals.items():
+            if product in remaining:
+                remaining[product] -= quantity
+    return chosen, used
+
+
+def _fill(candidates: Sequence[Candidate], by_weight_desc: Sequence[int], taken: List[bool],
+          capacity: float, used: float) -> Tuple[List[int], float]:
+    """First-fit decreasing: heaviest boxes first, taking every box that still fits."""
+    chosen = []
+    for index in by_weight_desc:
+        if taken[index]:
+            continue
+        weight = candidates[index][1]
+        if used + weight <= capacity + EPSILON:
+            chosen.append(index)
+            taken[index] = True
+            used += weight
+            if capacity - used <= EPSILON:
+                break
+    return chosen, used
+
+
+def _improve(candidates: Sequence[Candidate], swappable: List[int], taken: List[bool],
+             capacity: float, used: float) -> Tuple[List[int], float]:
+    """
+    Close the leftover gap by swapping a chosen box for a slightly heavier
+    unused one: for each chosen box, the heaviest unused box that still fits
+    is found by bisection over the unused weights.
+    """
+    unused = sorted((candidates[index][1], index) for index in range(len(candidates)) if not taken[index])
+    unused_weights = [weight for weight, _ in unused]
+    swappable = sorted(swappable, key=lambda index: candidates[index][1])
+    for position, index in enumerate(swappable):
+        gap = capacity - used
+        if gap <= EPSILON or not unused:
+            break
+        weight = candidates[index][1]
+        best = bisect_right(unused_weights, weight + gap + EPSILON) - 1
+        if best < 0 or unused_weights[best] <= weight + EPSILON:
+            continue
+        new_weight, new_index = unused.pop(best)
+        unused_weights.pop(best)
+        slot = bisect_right(unused, (weight, index))
+        unused.insert(slot, (weight, index))
+        unused_weights.insert(slot, weight)
+        taken[index] = False
+        taken[new_index] = True
+        swappable[position] = new_index
+        used += new_weight - weight
+    return swappable, used
+
+
+def plan_containers(candidates: Sequence[Candidate], weight_limit: float, container_count: int = 1,
+                    targets: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Plan `container_count` containers from `candidates`, one after another,
+    each holding at most `weight_limit` lbs of boxes and no box twice.
+
+    Per-product `targets` are per container: boxes are first picked to reach
+    them (most missing units per pound first), then the remaining weight is
+    filled first-fit decreasing, then improved by swaps. Returns one dict per
+    container with box_ids, box_count, total_weight, fill_ratio, totals and,
+    when targets were given, {product: {"target", "planned"}}.
+    """
+    targets = {product: quantity for product, quantity in (targets or {}).items() if quantity > 0}
+    taken = [False] * len(candidates)
+    by_weight_desc = sorted(range(len(candidates)), key=lambda index: candidates[index][1], reverse=True)
+
+    plans = []
+    for _ in range(container_count):
+        targeted, used = _meet_targets(candidates, taken, weight_limit, targets) if targets else ([], 0.0)
+        filled, used = _fill(candidates, by_weight_desc, taken, weight_limit, used)
+        filled, used = _improve(candidates, filled, taken, weight_limit, used)
+
+        chosen = targeted + filled
+        totals: Dict[str, int] = {}
+        for index in chosen:
+            for product, quantity in candidates[index][2].items():
+                totals[product] = totals.get(product, 0) + quantity
+        plan = {
+            "box_ids": sorted(candidates[index][0] for index in chosen),
+            "box_count": len(chosen),
+            "total_weight": round(used, 2),
+            "fill_ratio": round(used / weight_limit, 4) if weight_limit else 0.0,
+            "totals": totals,
+        }
+        if targets:
+            plan["targets"] = {product: {"target": quantity, "planned": totals.get(product, 0)}
+                               for product, quantity in targets.items()}
+        plans.append(plan)
+    return plans
@@ -0,0 +1,239 @@
+"""
+Concurrent load test for a running warehouse app server.
+
+Simulates dashboards polling /warehouse, operators submitting the
+/boxes/new form and voice stations calling /api/voice/interpret-box.
+Run it against a real multi-worker server, with voice parsing pointed
+at gemini_stub.py so no Gemini quota is used:
+
+    python gemini_stub.py --quiet &
+    GEMINI_API_BASE=http://127.0.0.1:8081 GEMINI_API_KEY=stub \\
+        gunicorn -w 3 -b 127.0.0.1:5000 app:app 2>> app.log &
+    python loadtest.py --base-url http://127.0.0.1:5000 --users 30 --duration 60 --log-file app.log
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+
+LOCK_ERROR_TEXT = "database is locked"
+
+VOICE_TRANSCRIPTS = [
+    "box {n}, {w} pounds, 12 laptops and 15 20 inch square LCDs",
+    "add 10 more laptops and 5 24 inch lcd monitors",
+    "{w} pounds, 4 servers and 8 switches",
+    "30 keyboards and 20 cables",
+    "box {n}, 6 pcs and 12 borderless 24 inch monitors",
+]
+
+
+class Stats:
+    """Thread-safe latency and outcome collector."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, op: str, latency_ms: float, outcome: str) -> None:
+        with self.lock:
+            self.latencies[op].append(latency_ms)
+            self.outcomes[op][outcome] += 1
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def poll_warehouse(session: requests.Session, base_url: str, ctx: Dict[str, Any]) -> str:
+    # The app's error handler redirects to / on failures, so a redirect is an error
+    response = session.get(f"{base_url}/warehouse", allow_redirects=False, timeout=ctx["timeout"])
+    if response.status_code != 200:
+        return "lock_error" if LOCK_ERROR_TEXT in response.text else f"http_{response.status_code}"
+    return "ok"
+
+
+def submit_box_form(session: requests.Session, base_url: str, ctx: Dict[str, Any]) -> str:
+    box_number = f"LT-{ctx['run_id']}-{ctx['worker']}-{ctx['counter']}"
+    ctx["counter"] += 1
+    form = {
+        "box_number": box_number,
+        "weight": str(random.randint(80, 600)),
+        "box_type": "simple",
+        # Each product select is followed by its (empty) custom-name input
+        "simple_product[]": ["Laptops", "", "LCDs", ""],
+        "simple_quantity[]": [str(random.randint(1, 40)), str(random.randint(1, 30))],
+        "simple_lcd_size[]": ["", "", '24"', ""],
+    }
+    response = session.post(f"{base_url}/boxes/new", data=form, allow_redirects=False, timeout=ctx["timeout"])
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    if LOCK_ERROR_TEXT in response.text:
+        return "lock_error"
+    if "Box created successfully" not in response.text:
+        return "app_error"
+    return "ok"
+
+
+def interpret_voice(session: requests.Session, base_url: str, ctx: Dict[str, Any]) -> str:
+    transcript = random.choice(VOICE_TRANSCRIPTS).format(n=random.randint(1000, 9999), w=random.randint(40, 400))
+    payload = {
+        "transcript": transcript,
+        "current_box": {"box_number": None, "weight": None, "contents": []},
+    }
+    response = session.post(f"{base_url}/api/voice/interpret-box", json=payload, timeout=ctx["timeout"])
+    if response.status_code == 200:
+        return "ok"
+    if LOCK_ERROR_TEXT in response.text:
+        return "lock_error"
+    return f"http_{response.status_code}"
+
+
+OPERATIONS: Dict[str, Callable[[requests.Session, str, Dict[str, Any]], str]] = {
+    "warehouse": poll_warehouse,
+    "new_box": submit_box_form,
+    "voice": interpret_voice,
+}
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+def worker(worker_id: int, base_url: str, mix: List[Tuple[str, float]], deadline: float,
+           think_time: float, timeout: float, run_id: str, stats: Stats) -> None:
+    session = requests.Session()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    ctx: Dict[str, Any] = {"worker": worker_id, "counter": 0, "run_id": run_id, "timeout": timeout}
+    while time.monotonic() < deadline:
+        op = random.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            outcome = OPERATIONS[op](session, base_url, ctx)
+        except requests.Timeout:
+            outcome = "timeout"
+        except requests.RequestException:
+            outcome = "connection_error"
+        stats.record(op, (time.perf_counter() - start) * 1000, outcome)
+        if think_time:
+            time.sleep(random.expovariate(1 / think_time))
+
+
+def count_log_lock_errors(path: Optional[str], offset: int) -> int:
+    """Count lock errors the server logged after `offset` bytes into its log file."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read().decode("utf-8", "replace").count(LOCK_ERROR_TEXT)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated clients (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (default: %(default)s)")
+    parser.add_argument("--mix", default="warehouse=60,new_box=25,voice=15",
+                        help="Relative operation weights (default: %(default)s)")
+    parser.add_argument("--think-time", type=float, default=0.5,
+                        help="Mean pause between a client's requests in seconds (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--log-file", default=None,
+                        help="Server log file to scan for SQLite lock errors raised during the run")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    run_id = uuid.uuid4().hex[:6]
+    log_offset = os.path.getsize(args.log_file) if args.log_file and os.path.exists(args.log_file) else 0
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(i, args.base_url.rstrip("/"), mix, deadline, args.think_time, args.timeout, run_id, stats),
+            daemon=True,
+        )
+        for i in range(args.users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report: Dict[str, Any] = {
+        "base_url": args.base_url,
+        "users": args.users,
+        "duration_s": round(elapsed, 2),
+        "mix": dict(mix),
+        "operations": {},
+    }
+    all_latencies: List[float] = []
+    total_errors = 0
+    response_lock_errors = 0
+    for op, latencies in sorted(stats.latencies.items()):
+        outcomes = dict(stats.outcomes[op])
+        errors = sum(count for outcome, count in outcomes.items() if outcome != "ok")
+        total_errors += errors
+        response_lock_errors += outcomes.get("lock_error", 0)
+        all_latencies.extend(latencies)
+        report["operations"][op] = {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 50), 1),
+            "p95_ms": round(_percentile(latencies, 95), 1),
+            "p99_ms": round(_percentile(latencies, 99), 1),
+            "errors": errors,
+            "outcomes": outcomes,
+        }
+    report["total"] = {
+        "requests": len(all_latencies),
+        "throughput_rps": round(len(all_latencies) / elapsed, 2),
+        "p50_ms": round(_percentile(all_latencies, 50), 1),
+        "p95_ms": round(_percentile(all_latencies, 95), 1),
+        "p99_ms": round(_percentile(all_latencies, 99), 1),
+        "errors": total_errors,
+    }
+    report["sqlite_lock_errors"] = {
+        "in_responses": response_lock_errors,
+        "in_server_log": count_log_lock_errors(args.log_file, log_offset) if args.log_file else None,
+    }
+
+    print(f"{'operation':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for op, row in list(report["operations"].items()) + [("total", report["total"])]:
+        print(f"{op:<10} {row['requests']:>8} {row['throughput_rps']:>8} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}")
+    print(f"SQLite lock errors: {report['sqlite_lock_errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from flask import Flask, g, has_request_context, request
+
+
+# Record attributes copied into JSON output when present
+CONTEXT_FIELDS = (
+    "request_id",
+    "method",
+    "route",
+    "path",
+    "status",
+    "latency_ms",
+    "box_id",
+    "container_id",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request's ID, route and box/container IDs to records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            if getattr(record, "request_id", None) is None:
+                record.request_id = g.get("request_id")
+            if getattr(record, "route", None) is None:
+                record.route = request.url_rule.rule if request.url_rule else None
+            record.method = request.method
+            record.path = request.path
+            for key in ("box_id", "container_id"):
+                if getattr(record, key, None) is None and request.view_args and key in request.view_args:
+                    setattr(record, key, request.view_args[key])
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats the whole record (including tracebacks)
+    before enqueueing it. Here the caller only merges the message
+    arguments, so the request thread pays for little more than a put().
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _build_handlers(app: Flask) -> List[logging.Handler]:
+    if app.config["LOG_FORMAT"] == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+                                      defaults={"request_id": "-"})
+
+    handlers: List[logging.Handler] = []
+    log_file = app.config["LOG_FILE"]
+    if log_file:
+        if app.config["LOG_ROTATE_WHEN"]:
+            file_handler: logging.Handler = logging.handlers.TimedRotatingFileHandler(
+                log_file,
+                when=app.config["LOG_ROTATE_WHEN"],
+                backupCount=app.config["LOG_BACKUP_COUNT"],
+                encoding="utf-8",
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file,
+                maxBytes=app.config["LOG_MAX_BYTES"],
+                backupCount=app.config["LOG_BACKUP_COUNT"],
+                encoding="utf-8",
+            )
+        handlers.append(file_handler)
+    handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(app: Flask) -> logging.handlers.QueueListener:
+    """
+    Route all logging through an in-memory queue drained by a background thread.
+
+    Reads LOG_LEVEL, LOG_FORMAT ("json" or "text"), LOG_FILE, LOG_MAX_BYTES,
+    LOG_ROTATE_WHEN (a TimedRotatingFileHandler interval such as "midnight";
+    when set, rotation is by time instead of size), LOG_BACKUP_COUNT and
+    LOG_REQUESTS from the app config. Returns the started listener.
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(app.config["LOG_LEVEL"])
+
+    listener = logging.handlers.QueueListener(log_queue, *_build_handlers(app), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    access_logger = logging.getLogger("warehouse.access")
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers.setdefault("X-Request-ID", g.get("request_id", ""))
+        if app.config["LOG_REQUESTS"] and "request_started" in g:
+            latency_ms = round((time.perf_counter() - g.request_started) * 1000, 2)
+            access_logger.info(
+                "%s %s %s",
+                request.method,
+                request.full_path.rstrip("?"),
+                response.status_code,
+                extra={"status": response.status_code, "latency_ms": latency_ms},
+            )
+        return response
+
+    return listener
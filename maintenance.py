@@ -0,0 +1,121 @@
+"""
+Database maintenance for the SQLite files: container numbering backfill,
+orphaned row detection, statistics, vacuuming and integrity checks.
+
+Row-by-row work is done in chunks of IDs, each in its own short
+transaction so the running app is only locked out briefly. Scans record
+how far they got in the `maintenance_checkpoint` table after every chunk,
+so an interrupted run picks up where it stopped instead of starting over.
+"""
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+
+
+CHECKPOINT_TABLE = "maintenance_checkpoint"
+
+# child table -> (foreign key column, parent table); a child row is orphaned
+# when its parent row no longer exists
+ORPHAN_CHECKS = {
+    "box_content": ("box_id", "box"),
+    "custom_box": ("container_id", "container"),
+}
+
+
+class Checkpoint(NamedTuple):
+    last_id: int
+    found: int
+
+
+def create_checkpoint_table(connection: Connection) -> None:
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} ("
+        "task VARCHAR(100) NOT NULL PRIMARY KEY, "
+        "last_id INTEGER NOT NULL, "
+        "found INTEGER NOT NULL, "
+        "updated_at DATETIME NOT NULL)"
+    ))
+
+
+def load_checkpoint(connection: Connection, task: str) -> Optional[Checkpoint]:
+    row = connection.execute(text(
+        f"SELECT last_id, found FROM {CHECKPOINT_TABLE} WHERE task = :task"
+    ), {"task": task}).first()
+    return Checkpoint(*row) if row else None
+
+
+def save_checkpoint(connection: Connection, task: str, last_id: int, found: int) -> None:
+    connection.execute(text(
+        f"INSERT INTO {CHECKPOINT_TABLE} (task, last_id, found, updated_at) "
+        "VALUES (:task, :last_id, :found, :now) "
+        "ON CONFLICT (task) DO UPDATE SET last_id = :last_id, found = :found, updated_at = :now"
+    ).bindparams(bindparam("now", type_=DateTime)),
+        {"task": task, "last_id": last_id, "found": found, "now": datetime.utcnow()})
+
+
+def clear_checkpoint(connection: Connection, task: str) -> None:
+    connection.execute(text(f"DELETE FROM {CHECKPOINT_TABLE} WHERE task = :task"), {"task": task})
+
+
+def chunk_end(connection: Connection, table: str, after_id: int, size: int) -> Optional[int]:
+    """The highest ID among the next `size` rows of `table` after `after_id`, or None when none are left."""
+    return connection.execute(text(
+        f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > :after ORDER BY id LIMIT :size)"
+    ), {"after": after_id, "size": size}).scalar()
+
+
+def orphaned_ids(connection: Connection, table: str, after_id: int, up_to_id: int) -> List[int]:
+    """IDs in (after_id, up_to_id] of `table` rows whose parent row is missing."""
+    column, parent = ORPHAN_CHECKS[table]
+    return list(connection.execute(text(
+        f"SELECT child.id FROM {table} AS child LEFT JOIN {parent} AS parent ON parent.id = child.{column} "
+        "WHERE child.id > :after AND child.id <= :up_to AND parent.id IS NULL ORDER BY child.id"
+    ), {"after": after_id, "up_to": up_to_id}).scalars())
+
+
+def delete_rows(connection: Connection, table: str, ids: List[int]) -> int:
+    if not ids:
+        return 0
+    return connection.execute(
+        text(f"DELETE FROM {table} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    ).rowcount
+
+
+def highest_container_number(connection: Connection, archive_prefix: str = "") -> int:
+    """
+    The largest all-digit container number in use, or 0. Archived containers
+    keep their numbers, so they count too; `archive_prefix` is "archive."
+    when the archive tables are in an attached database.
+    """
+    numbered = "WHERE container_number != '' AND container_number NOT GLOB '*[^0-9]*'"
+    return connection.execute(text(
+        "SELECT COALESCE(MAX(CAST(container_number AS INTEGER)), 0) FROM ("
+        f"SELECT container_number FROM container {numbered} "
+        f"UNION ALL SELECT container_number FROM {archive_prefix}archived_container {numbered})"
+    )).scalar()
+
+
+def count_unnumbered_containers(connection: Connection) -> int:
+    return connection.execute(text("SELECT COUNT(*) FROM container WHERE container_number IS NULL")).scalar()
+
+
+def database_stats(connection: Connection) -> Dict[str, int]:
+    """Page counts and the auto_vacuum mode (0 none, 1 full, 2 incremental)."""
+    return {
+        "page_count": connection.exec_driver_sql("PRAGMA page_count").scalar(),
+        "freelist_count": connection.exec_driver_sql("PRAGMA freelist_count").scalar(),
+        "page_size": connection.exec_driver_sql("PRAGMA page_size").scalar(),
+        "auto_vacuum": connection.exec_driver_sql("PRAGMA auto_vacuum").scalar(),
+    }
+
+
+def integrity_problems(connection: Connection, quick: bool = False) -> List[str]:
+    """Problems reported by SQLite's integrity and foreign key checks; empty when healthy."""
+    pragma = "quick_check" if quick else "integrity_check"
+    problems = [row[0] for row in connection.exec_driver_sql(f"PRAGMA {pragma}") if row[0] != "ok"]
+    for table, rowid, parent, _ in connection.exec_driver_sql("PRAGMA foreign_key_check"):
+        problems.append(f"{table} row {rowid} refers to a missing {parent} row")
+    return problems
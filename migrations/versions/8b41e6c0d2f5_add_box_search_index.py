@@ -0,0 +1,28 @@
+"""Add full-text box search table
+
+Revision ID: 8b41e6c0d2f5
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-19 11:40:27.301845
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6c0d2f5'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables are not autogenerated; populate with `flask rebuild-search-index`
+    op.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS box_search '
+        'USING fts5(box_number, products, lcd_sizes, container_name)'
+    )
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS box_search')
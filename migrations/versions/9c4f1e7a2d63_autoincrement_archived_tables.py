@@ -0,0 +1,47 @@
+"""Make the archived live tables AUTOINCREMENT
+
+Revision ID: 9c4f1e7a2d63
+Revises: b3e9d2f6a471
+Create Date: 2026-10-20 14:05:12.417390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f1e7a2d63'
+down_revision = 'b3e9d2f6a471'
+branch_labels = None
+depends_on = None
+
+LIVE_TABLES = ('container', 'box', 'box_content', 'custom_box')
+
+
+def upgrade():
+    # Plain rowid tables hand out max(id) + 1, which reuses the IDs of archived rows
+    # once the newest live rows are gone; AUTOINCREMENT tables never reuse an ID
+    for table in LIVE_TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+    # The rebuild starts each sequence at the live maximum; IDs archived earlier may be higher
+    bind = op.get_bind()
+    schemas = [row[1] for row in bind.exec_driver_sql('PRAGMA database_list')]
+    prefix = 'archive.' if 'archive' in schemas else ''
+    for table in LIVE_TABLES:
+        archived_max = bind.exec_driver_sql(f'SELECT MAX(id) FROM {prefix}archived_{table}').scalar()
+        if archived_max is None:
+            continue
+        bind.execute(sa.text(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+        ), {'name': table})
+        bind.execute(sa.text('UPDATE sqlite_sequence SET seq = MAX(seq, :seq) WHERE name = :name'),
+                     {'name': table, 'seq': archived_max})
+
+
+def downgrade():
+    for table in LIVE_TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -0,0 +1,164 @@
+"""
+Opt-in profiling of single live requests.
+
+When PROFILE_TOKEN is set, a request carrying that token in the X-Profile
+header (or a `_profile` query parameter) runs under cProfile, including its
+streamed body, and the stats are written to PROFILE_DIR as a .prof file.
+Those files load with pstats or snakeviz, and flameprof turns them into
+flame graphs. The response names its file in X-Profile-File.
+
+To bound the overhead on live traffic, each worker process profiles one
+request at a time and starts at most one profile every PROFILE_MIN_INTERVAL
+seconds. Other requests, including ones with a wrong token, are served
+without profiling. Only the newest PROFILE_MAX_FILES files are kept.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, Optional
+from urllib.parse import parse_qs
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+
+
+class _ProfiledBody:
+    """Response body that keeps profiling while it is iterated and saves the profile when closed."""
+
+    def __init__(self, body: Iterable[bytes], profile: cProfile.Profile, finish: Callable[[], None]):
+        self.body = body
+        self.profile = profile
+        self.finish = finish
+
+    def __iter__(self) -> Iterator[bytes]:
+        iterator = iter(self.body)
+        while True:
+            self.profile.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.profile.disable()
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            close = getattr(self.body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.finish()
+
+
+class ProfilingMiddleware:
+    """WSGI middleware running cProfile around requests that present the token."""
+
+    def __init__(self, wsgi_app: Callable, token: str, directory: str, max_files: int, min_interval: float):
+        self.wsgi_app = wsgi_app
+        self.token = token.encode("utf-8")
+        self.directory = directory
+        self.max_files = max_files
+        self.min_interval = min_interval
+        self._busy = threading.Lock()
+        self._last_started = float("-inf")
+
+    def _requested_token(self, environ: dict) -> Optional[str]:
+        token = environ.get(PROFILE_HEADER)
+        if token is None:
+            values = parse_qs(environ.get("QUERY_STRING", "")).get(PROFILE_PARAM)
+            token = values[0] if values else None
+        return token
+
+    def _start(self) -> bool:
+        """Take the profiling slot if it is free and the interval has passed."""
+        if not self._busy.acquire(blocking=False):
+            return False
+        now = time.monotonic()
+        if now - self._last_started < self.min_interval:
+            self._busy.release()
+            return False
+        self._last_started = now
+        return True
+
+    def _filename(self, environ: dict) -> str:
+        path = re.sub(r"[^A-Za-z0-9]+", "_", environ.get("PATH_INFO", "")).strip("_")[:60] or "root"
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{environ.get('REQUEST_METHOD', 'GET')}-{path}-{uuid.uuid4().hex[:6]}.prof"
+
+    def _prune(self) -> None:
+        files = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".prof")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in files[:max(len(files) - self.max_files, 0)]:
+            os.remove(entry.path)
+
+    def _save(self, profile: cProfile.Profile, name: str, started: float) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, name))
+            self._prune()
+            logger.info(f"Saved profile {name} ({(time.perf_counter() - started) * 1000:.1f} ms profiled)")
+        except OSError:
+            logger.exception(f"Could not save profile {name}")
+        finally:
+            self._busy.release()
+
+    def __call__(self, environ: dict, start_response: Callable) -> Any:
+        token = self._requested_token(environ)
+        if token is None:
+            return self.wsgi_app(environ, start_response)
+        if not hmac.compare_digest(token.encode("utf-8"), self.token):
+            logger.warning("Profiling requested with a wrong token")
+            return self.wsgi_app(environ, start_response)
+        if not self._start():
+            def skipped_start_response(status, headers, exc_info=None):
+                headers.append(("X-Profile-Skipped", "another profile is running or one started too recently"))
+                return start_response(status, headers, exc_info)
+            return self.wsgi_app(environ, skipped_start_response)
+
+        name = self._filename(environ)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+
+        def profiled_start_response(status, headers, exc_info=None):
+            headers.append(("X-Profile-File", name))
+            return start_response(status, headers, exc_info)
+
+        profile.enable()
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            profile.disable()
+            self._save(profile, name, started)
+            raise
+        profile.disable()
+        return _ProfiledBody(body, profile, lambda: self._save(profile, name, started))
+
+
+def configure_profiling(app: Flask) -> None:
+    """
+    Install the profiling middleware when PROFILE_TOKEN is set. Reads
+    PROFILE_TOKEN, PROFILE_DIR, PROFILE_MAX_FILES and PROFILE_MIN_INTERVAL
+    from the app config.
+    """
+    if not app.config["PROFILE_TOKEN"]:
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        token=app.config["PROFILE_TOKEN"],
+        directory=app.config["PROFILE_DIR"],
+        max_files=app.config["PROFILE_MAX_FILES"],
+        min_interval=app.config["PROFILE_MIN_INTERVAL"],
+    )
+    logger.info(f"Request profiling is enabled; profiles go to {app.config['PROFILE_DIR']}")
@@ -0,0 +1,186 @@
+"""
+Full-text box search backed by an SQLite FTS5 table.
+
+`box_search` holds one row per box (rowid = box.id) with the box number,
+the product types and LCD sizes it contains and its container's name.
+LCD sizes are stored as single tokens ('24"' -> '24in', '20"S' -> '20ins',
+'Borderless 24"' -> 'borderless24in') because the FTS tokenizer would
+otherwise split them on the quote and space.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+
+FTS_TABLE = "box_search"
+
+# Words that add nothing to a search like "24 inch LCDs and servers"
+STOP_WORDS = {"a", "an", "and", "the", "with", "of", "or"}
+
+SIZE_RE = re.compile(
+    r"(borderless\s*)?(\d+(?:\.\d+)?)\s*(?:\"|''|”|inch(?:es)?\b|in\b)(?:\s*(square|wide|s|w)\b)?",
+    re.IGNORECASE,
+)
+
+
+def normalize_sizes(value: str) -> str:
+    """Rewrite LCD sizes as single tokens: '24"' -> '24in', '20 inch square' -> '20ins'."""
+
+    def replace(match: "re.Match[str]") -> str:
+        shape = (match.group(3) or "").lower()
+        prefix = "borderless" if match.group(1) else ""
+        return prefix + match.group(2) + "in" + {"square": "s", "wide": "w"}.get(shape, shape)
+
+    return SIZE_RE.sub(replace, value)
+
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def create_search_index(connection: Connection) -> bool:
+    """Create the FTS table if needed. Returns False if SQLite lacks FTS5."""
+    try:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(box_number, products, lcd_sizes, container_name)"
+        ))
+    except OperationalError:
+        return False
+    return True
+
+
+def _index_rows(connection: Connection, box_ids: List[int]) -> List[Dict[str, Any]]:
+    rows: Dict[int, Dict[str, Any]] = {}
+    params = {f"id{i}": box_id for i, box_id in enumerate(box_ids)}
+    placeholders = ", ".join(f":{name}" for name in params)
+    for box_id, box_number, container_name in connection.execute(text(
+        "SELECT box.id, box.box_number, container.name FROM box "
+        "LEFT JOIN container ON container.id = box.container_id "
+        f"WHERE box.id IN ({placeholders})"
+    ), params):
+        rows[box_id] = {"rowid": box_id, "box_number": box_number, "container_name": container_name or "",
+                        "products": set(), "lcd_sizes": set()}
+    for box_id, product_type, lcd_size in connection.execute(text(
+        f"SELECT box_id, product_type, lcd_size FROM box_content WHERE box_id IN ({placeholders})"
+    ), params):
+        if box_id not in rows:
+            continue
+        rows[box_id]["products"].add(product_type)
+        if product_type == "LCDs" and lcd_size:
+            rows[box_id]["lcd_sizes"].add(normalize_sizes(lcd_size))
+    for row in rows.values():
+        row["products"] = " ".join(sorted(row["products"]))
+        row["lcd_sizes"] = " ".join(sorted(row["lcd_sizes"]))
+    return list(rows.values())
+
+
+def reindex_boxes(connection: Connection, box_ids: Iterable[int], batch_size: int = 500) -> None:
+    """Refresh the index rows for `box_ids`; IDs of deleted boxes are removed."""
+    box_ids = sorted(set(box_ids))
+    for start in range(0, len(box_ids), batch_size):
+        batch = box_ids[start:start + batch_size]
+        params = {f"id{i}": box_id for i, box_id in enumerate(batch)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"), params)
+        rows = _index_rows(connection, batch)
+        if rows:
+            connection.execute(text(
+                f"INSERT INTO {FTS_TABLE} (rowid, box_number, products, lcd_sizes, container_name) "
+                "VALUES (:rowid, :box_number, :products, :lcd_sizes, :container_name)"
+            ), rows)
+
+
+def rebuild_search_index(connection: Connection, batch_size: int = 2000) -> int:
+    """Re-create every index row from the box tables. Returns the number of boxes indexed."""
+    connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    last_id = 0
+    indexed = 0
+    while True:
+        box_ids = [row[0] for row in connection.execute(
+            text("SELECT id FROM box WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size},
+        )]
+        if not box_ids:
+            return indexed
+        reindex_boxes(connection, box_ids, batch_size)
+        indexed += len(box_ids)
+        last_id = box_ids[-1]
+
+
+def match_expression(query: str, product_type: Optional[str] = None,
+                     lcd_size: Optional[str] = None) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query where every word must prefix-match,
+    narrowed to boxes holding `product_type` and `lcd_size` when given.
+    """
+    terms = [term for term in re.findall(r"\w+", normalize_sizes(query).lower()) if term not in STOP_WORDS]
+    parts = [f"{_phrase(term)}*" for term in terms]
+    if product_type:
+        parts.append(f"products : {_phrase(product_type)}")
+    if lcd_size:
+        parts.append(f"lcd_sizes : {_phrase(normalize_sizes(lcd_size))}")
+    return " ".join(parts) or None
+
+
+def search_boxes(connection: Connection, query: str, product_type: Optional[str] = None,
+                 lcd_size: Optional[str] = None, available_only: bool = False,
+                 limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+    """
+    Search boxes and count facets over the full result set.
+
+    Returns {"total": int, "box_ids": [...], "facets": {"product_types": {...},
+    "lcd_sizes": {...}}}. Box IDs are ordered by relevance (best first), or by
+    newest box when there is no search text. Facets map each value to the
+    number of matching boxes that contain it.
+    """
+    params: Dict[str, Any] = {}
+    conditions = []
+    expression = match_expression(query, product_type, lcd_size)
+    if expression:
+        params["match"] = expression
+    # The index narrows the candidates; these checks make the facet filters exact
+    if product_type:
+        conditions.append("EXISTS (SELECT 1 FROM box_content WHERE box_content.box_id = box.id "
+                          "AND product_type = :product_type)")
+        params["product_type"] = product_type
+    if lcd_size:
+        conditions.append("EXISTS (SELECT 1 FROM box_content WHERE box_content.box_id = box.id "
+                          "AND product_type = 'LCDs' AND lcd_size = :lcd_size)")
+        params["lcd_size"] = lcd_size
+    if available_only:
+        conditions.append("box.container_id IS NULL")
+    where = " AND ".join(conditions) or "1 = 1"
+    if expression:
+        matched = (f"SELECT box.id FROM {FTS_TABLE} JOIN box ON box.id = {FTS_TABLE}.rowid "
+                   f"WHERE {FTS_TABLE} MATCH :match AND {where}")
+        ordered = f"{matched} ORDER BY {FTS_TABLE}.rank LIMIT :limit OFFSET :offset"
+    else:
+        matched = f"SELECT box.id FROM box WHERE {where}"
+        ordered = f"{matched} ORDER BY box.id DESC LIMIT :limit OFFSET :offset"
+
+    total = connection.execute(text(f"SELECT COUNT(*) FROM ({matched})"), params).scalar()
+
+    page_params = dict(params, limit=limit, offset=offset)
+    box_ids = [row[0] for row in connection.execute(text(ordered), page_params)]
+
+    facets: Dict[str, Dict[str, int]] = {"product_types": {}, "lcd_sizes": {}}
+    # Walk the contents of matched boxes only, via the box_id index
+    for value, count in connection.execute(text(
+        "SELECT bc.product_type, COUNT(DISTINCT bc.box_id) "
+        f"FROM ({matched}) AS matched JOIN box_content AS bc ON bc.box_id = matched.id "
+        "GROUP BY bc.product_type ORDER BY 2 DESC"
+    ), params):
+        facets["product_types"][value] = count
+    for value, count in connection.execute(text(
+        "SELECT bc.lcd_size, COUNT(DISTINCT bc.box_id) "
+        f"FROM ({matched}) AS matched JOIN box_content AS bc ON bc.box_id = matched.id "
+        "WHERE bc.product_type = 'LCDs' AND bc.lcd_size IS NOT NULL AND bc.lcd_size != '' "
+        "GROUP BY bc.lcd_size ORDER BY 2 DESC"
+    ), params):
+        facets["lcd_sizes"][value] = count
+
+    return {"total": total, "box_ids": box_ids, "facets": facets}
@@ -0,0 +1,93 @@
+"""
+Multi-site routing: one database per warehouse site.
+
+Each site has its own SQLite file and engine (so its own connection pool and
+write lock), and every session is routed to the engine of the site the
+current request or command works on. The first configured site uses the
+default engine; the others are Flask-SQLAlchemy binds named after the site.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from flask import Flask, current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Site chosen explicitly with use_site(); takes precedence over g.site
+_site_override: ContextVar[Optional[str]] = ContextVar("site_override", default=None)
+
+
+def parse_site_databases(value: str) -> Dict[str, str]:
+    """Parse "east=sqlite:////data/east.db,west=sqlite:////data/west.db" into {site: url}."""
+    sites: Dict[str, str] = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, separator, url = entry.partition("=")
+        if not separator or not name.strip() or not url.strip():
+            raise ValueError(f"SITE_DATABASES entries must look like name=url, got {entry!r}")
+        sites[name.strip()] = url.strip()
+    return sites
+
+
+@contextmanager
+def use_site(site: str) -> Iterator[None]:
+    """Route sessions and site_engine() to `site` inside the block."""
+    token = _site_override.set(site)
+    try:
+        yield
+    finally:
+        _site_override.reset(token)
+
+
+def active_site() -> str:
+    """The site set by use_site(), else the request's g.site, else DEFAULT_SITE."""
+    site = _site_override.get()
+    if site is None and has_app_context():
+        site = g.get("site")
+    return site or current_app.config["DEFAULT_SITE"]
+
+
+def bind_key(site: str) -> Optional[str]:
+    return None if site == current_app.config["SITES"][0] else site
+
+
+def site_engine(db: Any, site: Optional[str] = None) -> Engine:
+    """Engine of `site`, or of the active site."""
+    return db.engines[bind_key(site or active_site())]
+
+
+class SiteRoutingSession(Session):
+    """Session that sends every statement to the active site's engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        return self._db.engines[bind_key(active_site())]
+
+
+def gather_sites(app: Flask, executor: ThreadPoolExecutor, fn: Callable[[], Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Run `fn` once per site in parallel, each in its own app context (and so
+    its own session) routed to that site. Returns {site: {"result": ...}}, or
+    {site: {"error": message}} for a site that failed, so one unreachable
+    site does not hide the others.
+    """
+    def run(site: str) -> Any:
+        with app.app_context(), use_site(site):
+            return fn()
+
+    futures = {site: executor.submit(run, site) for site in app.config["SITES"]}
+    results: Dict[str, Dict[str, Any]] = {}
+    for site, future in futures.items():
+        try:
+            results[site] = {"result": future.result()}
+        except Exception as exc:  # reported per site
+            logger.exception(f"Reading site {site} failed")
+            results[site] = {"error": str(exc)}
+    return results
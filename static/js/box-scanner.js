@@ -0,0 +1,130 @@
+/**
+ * Barcode Scanner Mode
+ * Handheld scanners type a box number followed by Enter. Scans are queued
+ * and sent to the container's scan endpoint in small batches, so a fast
+ * run of scans costs a few requests instead of one per box.
+ */
+
+(function() {
+    'use strict';
+
+    const FLUSH_DELAY_MS = 250;
+    const MAX_BATCH = 25;
+    const RETRY_DELAY_MS = 2000;
+
+    const RESULT_LABELS = {
+        assigned: ['Assigned', 'text-success'],
+        already_assigned: ['Already in this container', 'text-muted'],
+        in_other_container: ['In another container', 'text-warning'],
+        not_found: ['Not found', 'text-danger']
+    };
+
+    const input = document.getElementById('scanInput');
+    if (!input) {
+        return;
+    }
+    const log = document.getElementById('scanLog');
+    const status = document.getElementById('scanStatus');
+    const moveBoxes = document.getElementById('moveBoxes');
+
+    const queue = []; // {boxNumber, row}
+    let inFlight = false;
+    let timer = null;
+    let assignedThisSession = 0;
+
+    function setResult(row, text, className) {
+        const cell = row.lastChild;
+        cell.textContent = text;
+        cell.className = className;
+    }
+
+    function addScan(boxNumber) {
+        const row = document.createElement('tr');
+        const numberCell = document.createElement('td');
+        numberCell.textContent = boxNumber;
+        row.appendChild(numberCell);
+        row.appendChild(document.createElement('td'));
+        setResult(row, 'Sending...', 'text-muted');
+        log.prepend(row);
+        queue.push({ boxNumber: boxNumber, row: row });
+        scheduleFlush(queue.length >= MAX_BATCH ? 0 : FLUSH_DELAY_MS);
+    }
+
+    function scheduleFlush(delay) {
+        clearTimeout(timer);
+        timer = setTimeout(flush, delay);
+    }
+
+    function showTotals(container) {
+        document.querySelector('[data-scan="box-count"]').textContent = container.box_count;
+        document.querySelector('[data-scan="total-weight"]').textContent = container.total_weight.toFixed(2) + ' lbs';
+        document.querySelector('[data-scan="scanned"]').textContent = assignedThisSession;
+    }
+
+    async function flush() {
+        if (inFlight || queue.length === 0) {
+            return;
+        }
+        inFlight = true;
+        const batch = queue.splice(0, MAX_BATCH);
+        try {
+            const response = await fetch(input.dataset.scanUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    box_numbers: batch.map(scan => scan.boxNumber),
+                    move: moveBoxes.checked
+                })
+            });
+            if (response.status >= 500) {
+                throw new Error('Server error ' + response.status);
+            }
+            const result = await response.json();
+            if (!response.ok) {
+                batch.forEach(scan => setResult(scan.row, result.error || 'Scan failed', 'text-danger'));
+                result.results = [];
+            }
+            result.results.forEach(function(item, i) {
+                const [label, className] = RESULT_LABELS[item.status] || [item.status, ''];
+                let text = label;
+                if (item.status === 'assigned') {
+                    assignedThisSession += 1;
+                    text += ' (' + item.weight.toFixed(2) + ' lbs)';
+                    if (item.moved_from) {
+                        text += ', moved from container ' + item.moved_from;
+                    }
+                } else if (item.status === 'in_other_container') {
+                    text += ' ' + item.container_id + '; tick "Move boxes" and scan again to move it';
+                }
+                setResult(batch[i].row, text, className);
+            });
+            if (result.container) {
+                showTotals(result.container);
+            }
+            status.textContent = '';
+        } catch (error) {
+            // Keep the scans in order at the front of the queue and try again
+            queue.unshift.apply(queue, batch);
+            status.textContent = error.message + '; retrying...';
+            inFlight = false;
+            scheduleFlush(RETRY_DELAY_MS);
+            return;
+        }
+        inFlight = false;
+        if (queue.length) {
+            scheduleFlush(0);
+        }
+    }
+
+    input.addEventListener('keydown', function(e) {
+        if (e.key !== 'Enter') {
+            return;
+        }
+        e.preventDefault();
+        const boxNumber = input.value.trim();
+        input.value = '';
+        if (boxNumber) {
+            addScan(boxNumber);
+        }
+    });
+})();
@@ -0,0 +1,239 @@
+/**
+ * Live Inventory Updates
+ * Applies inventory change events from /api/events to the warehouse and
+ * containers pages in place, instead of reloading them on a timer
+ */
+
+const LiveInventory = (function() {
+    'use strict';
+
+    const EVENTS_URL = '/api/events';
+
+    // Open the event stream, resuming after the event the page was rendered at
+    function connect(lastEventId, onEvent) {
+        const source = new EventSource(EVENTS_URL + '?last_event_id=' + encodeURIComponent(lastEventId || 0));
+        source.addEventListener('inventory', function(e) {
+            onEvent(JSON.parse(e.data));
+        });
+        // Too many changes were missed to replay them; start over from fresh totals
+        source.addEventListener('reset', function() {
+            source.close();
+            window.location.reload();
+        });
+        return source;
+    }
+
+    function addCounts(target, delta) {
+        for (const [key, value] of Object.entries(delta || {})) {
+            target[key] = (target[key] || 0) + value;
+            if (target[key] === 0) {
+                delete target[key];
+            }
+        }
+    }
+
+    function element(tag, className, text) {
+        const el = document.createElement(tag);
+        if (className) {
+            el.className = className;
+        }
+        if (text !== undefined) {
+            el.textContent = text;
+        }
+        return el;
+    }
+
+    function setAll(selector, text) {
+        document.querySelectorAll(selector).forEach(function(el) {
+            el.textContent = text;
+        });
+    }
+
+    function sum(counts) {
+        return Object.values(counts).reduce(function(a, b) { return a + b; }, 0);
+    }
+
+    // Warehouse page: totals of available boxes (container_id null)
+
+    function renderBreakdown(container, totals, lcdSizes) {
+        container.replaceChildren();
+        if (Object.keys(totals).length === 0) {
+            container.appendChild(element('p', 'text-muted', 'No available inventory'));
+            return;
+        }
+        container.appendChild(element('h5', null, 'Product Breakdown'));
+        const productRow = element('div', 'row');
+        for (const [productType, quantity] of Object.entries(totals)) {
+            const col = element('div', 'col-md-3 mb-2');
+            const card = element('div', 'card text-center');
+            const body = element('div', 'card-body');
+            body.appendChild(element('h5', 'card-title', quantity));
+            body.appendChild(element('p', 'card-text', productType));
+            card.appendChild(body);
+            col.appendChild(card);
+            productRow.appendChild(col);
+        }
+        container.appendChild(productRow);
+
+        if (Object.keys(lcdSizes).length === 0) {
+            return;
+        }
+        const lcdSection = element('div', 'mt-3');
+        lcdSection.appendChild(element('h5', null, 'LCD Size Breakdown'));
+        const lcdRow = element('div', 'row');
+        for (const [size, quantity] of Object.entries(lcdSizes)) {
+            const col = element('div', 'col-md-2 mb-2');
+            const card = element('div', 'card text-center bg-warning text-dark');
+            const body = element('div', 'card-body p-2');
+            body.appendChild(element('h6', 'card-title mb-1', quantity));
+            body.appendChild(element('small', 'card-text', size));
+            card.appendChild(body);
+            col.appendChild(card);
+            lcdRow.appendChild(col);
+        }
+        lcdSection.appendChild(lcdRow);
+        container.appendChild(lcdSection);
+    }
+
+    function boxRow(box, editUrl) {
+        const row = element('tr', 'box-row');
+        row.dataset.boxId = box.id;
+        row.appendChild(element('td', null, box.box_number));
+        row.appendChild(element('td', null, box.weight.toFixed(2) + ' lbs'));
+
+        const typeCell = element('td');
+        const boxType = box.box_type.charAt(0).toUpperCase() + box.box_type.slice(1);
+        typeCell.appendChild(element('span', 'badge bg-' + (box.box_type === 'detailed' ? 'primary' : 'secondary'), boxType));
+        row.appendChild(typeCell);
+
+        const contentsCell = element('td');
+        for (const [productType, quantity] of Object.entries(box.totals)) {
+            contentsCell.appendChild(element('div', 'box-totals', productType + ': ' + quantity));
+        }
+        const sizes = Object.entries(box.lcd_sizes);
+        if (sizes.length) {
+            const lcdDiv = element('div', 'box-totals text-info mt-1');
+            const small = element('small');
+            small.appendChild(element('strong', null, 'LCD Sizes:'));
+            small.appendChild(document.createTextNode(' ' + sizes.map(function(s) { return s[0] + ': ' + s[1]; }).join(', ')));
+            lcdDiv.appendChild(small);
+            contentsCell.appendChild(lcdDiv);
+        }
+        row.appendChild(contentsCell);
+
+        row.appendChild(element('td', null, (box.created_at || '').slice(0, 10)));
+        const actions = element('td');
+        const edit = element('a', 'btn btn-sm btn-outline-primary', 'Edit');
+        edit.href = editUrl.replace('/0/', '/' + box.id + '/');
+        actions.appendChild(edit);
+        row.appendChild(actions);
+        return row;
+    }
+
+    function connectWarehouse() {
+        const summary = document.getElementById('warehouseSummary');
+        const breakdown = document.getElementById('inventoryBreakdown');
+        const rows = document.getElementById('availableBoxRows');
+        if (!summary || !window.EventSource) {
+            return;
+        }
+        const state = {
+            boxCount: parseInt(summary.querySelector('[data-live="box-count"]').textContent, 10),
+            weight: parseFloat(summary.querySelector('[data-live="total-weight"]').textContent),
+            totals: JSON.parse(breakdown.dataset.totals),
+            lcdSizes: JSON.parse(breakdown.dataset.lcdSizes)
+        };
+
+        connect(summary.dataset.lastEventId, function(event) {
+            if (event.box && rows) {
+                const existing = rows.querySelector('tr[data-box-id="' + event.box.id + '"]');
+                // The page already included a box created while it was rendering
+                if (event.type === 'box_created' && existing) {
+                    return;
+                }
+                const available = event.type !== 'box_deleted' && event.box.container_id === null;
+                if (available) {
+                    const row = boxRow(event.box, rows.dataset.editUrl);
+                    if (existing) {
+                        existing.replaceWith(row);
+                    } else {
+                        rows.appendChild(row);
+                    }
+                } else if (existing) {
+                    existing.remove();
+                }
+            } else if (event.box && event.box.container_id === null && event.type !== 'box_deleted') {
+                // The page was rendered without a box table; fetch a fresh one
+                window.location.reload();
+                return;
+            }
+
+            const delta = event.deltas.find(function(d) { return d.container_id === null; });
+            if (!delta) {
+                return;
+            }
+            state.boxCount += delta.box_count;
+            state.weight += delta.weight;
+            addCounts(state.totals, delta.totals);
+            addCounts(state.lcdSizes, delta.lcd_sizes);
+            setAll('[data-live="box-count"]', state.boxCount);
+            setAll('[data-live="total-weight"]', state.weight.toFixed(2) + ' lbs');
+            setAll('[data-live="total-items"]', sum(state.totals));
+            renderBreakdown(breakdown, state.totals, state.lcdSizes);
+        });
+    }
+
+    // Containers page: product totals per container row
+
+    function connectContainers() {
+        const table = document.getElementById('containerTable');
+        if (!table || !window.EventSource) {
+            return;
+        }
+
+        connect(table.dataset.lastEventId, function(event) {
+            if (event.type === 'container_created') {
+                window.location.reload();
+                return;
+            }
+            if (event.container) {
+                const row = table.querySelector('tr[data-container-id="' + event.container.id + '"]');
+                if (row && (event.type === 'container_deleted' || event.type === 'container_archived')) {
+                    row.remove();
+                    return;
+                }
+                if (row) {
+                    row.querySelector('[data-live="name"]').textContent = event.container.name;
+                    const numberCell = row.querySelector('[data-live="container-number"]');
+                    numberCell.replaceChildren(event.container.container_number
+                        ? element('span', 'badge bg-info', event.container.container_number)
+                        : element('span', 'text-muted', '-'));
+                }
+            }
+
+            for (const delta of event.deltas) {
+                if (delta.container_id === null) {
+                    continue;
+                }
+                const row = table.querySelector('tr[data-container-id="' + delta.container_id + '"]');
+                if (!row) {
+                    continue;
+                }
+                const totals = JSON.parse(row.dataset.totals);
+                addCounts(totals, delta.totals);
+                row.dataset.totals = JSON.stringify(totals);
+                const cell = row.querySelector('[data-live="totals"]');
+                cell.replaceChildren();
+                for (const [productType, quantity] of Object.entries(totals)) {
+                    cell.appendChild(element('div', 'container-totals', productType + ': ' + quantity));
+                }
+            }
+        });
+    }
+
+    return {
+        connect: connect,
+        connectWarehouse: connectWarehouse,
+        connectContainers: connectContainers
+    };
+})();
@@ -328,41 +328,249 @@ async function confirmBox() {
         contents: state.contents
     };
     
+    // Save to the outbox first so the box survives a dropped connection or a reload
     try {
-        const response = await fetch('/api/boxes', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(boxData)
+        await outboxPut({
+            idempotency_key: newIdempotencyKey(),
+            box: boxData,
+            status: 'pending',
+            error: null,
+            queued_at: Date.now()
         });
-        
-        const result = await response.json();
-        
-        if (response.ok) {
-            showSuccess(`Box ${boxData.box_number} created successfully!`);
-            
-            // Update suggested box number
-            const newSuggested = parseInt(boxData.box_number) + 1;
-            window.suggestedBoxNumber = String(newSuggested);
-            document.querySelector('.next-box-hint strong').textContent = newSuggested;
-            
-            // Reset for next entry
-            setTimeout(() => {
-                redoEntry();
-            }, 1500);
-        } else {
-            showError(result.error || 'Failed to create box');
-            confirmBtn.disabled = false;
-            confirmBtn.textContent = '✓ Confirm & Save';
-        }
     } catch (error) {
-        showError('Network error: ' + error.message);
+        showError('Could not save box on this device: ' + error.message);
         confirmBtn.disabled = false;
         confirmBtn.textContent = '✓ Confirm & Save';
+        return;
+    }
+    
+    showSuccess(navigator.onLine
+        ? `Box ${boxData.box_number} saved`
+        : `Box ${boxData.box_number} saved on this device; it will sync when you're back online`);
+    
+    // Update suggested box number
+    const newSuggested = parseInt(boxData.box_number) + 1;
+    if (!isNaN(newSuggested)) {
+        window.suggestedBoxNumber = String(newSuggested);
+        document.querySelector('.next-box-hint strong').textContent = newSuggested;
+    }
+    
+    confirmBtn.textContent = '✓ Confirm & Save';
+    syncOutbox();
+    
+    // Reset for next entry
+    setTimeout(() => {
+        redoEntry();
+    }, 1500);
+}
+
+// Offline outbox
+// Confirmed boxes are queued in IndexedDB and sent to /api/boxes/batch in
+// batches. Each box keeps the idempotency key it was queued with, so a batch
+// that reached the server but whose response was lost is safe to resend.
+
+const OUTBOX_DB = 'voice-entry';
+const OUTBOX_STORE = 'outbox';
+const SYNC_BATCH_SIZE = 25;
+const SYNC_INTERVAL_MS = 30000;
+const SYNC_RETRY_MAX_MS = 5 * 60 * 1000;
+
+const outbox = {
+    db: null,
+    memory: new Map(), // used when IndexedDB is unavailable (e.g. private browsing)
+    syncing: false,
+    retryDelay: 0,
+    retryTimer: null
+};
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // randomUUID needs a secure context; warehouse tablets often use plain http on the LAN
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+function openOutbox() {
+    if (outbox.db || !window.indexedDB) {
+        return Promise.resolve(outbox.db);
+    }
+    return new Promise(resolve => {
+        const request = indexedDB.open(OUTBOX_DB, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(OUTBOX_STORE, { keyPath: 'idempotency_key' });
+        };
+        request.onsuccess = () => {
+            outbox.db = request.result;
+            resolve(outbox.db);
+        };
+        request.onerror = () => resolve(null);
+    });
+}
+
+function outboxRequest(mode, operation) {
+    return openOutbox().then(db => {
+        if (!db) {
+            return operation(null);
+        }
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(OUTBOX_STORE, mode);
+            const request = operation(transaction.objectStore(OUTBOX_STORE));
+            transaction.oncomplete = () => resolve(request.result);
+            transaction.onerror = () => reject(transaction.error);
+        });
+    });
+}
+
+function outboxAll() {
+    return outboxRequest('readonly', store => store ? store.getAll() : Array.from(outbox.memory.values()))
+        .then(entries => entries.sort((a, b) => a.queued_at - b.queued_at));
+}
+
+function outboxPut(entry) {
+    return outboxRequest('readwrite', store => {
+        if (!store) {
+            outbox.memory.set(entry.idempotency_key, entry);
+            return;
+        }
+        return store.put(entry);
+    }).then(renderOutbox);
+}
+
+function outboxDelete(key) {
+    return outboxRequest('readwrite', store => {
+        if (!store) {
+            outbox.memory.delete(key);
+            return;
+        }
+        return store.delete(key);
+    });
+}
+
+function scheduleRetry() {
+    outbox.retryDelay = Math.min(Math.max(outbox.retryDelay * 2, 5000), SYNC_RETRY_MAX_MS);
+    clearTimeout(outbox.retryTimer);
+    outbox.retryTimer = setTimeout(syncOutbox, outbox.retryDelay);
+}
+
+async function syncOutbox() {
+    if (outbox.syncing || !navigator.onLine) {
+        return;
+    }
+    outbox.syncing = true;
+    try {
+        const pending = (await outboxAll()).filter(entry => entry.status === 'pending');
+        for (let i = 0; i < pending.length; i += SYNC_BATCH_SIZE) {
+            const batch = pending.slice(i, i + SYNC_BATCH_SIZE);
+            const response = await fetch('/api/boxes/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    boxes: batch.map(entry => Object.assign({ idempotency_key: entry.idempotency_key }, entry.box))
+                })
+            });
+            if (!response.ok) {
+                throw new Error(`Sync failed with status ${response.status}`);
+            }
+            const result = await response.json();
+            for (const item of result.results) {
+                const entry = batch.find(e => e.idempotency_key === item.idempotency_key);
+                if (!entry) {
+                    continue;
+                }
+                if (item.status === 'created' || item.status === 'already_synced') {
+                    await outboxDelete(entry.idempotency_key);
+                } else {
+                    entry.status = 'conflict';
+                    entry.error = item.error;
+                    await outboxPut(entry);
+                }
+            }
+        }
+        outbox.retryDelay = 0;
+    } catch (error) {
+        console.warn('Voice entry sync failed, will retry:', error);
+        scheduleRetry();
+    } finally {
+        outbox.syncing = false;
+        renderOutbox();
+    }
+}
+
+// Load a box the server rejected back into the preview so it can be corrected
+async function editOutboxEntry(key) {
+    const entry = (await outboxAll()).find(e => e.idempotency_key === key);
+    if (!entry) {
+        return;
     }
+    state.boxNumber = entry.box.box_number;
+    state.weight = entry.box.weight;
+    state.contents = entry.box.contents || [];
+    await outboxDelete(key);
+    hideSuccess();
+    showError(`Fix box ${entry.box.box_number} and confirm again: ${entry.error}`);
+    updatePreview();
+    renderOutbox();
 }
 
+async function discardOutboxEntry(key) {
+    await outboxDelete(key);
+    renderOutbox();
+}
+
+async function renderOutbox() {
+    const panel = document.getElementById('outboxPanel');
+    if (!panel) {
+        return;
+    }
+    const entries = await outboxAll();
+    const pending = entries.filter(e => e.status === 'pending').length;
+    const conflicts = entries.filter(e => e.status === 'conflict');
+
+    panel.style.display = entries.length ? 'block' : 'none';
+    panel.classList.toggle('has-pending', pending > 0);
+    panel.classList.toggle('has-conflicts', conflicts.length > 0);
+    document.getElementById('outboxStatus').textContent = pending
+        ? `${pending} box${pending === 1 ? '' : 'es'} waiting to sync${navigator.onLine ? '' : ' (offline)'}`
+        : `${conflicts.length} box${conflicts.length === 1 ? '' : 'es'} could not be saved`;
+
+    const list = document.getElementById('outboxConflicts');
+    list.replaceChildren();
+    for (const entry of conflicts) {
+        const row = document.createElement('div');
+        row.className = 'outbox-conflict';
+        const message = document.createElement('span');
+        message.textContent = `Box ${entry.box.box_number}: ${entry.error}`;
+        const buttons = document.createElement('span');
+        const edit = document.createElement('button');
+        edit.className = 'btn btn-sm btn-outline-primary me-1';
+        edit.textContent = 'Edit';
+        edit.onclick = () => editOutboxEntry(entry.idempotency_key);
+        const discard = document.createElement('button');
+        discard.className = 'btn btn-sm btn-outline-danger';
+        discard.textContent = 'Discard';
+        discard.onclick = () => discardOutboxEntry(entry.idempotency_key);
+        buttons.append(edit, discard);
+        row.append(message, buttons);
+        list.appendChild(row);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    renderOutbox();
+    syncOutbox();
+    setInterval(syncOutbox, SYNC_INTERVAL_MS);
+});
+window.addEventListener('online', () => {
+    outbox.retryDelay = 0;
+    syncOutbox();
+});
+window.addEventListener('offline', renderOutbox);
+
 function showError(message) {
     const errorDiv = document.getElementById('errorMessage');
     errorDiv.textContent = message;
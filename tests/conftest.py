@@ -0,0 +1,73 @@
+"""
+Shared fixtures. app.py reads its configuration from the environment when
+it is imported, so the databases and data directories are pointed at a
+temporary directory first. Two sites are configured so every test also
+runs through site routing; "east" is the default.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="warehouse-tests-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATA_DIR}/east.db",
+    "SITE_DATABASES": f"east=sqlite:///{DATA_DIR}/east.db,west=sqlite:///{DATA_DIR}/west.db",
+    "LOG_FILE": "",
+    "LOG_LEVEL": "WARNING",
+    "LOG_REQUESTS": "false",
+    "JOBS_DIR": os.path.join(DATA_DIR, "jobs"),
+    "BACKUP_DIR": os.path.join(DATA_DIR, "backups"),
+    "PROFILE_DIR": os.path.join(DATA_DIR, "profiles"),
+})
+
+import app as warehouse  # noqa: E402
+from search_index import FTS_TABLE  # noqa: E402
+
+
+def _clear_site(engine) -> None:
+    with engine.begin() as connection:
+        tables = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).scalars().all()
+        for table in tables:
+            # The FTS index's shadow tables are emptied through the index itself
+            if not table.startswith(f"{FTS_TABLE}_"):
+                connection.exec_driver_sql(f'DELETE FROM "{table}"')
+
+
+@pytest.fixture(scope="session")
+def schema():
+    """Create the tables on every site, as `flask init-db` does."""
+    with warehouse.app.app_context():
+        for _, engine in warehouse.site_engines():
+            warehouse.db.metadata.create_all(engine)
+
+
+@pytest.fixture
+def app(schema, monkeypatch):
+    """The app with empty databases on every site."""
+    warehouse.app.config["TESTING"] = True
+    monkeypatch.setitem(warehouse.app.config, "WRITE_QUEUE_ENABLED", False)
+    monkeypatch.setattr(warehouse, "_last_idempotency_eviction", {})
+    with warehouse.app.app_context():
+        for _, engine in warehouse.site_engines():
+            _clear_site(engine)
+    yield warehouse.app
+    with warehouse.app.app_context():
+        warehouse.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def count(model, site="east") -> int:
+    """Rows of `model` on `site`."""
+    with warehouse.app.app_context(), warehouse.use_site(site):
+        return warehouse.db.session.scalar(warehouse.select(warehouse.func.count()).select_from(model))
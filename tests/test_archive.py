@@ -0,0 +1,167 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func
+
+import app as warehouse
+from archive import tables_reusing_ids
+from app import ArchivedBox, ArchivedContainer, Box, BoxContent, Container, CustomBox
+from tests.conftest import count
+
+
+@pytest.fixture
+def shipped(app):
+    """Two containers shipped in 2020, each with one box; the second holds the highest IDs."""
+    with app.app_context():
+        for number in (1, 2):
+            container = Container(name=f"Shipped {number}", container_number=f"S-{number}",
+                                  date=datetime(2020, 3, number))
+            box = Box(box_number=f"50{number}", weight=20.0, box_type="simple",
+                      created_at=datetime(2020, 2, 1), container=container)
+            warehouse.db.session.add_all([
+                container, box,
+                BoxContent(box=box, section="total", product_type="LCDs", quantity=4, lcd_size='22"'),
+                CustomBox(container=container, weight=5.0, product_type="Wires", quantity=10),
+            ])
+        warehouse.db.session.commit()
+        return [container.id for container in Container.query.order_by(Container.id)]
+
+
+def archive(app):
+    result = app.test_cli_runner().invoke(args=["archive-containers", "--before", "2021-01-01"])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def test_archiving_moves_containers_with_their_ids(app, client, shipped):
+    first, second = shipped
+    archive(app)
+
+    with app.app_context():
+        assert [c.id for c in ArchivedContainer.query.order_by(ArchivedContainer.id)] == [first, second]
+        assert Container.query.count() == 0
+        archived = warehouse.db.session.get(ArchivedContainer, first)
+        assert archived.calculate_totals() == {"LCDs": 4, "Wires": 10}
+        assert archived.calculate_total_weight() == 25.0
+
+    page = client.get(f"/containers/{first}")
+    assert page.status_code == 200
+    assert "Shipped 1" in page.get_data(as_text=True)
+
+
+def test_ids_of_archived_rows_are_not_reused_after_newer_rows_are_deleted(app, client, shipped):
+    first, second = shipped
+    with app.app_context():
+        warehouse.db.session.get(Container, second).date = datetime.utcnow()
+        warehouse.db.session.commit()
+    archive(app)
+
+    with app.app_context():
+        # Without AUTOINCREMENT, deleting the newest rows would hand out the archived IDs again
+        warehouse.db.session.execute(BoxContent.__table__.delete())
+        warehouse.db.session.execute(CustomBox.__table__.delete())
+        warehouse.db.session.execute(Box.__table__.delete())
+        warehouse.db.session.execute(Container.__table__.delete())
+        container = Container(name="New", container_number="N-1")
+        box = Box(box_number="900", weight=1.0, box_type="simple", container=container)
+        content = BoxContent(box=box, section="total", product_type="PCs", quantity=1)
+        custom_box = CustomBox(container=container, weight=1.0, product_type="Wires", quantity=1)
+        warehouse.db.session.add_all([container, box, content, custom_box])
+        warehouse.db.session.commit()
+
+        assert container.id > second
+        for row, archived_model in ((box, ArchivedBox), (content, warehouse.ArchivedBoxContent),
+                                    (custom_box, warehouse.ArchivedCustomBox)):
+            highest_archived = warehouse.db.session.query(func.max(archived_model.id)).scalar()
+            assert row.id > highest_archived
+
+    assert "Shipped 1" in client.get(f"/containers/{first}").get_data(as_text=True)
+
+
+def test_archiving_needs_autoincrement_tables():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE container (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+        connection.exec_driver_sql("CREATE TABLE box (id INTEGER PRIMARY KEY)")
+        assert tables_reusing_ids(connection) == ["box", "box_content", "custom_box"]
+
+
+def test_new_ids_never_collide_with_archived_ones(app, shipped):
+    archive(app)
+    with app.app_context():
+        box = Box(box_number="900", weight=1.0, box_type="simple")
+        warehouse.db.session.add(box)
+        warehouse.db.session.commit()
+        assert warehouse.db.session.get(ArchivedBox, box.id) is None
+
+
+def test_archived_box_numbers_stay_reserved(app, client, shipped):
+    archive(app)
+
+    api = client.post("/api/boxes", json={"box_number": "501", "weight": 3})
+    assert api.status_code == 400
+    assert "archived" in api.get_json()["error"]
+
+    batch = client.post("/api/boxes/batch", json={"boxes": [
+        {"idempotency_key": "k1", "box_number": "501", "weight": 3}]})
+    assert batch.get_json()["results"][0]["status"] == "conflict"
+
+    form = client.post("/boxes/new", data={"box_number": "501", "weight": "3", "box_type": "simple"})
+    assert form.status_code == 302
+
+    with app.app_context():
+        live = Box(box_number="777", weight=1.0, box_type="simple")
+        warehouse.db.session.add(live)
+        warehouse.db.session.commit()
+        live_id = live.id
+    client.post(f"/boxes/{live_id}/edit", data={"box_number": "501", "weight": "1", "box_type": "simple"})
+
+    with app.app_context():
+        assert Box.query.filter_by(box_number="501").count() == 0
+        assert warehouse.db.session.get(Box, live_id).box_number == "777"
+
+
+def test_archiving_does_not_change_snapshot_history(app, shipped):
+    days = (date(2020, 2, 15), date(2020, 6, 1))
+    with app.app_context():
+        before = warehouse.compute_daily_snapshots(*days)
+    archive(app)
+    with app.app_context():
+        after = warehouse.compute_daily_snapshots(*days)
+
+    assert count(ArchivedContainer) == 2
+    assert after == before
+    containerized = after[days[1]]["containerized"][("", "")]
+    assert containerized[:2] == [2, 2]  # two boxes and two custom boxes
+
+
+def test_archived_container_numbers_stay_reserved(app, client, shipped):
+    first, second = shipped
+    archive(app)
+
+    client.post("/containers/new", data={"name": "Dock 1", "container_number": "S-1"})
+    with app.app_context():
+        warehouse.db.session.add_all([Container(name="Dock 2"), Container(name="Dock 3", container_number="7")])
+        warehouse.db.session.add(ArchivedContainer(id=99, name="Old", container_number="41",
+                                                   archived_at=datetime(2021, 1, 1)))
+        warehouse.db.session.commit()
+        dock_3 = Container.query.filter_by(name="Dock 3").one().id
+    client.post(f"/containers/{dock_3}/edit", data={"name": "Dock 3", "container_number": "S-2"})
+
+    result = app.test_cli_runner().invoke(args=["assign-container-numbers", "--yes"])
+    assert result.exit_code == 0, result.output
+
+    with app.app_context():
+        assert Container.query.filter_by(name="Dock 1").count() == 0
+        numbers = {c.name: c.container_number for c in Container.query}
+    assert numbers == {"Dock 2": "42", "Dock 3": "7"}
+
+
+def test_suggested_box_number_skips_archived_numbers(app, client, shipped):
+    archive(app)
+    with app.app_context():
+        warehouse.db.session.add(Box(box_number="12", weight=1.0, box_type="simple"))
+        warehouse.db.session.commit()
+
+    assert 'value="503"' in client.get("/boxes/new").get_data(as_text=True)
+    assert "<strong>503</strong>" in client.get("/boxes/voice").get_data(as_text=True)
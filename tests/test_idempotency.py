@@ -0,0 +1,188 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import app as warehouse
+import idempotency
+from tests.conftest import count
+
+BOX = {"box_number": "1001", "weight": 12.5, "contents": [{"product_type": "Laptops", "quantity": 3}]}
+
+
+def stored_keys():
+    with warehouse.app.app_context():
+        return warehouse.db.session.execute(
+            text(f"SELECT key, status_code FROM {idempotency.IDEMPOTENCY_TABLE}")
+        ).all()
+
+
+def miss_first_lookup(monkeypatch):
+    """Make the next key lookup miss, as for a duplicate that read the key before the first request committed."""
+    real_lookup = idempotency.lookup
+    lookups = []
+
+    def lookup(*args):
+        lookups.append(args)
+        return None if len(lookups) == 1 else real_lookup(*args)
+
+    monkeypatch.setattr(idempotency, "lookup", lookup)
+
+
+def test_retry_replays_the_stored_response(client):
+    first = client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+    retry = client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json()
+    assert count(warehouse.Box) == 1
+    assert stored_keys() == [("api_create_box:k1", 201)]
+
+
+def test_same_key_with_a_different_body_is_rejected(client):
+    client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+    response = client.post("/api/boxes", json=dict(BOX, box_number="1002"), headers={"Idempotency-Key": "k1"})
+
+    assert response.status_code == 422
+    assert count(warehouse.Box) == 1
+
+
+def test_a_request_that_writes_nothing_leaves_the_key_free(client):
+    invalid = client.post("/api/boxes", json=dict(BOX, weight=None), headers={"Idempotency-Key": "k1"})
+    assert invalid.status_code == 400
+    assert stored_keys() == []
+
+    fixed = client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+    assert fixed.status_code == 201
+    assert count(warehouse.Box) == 1
+
+
+def test_duplicate_that_missed_the_lookup_does_not_write_again(client, monkeypatch):
+    form = {"name": "Dock 4", "idempotency_key": "k1"}
+    first = client.post("/containers/new", data=form)
+    assert first.status_code == 302
+
+    # The duplicate looked the key up before the first request committed
+    miss_first_lookup(monkeypatch)
+    duplicate = client.post("/containers/new", data=form)
+
+    assert duplicate.status_code == 303
+    assert duplicate.location == first.location
+    assert count(warehouse.Container) == 1
+
+
+@pytest.mark.parametrize("path, form", [
+    ("/boxes/new", {"box_number": "1001", "weight": "12.5", "box_type": "simple"}),
+    ("/containers/new", {"name": "Dock 4", "container_number": "C-4"}),
+])
+def test_duplicate_failing_the_form_checks_gets_the_original_result(client, monkeypatch, path, form):
+    form = dict(form, idempotency_key="k1")
+    first = client.post(path, data=form)
+    assert first.status_code in (200, 302)
+    with client.session_transaction() as session:
+        session.pop("_flashes", None)
+
+    # The duplicate missed the lookup, so the view itself finds the number taken and
+    # reports it with a redirect (/boxes/new) or a re-rendered form (/containers/new)
+    miss_first_lookup(monkeypatch)
+    duplicate = client.post(path, data=form)
+
+    assert duplicate.status_code == 303
+    with client.session_transaction() as session:
+        messages = [message for _, message in session.get("_flashes", [])]
+    assert messages == ["This form was already submitted; nothing was saved twice."]
+
+
+@pytest.mark.parametrize("write_queue", [False, True])
+def test_concurrent_duplicates_write_once(app, monkeypatch, write_queue):
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_ENABLED", write_queue)
+    requests = 6
+    barrier = threading.Barrier(requests)
+    real_lookup = idempotency.lookup
+
+    def lookup_together(*args):
+        stored = real_lookup(*args)
+        if threading.current_thread() is not threading.main_thread() and barrier.n_waiting < requests:
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+        return stored
+
+    monkeypatch.setattr(idempotency, "lookup", lookup_together)
+    statuses = []
+
+    def post():
+        response = app.test_client().post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+        statuses.append((response.status_code, response.headers.get("Idempotent-Replayed")))
+
+    threads = [threading.Thread(target=post) for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert count(warehouse.Box) == 1
+    assert statuses.count((201, None)) == 1
+    assert all(status in ((201, None), (201, "true"), (409, None)) for status in statuses), statuses
+
+
+def test_response_lost_after_the_write_is_answered_as_processed(client, app):
+    fingerprint = idempotency.fingerprint(BOX)
+
+    def pending_since(seconds_ago):
+        with app.app_context():
+            warehouse.db.session.execute(text(f"DELETE FROM {idempotency.IDEMPOTENCY_TABLE}"))
+            idempotency.claim(warehouse.db.session.connection(), "api_create_box", "k1", fingerprint)
+            warehouse.db.session.execute(
+                text(f"UPDATE {idempotency.IDEMPOTENCY_TABLE} SET created_at = :created_at"),
+                {"created_at": datetime.utcnow() - timedelta(seconds=seconds_ago)},
+            )
+            warehouse.db.session.commit()
+
+    pending_since(1)
+    assert client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"}).status_code == 409
+
+    pending_since(app.config["IDEMPOTENCY_PENDING_SECONDS"] + 1)
+    response = client.post("/api/boxes", json=BOX, headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert count(warehouse.Box) == 0
+
+
+def sync(client, *boxes):
+    response = client.post("/api/boxes/batch", json={"boxes": list(boxes)})
+    assert response.status_code == 200
+    return response.get_json()["results"]
+
+
+def test_racing_syncs_of_a_batch_report_already_synced(client, monkeypatch):
+    item = dict(BOX, idempotency_key="k1")
+    [created] = sync(client, item)
+    assert created["status"] == "created"
+
+    miss_first_lookup(monkeypatch)
+    [duplicate] = sync(client, item)
+
+    assert duplicate == dict(created, status="already_synced")
+    assert count(warehouse.Box) == 1
+
+
+def test_sync_losing_the_key_insert_reports_already_synced(app, client, monkeypatch):
+    item = dict(BOX, idempotency_key="k1")
+    [created] = sync(client, item)
+    # The box number check passes, so the key insert is what conflicts
+    with app.app_context():
+        warehouse.db.session.execute(warehouse.BoxContent.__table__.delete())
+        warehouse.db.session.execute(warehouse.Box.__table__.delete())
+        warehouse.db.session.commit()
+
+    miss_first_lookup(monkeypatch)
+    [duplicate] = sync(client, item)
+
+    assert duplicate == dict(created, status="already_synced")
+    assert count(warehouse.Box) == 0
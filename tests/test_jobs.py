@@ -0,0 +1,153 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import app as warehouse
+from jobs import DONE, FAILED, JOB_TABLE, QUEUED, RUNNING, JobQueueFull, JobResult, JobRunner, create_job_table, job_status
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/jobs.db")
+    with engine.begin() as connection:
+        create_job_table(connection)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def make_runner(engine, tmp_path):
+    runners = []
+
+    def make(**options):
+        runner = JobRunner(lambda site: engine.begin(), lambda site, fn: fn(),
+                           artifact_dir=str(tmp_path / "artifacts"), **options)
+        runner.register("echo", lambda text="": JobResult("echo.txt", "text/plain", text))
+        runners.append(runner)
+        return runner
+
+    yield make
+    for runner in runners:
+        if runner._executor is not None:
+            runner._executor.shutdown(wait=True)
+
+
+def finish(runner):
+    runner._executor.shutdown(wait=True)
+    runner._executor = None
+
+
+def insert_job(engine, status, started_at=None):
+    with engine.begin() as connection:
+        return connection.execute(text(
+            f"INSERT INTO {JOB_TABLE} (kind, params, status, created_at, started_at) "
+            "VALUES ('echo', '{\"text\": \"left over\"}', :status, :now, :started_at)"
+        ), {"status": status, "now": datetime.utcnow(), "started_at": started_at}).lastrowid
+
+
+def status_of(engine, job_id):
+    with engine.connect() as connection:
+        return job_status(connection, job_id)
+
+
+def test_job_runs_and_writes_its_artifact(engine, make_runner):
+    runner = make_runner()
+    job_id = runner.enqueue("main", "echo", {"text": "hello"})
+    finish(runner)
+
+    job = status_of(engine, job_id)
+    assert job["status"] == DONE
+    assert job["artifact_name"] == "echo.txt"
+    with open(job["artifact_path"]) as artifact:
+        assert artifact.read() == "hello"
+
+
+def test_failing_job_records_its_error(engine, make_runner):
+    runner = make_runner()
+
+    def explode():
+        raise RuntimeError("disk full")
+
+    runner.register("explode", explode)
+    job_id = runner.enqueue("main", "explode", {})
+    finish(runner)
+
+    job = status_of(engine, job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "disk full"
+
+
+def test_recovery_fails_jobs_whose_process_died_and_resumes_queued_ones(engine, make_runner):
+    stale = insert_job(engine, RUNNING, started_at=datetime.utcnow() - timedelta(hours=2))
+    recent = insert_job(engine, RUNNING, started_at=datetime.utcnow() - timedelta(minutes=5))
+    queued = insert_job(engine, QUEUED)
+
+    runner = make_runner(timeout=timedelta(hours=1))
+    runner.recover("main")
+    finish(runner)
+
+    assert status_of(engine, stale)["status"] == FAILED
+    assert status_of(engine, stale)["error"] == "Interrupted"
+    assert status_of(engine, recent)["status"] == RUNNING
+    assert status_of(engine, queued)["status"] == DONE
+
+
+def test_recovery_runs_once_per_site(engine, make_runner):
+    runner = make_runner()
+    runner.recover("main")
+    stale = insert_job(engine, RUNNING, started_at=datetime.utcnow() - timedelta(days=1))
+    runner.recover("main")
+
+    assert status_of(engine, stale)["status"] == RUNNING
+
+
+def test_a_job_is_claimed_by_one_runner_only(engine, make_runner):
+    calls = []
+    first, second = make_runner(), make_runner()
+    for runner in (first, second):
+        runner.register("count", lambda: calls.append(1) or JobResult("n.txt", "text/plain", "1"))
+    job_id = insert_job(engine, QUEUED)
+    with engine.begin() as connection:
+        connection.execute(text(f"UPDATE {JOB_TABLE} SET kind = 'count', params = '{{}}' WHERE id = :id"),
+                           {"id": job_id})
+
+    first._run("main", job_id)
+    second._run("main", job_id)
+
+    assert calls == [1]
+    assert status_of(engine, job_id)["status"] == DONE
+
+
+def test_queue_turns_jobs_away_when_full(engine, make_runner):
+    runner = make_runner(max_pending=2)
+    runner._recovered.add("main")
+    runner._submit = lambda site, job_id: None  # keep them queued
+    runner.enqueue("main", "echo", {})
+    runner.enqueue("main", "echo", {})
+
+    with pytest.raises(JobQueueFull):
+        runner.enqueue("main", "echo", {})
+
+
+def test_container_export_job_through_the_api(client):
+    with warehouse.app.app_context():
+        container = warehouse.Container(name="Dock 7", container_number="C-7")
+        warehouse.db.session.add(container)
+        warehouse.db.session.commit()
+        container_id = container.id
+
+    accepted = client.post("/api/jobs", json={"kind": "container_export", "params": {"container_id": container_id}})
+    assert accepted.status_code == 202
+
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(accepted.headers["Location"]).get_json()
+        if job["status"] in (DONE, FAILED) or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert job["status"] == DONE
+    download = client.get(job["download_url"])
+    assert download.status_code == 200
+    assert "Dock 7" in download.get_data(as_text=True)
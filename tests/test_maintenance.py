@@ -0,0 +1,45 @@
+import app as warehouse
+
+
+def make_free_pages(site):
+    """Fill and empty a scratch table so the site's database file has free pages."""
+    with warehouse.app.app_context(), warehouse.use_site(site):
+        with warehouse.site_engine(warehouse.db).begin() as connection:
+            connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS scratch (data TEXT)")
+            connection.exec_driver_sql(
+                "INSERT INTO scratch SELECT hex(randomblob(500)) FROM "
+                "(WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000) SELECT i FROM n)")
+            connection.exec_driver_sql("DROP TABLE scratch")
+        with warehouse.site_engine(warehouse.db).connect() as connection:
+            return warehouse.database_stats(connection)
+
+
+def vacuum(app, site, *args):
+    with warehouse.use_site(site):
+        result = app.test_cli_runner().invoke(args=["vacuum-db", *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_vacuum_releases_free_pages_in_steps(app):
+    vacuum(app, "west", "--enable-incremental")
+    assert make_free_pages("west")["freelist_count"] > 100
+
+    output = vacuum(app, "west", "--pages", "50")
+
+    with app.app_context(), warehouse.use_site("west"):
+        with warehouse.site_engine(warehouse.db).connect() as connection:
+            assert warehouse.database_stats(connection)["freelist_count"] == 0
+    assert output.strip().splitlines()[-1].startswith("Released ")
+
+
+def test_vacuum_stops_when_a_step_frees_nothing(app, monkeypatch):
+    stats = make_free_pages("east")
+    assert stats["auto_vacuum"] != 2 and stats["freelist_count"] > 0
+    # As if auto_vacuum had been switched off after the check
+    monkeypatch.setattr(warehouse, "database_stats", lambda connection: dict(stats, auto_vacuum=2))
+
+    output = vacuum(app, "east")
+
+    assert "released no pages" in output
+    assert output.strip().splitlines()[-1] == "Released 0 pages."
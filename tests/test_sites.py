@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import inspect
+
+import app as warehouse
+from app import Box
+from tests.conftest import count
+
+
+def box_numbers(client, **kwargs):
+    response = client.get("/api/boxes?fields=id,box_number", **kwargs)
+    assert response.status_code == 200
+    return [row["box_number"] for row in response.get_json()["data"]]
+
+
+@pytest.mark.parametrize("write_queue", [False, True])
+def test_writes_go_to_the_requested_site_only(client, app, monkeypatch, write_queue):
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_ENABLED", write_queue)
+    client.post("/api/boxes", json={"box_number": "E1", "weight": 1})
+    client.post("/api/boxes", json={"box_number": "W1", "weight": 2}, headers={"X-Site": "west"})
+
+    assert count(Box, "east") == 1 and count(Box, "west") == 1
+    assert box_numbers(client) == ["E1"]
+    assert box_numbers(client, headers={"X-Site": "west"}) == ["W1"]
+
+
+def test_site_chosen_in_the_url_is_remembered(client):
+    client.post("/api/boxes", json={"box_number": "W1", "weight": 2}, headers={"X-Site": "west"})
+
+    first = client.get("/api/boxes?site=west&fields=id,box_number")
+    assert [row["box_number"] for row in first.get_json()["data"]] == ["W1"]
+    assert "site=west" in first.headers["Set-Cookie"]
+    assert box_numbers(client) == ["W1"]
+    assert box_numbers(client, headers={"X-Site": "east"}) == []
+
+
+def test_unknown_site_is_a_404_page_for_browsers_and_a_400_for_the_api(client):
+    page = client.get("/boxes?site=typo")
+    assert page.status_code == 404
+    assert page.mimetype == "text/html"
+    assert "Unknown site" in page.get_data(as_text=True)
+
+    api = client.get("/api/boxes", headers={"X-Site": "typo"})
+    assert api.status_code == 400
+    assert "Unknown site" in api.get_json()["error"]
+
+
+def test_inventory_of_all_sites_is_combined(client):
+    client.post("/api/boxes", json={"box_number": "E1", "weight": 1.5})
+    client.post("/api/boxes", json={"box_number": "W1", "weight": 2}, headers={"X-Site": "west"})
+    client.post("/api/boxes", json={"box_number": "W2", "weight": 3}, headers={"X-Site": "west"})
+
+    inventory = client.get("/api/sites/inventory").get_json()
+
+    assert inventory["sites"]["east"]["available"]["box_count"] == 1
+    assert inventory["sites"]["west"]["available"]["box_count"] == 2
+    assert inventory["combined"]["available"]["box_count"] == 3
+    assert inventory["combined"]["available"]["total_weight"] == 6.5
+
+
+def test_generate_data_creates_the_schema_on_every_site(app):
+    with app.app_context():
+        west = warehouse.site_engine(warehouse.db, "west")
+        with west.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE custom_box")
+
+        result = app.test_cli_runner().invoke(args=["generate-data", "--boxes", "20", "--seed", "1"])
+
+        assert result.exit_code == 0, result.output
+        assert inspect(west).has_table("custom_box")
+    assert count(Box, "east") == 20
+    assert count(Box, "west") == 0
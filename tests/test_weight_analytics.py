@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from weight_analytics import TARE, _nnls, fit_unit_weights, ranked_outliers  # noqa: E402
+
+
+def make_rows(unit_weights, boxes=200, tare=2.0, seed=0, together=()):
+    """Content rows for random boxes weighed with `unit_weights`, plus a little scale noise."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for box_id in range(1, boxes + 1):
+        quantities = {product: int(rng.integers(0, 6)) for product in unit_weights}
+        for product in together:
+            quantities[product] = quantities[together[0]]
+        if not any(quantities.values()):
+            quantities[next(iter(unit_weights))] = 1
+        weight = tare + sum(unit_weights[p] * q for p, q in quantities.items()) + rng.normal(scale=0.05)
+        rows.extend((box_id, weight, product, quantity) for product, quantity in quantities.items() if quantity)
+    return rows
+
+
+def test_fit_recovers_unit_weights_and_flags_a_typo():
+    rows = make_rows({"Laptops": 5.0, "LCDs": 8.0})
+    rows = [(box_id, 4500.0 if box_id == 7 else weight, product, quantity)
+            for box_id, weight, product, quantity in rows]
+
+    fit = fit_unit_weights(rows)
+
+    assert fit.unit_weights["Laptops"] == pytest.approx(5.0, abs=0.05)
+    assert fit.unit_weights["LCDs"] == pytest.approx(8.0, abs=0.05)
+    assert fit.unit_weights[TARE] == pytest.approx(2.0, abs=0.2)
+    assert [box["box_id"] for box in ranked_outliers(fit, threshold=5.0, limit=10)] == [7]
+
+
+def test_collinear_products_give_a_finite_non_negative_fit():
+    # Keyboards always ship with PCs, one for one, so only their sum can be fitted
+    rows = make_rows({"PCs": 15.0, "Keyboards": 2.0, "Wires": 0.5}, together=("PCs", "Keyboards"))
+
+    fit = fit_unit_weights(rows)
+    weights = fit.unit_weights
+
+    assert all(np.isfinite(value) and value >= 0 for value in weights.values())
+    assert weights["PCs"] + weights["Keyboards"] == pytest.approx(17.0, abs=0.1)
+    assert np.isfinite(fit.scores).all()
+
+
+def test_zero_weight_product_is_fitted_as_zero():
+    rows = make_rows({"Laptops": 5.0, "Manuals": 0.0})
+
+    fit = fit_unit_weights(rows)
+
+    assert fit.unit_weights["Manuals"] == pytest.approx(0.0, abs=0.02)
+    assert fit.unit_weights["Laptops"] == pytest.approx(5.0, abs=0.05)
+    assert np.isfinite(fit.scores).all()
+
+
+def test_nnls_does_not_divide_zero_by_zero():
+    # The second variable has a gradient but no curvature, so its solution is exactly 0 when it is
+    # made passive; a 0/0 step used to turn x into NaN and zero the whole fit
+    x = _nnls(np.array([[1.0, 0.0], [0.0, 0.0]]), np.array([1.0, 1.0]))
+
+    assert x.tolist() == [1.0, 0.0]
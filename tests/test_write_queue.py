@@ -0,0 +1,184 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+import app as warehouse
+from write_queue import WriteQueue, WriteQueueBusy
+
+
+class FlakySession(Session):
+    """Session whose commits fail while `fail_commits` is set."""
+    fail_commits = False
+
+    def commit(self):
+        if self.fail_commits:
+            raise RuntimeError("disk I/O error")
+        super().commit()
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A database with an item table, a session factory for the writer and a commit counter."""
+    engine = create_engine(f"sqlite:///{tmp_path}/queue.db")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE item (name TEXT NOT NULL UNIQUE)")
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(1))
+    current = {}
+
+    @contextmanager
+    def session_scope(site):
+        with FlakySession(engine) as session:
+            current["session"] = session
+            yield session
+
+    def add(name):
+        def insert():
+            current["session"].execute(text("INSERT INTO item (name) VALUES (:name)"), {"name": name})
+            return name
+        return insert
+
+    def names():
+        with engine.connect() as connection:
+            return sorted(connection.exec_driver_sql("SELECT name FROM item").scalars())
+
+    yield session_scope, add, names, commits
+    engine.dispose()
+
+
+def hold_writer(queue):
+    """Occupy the writer thread until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    future = queue.submit("main", block)
+    assert started.wait(5)
+    return release, future
+
+
+def test_queued_writes_commit_as_one_group(store):
+    session_scope, add, names, commits = store
+    queue = WriteQueue(session_scope, max_batch=50, max_delay=0.01)
+    release, blocker = hold_writer(queue)
+
+    futures = [queue.submit("main", add(f"box-{n}")) for n in range(10)]
+    release.set()
+
+    assert [future.result(5) for future in futures] == [f"box-{n}" for n in range(10)]
+    blocker.result(5)
+    assert len(names()) == 10
+    assert len(commits) == 2  # the blocker's group, then the ten writes together
+
+
+def test_a_failing_write_only_undoes_itself(store):
+    session_scope, add, names, commits = store
+    queue = WriteQueue(session_scope, max_delay=0.01)
+    release, _ = hold_writer(queue)
+
+    first = queue.submit("main", add("a"))
+    duplicate = queue.submit("main", add("a"))
+    last = queue.submit("main", add("b"))
+    release.set()
+
+    assert first.result(5) == "a" and last.result(5) == "b"
+    with pytest.raises(Exception, match="UNIQUE"):
+        duplicate.result(5)
+    assert names() == ["a", "b"]
+
+
+def test_a_failed_group_commit_is_retried_one_write_at_a_time(store):
+    session_scope, add, names, commits = store
+    queue = WriteQueue(session_scope, max_delay=0.01)
+    release, _ = hold_writer(queue)
+
+    futures = [queue.submit("main", add(name)) for name in ("a", "b", "c")]
+    original_commit_group = queue._commit_group
+
+    def fail_groups_only(site, batch):
+        FlakySession.fail_commits = len(batch) > 1
+        return original_commit_group(site, batch)
+
+    queue._commit_group = fail_groups_only
+    try:
+        release.set()
+        assert [future.result(5) for future in futures] == ["a", "b", "c"]
+    finally:
+        FlakySession.fail_commits = False
+    assert names() == ["a", "b", "c"]
+
+
+def test_a_write_that_waits_too_long_is_cancelled(store):
+    session_scope, add, names, _ = store
+    queue = WriteQueue(session_scope)
+    release, blocker = hold_writer(queue)
+
+    with pytest.raises(WriteQueueBusy):
+        queue.run("main", add("late"), timeout=0.05)
+    release.set()
+    blocker.result(5)
+    queue.run("main", add("next"), timeout=5)
+
+    assert names() == ["next"]
+
+
+def test_writes_are_turned_away_when_the_queue_is_full(store):
+    session_scope, add, names, _ = store
+    queue = WriteQueue(session_scope, max_pending=1)
+    release, _ = hold_writer(queue)
+
+    waiting = queue.submit("main", add("a"))
+    with pytest.raises(WriteQueueBusy):
+        queue.submit("main", add("b"))
+    release.set()
+
+    assert waiting.result(5) == "a"
+    assert names() == ["a"]
+
+
+@pytest.fixture
+def busy_queue(app, monkeypatch):
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_ENABLED", True)
+
+    def busy(site, fn, timeout):
+        raise WriteQueueBusy("500 writes are already waiting; try again shortly")
+
+    monkeypatch.setattr(warehouse.write_queue, "run", busy)
+
+
+def test_busy_queue_answers_api_requests_with_503(client, busy_queue):
+    response = client.post("/api/boxes", json={"box_number": "1", "weight": 2})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.parametrize("path, form", [
+    ("/boxes/new", {"box_number": "1", "weight": "2", "box_type": "simple"}),
+    ("/containers/new", {"name": "Dock 1"}),
+])
+def test_busy_queue_sends_forms_back_with_a_busy_message(client, busy_queue, path, form):
+    response = client.post(path, data=form, headers={"Referer": path})
+
+    assert response.status_code == 303
+    assert response.location == path
+    with client.session_transaction() as session:
+        messages = [message for _, message in session["_flashes"]]
+    assert messages == ["The database is busy: 500 writes are already waiting; try again shortly"]
+
+
+def test_boxes_are_saved_through_the_queue(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_ENABLED", True)
+    response = client.post("/api/boxes", json={"box_number": "1", "weight": 2,
+                                               "contents": [{"product_type": "PCs", "quantity": 4}]})
+
+    assert response.status_code == 201
+    with app.app_context():
+        box = warehouse.db.session.get(warehouse.Box, response.get_json()["box_id"])
+        assert box.box_number == "1"
+        assert box.calculate_totals() == {"PCs": 4}
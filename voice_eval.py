@@ -0,0 +1,337 @@
+"""
+Accuracy and latency check for voice box parsing.
+
+Replays a corpus of transcripts through the same steps as
+/api/voice/interpret-box: the prompt and Gemini call behind
+interpret_box_speech(), then normalize_interpretation(). Each corpus line
+(voice_corpus.jsonl) holds a transcript, the box state it is spoken over and
+the merged state expected back, or {"error": true} when the transcript should
+be rejected. The report gives exact-match accuracy per case and per field,
+per-call latency percentiles and prompt/response sizes in tokens:
+
+    python voice_eval.py --record voice-rec.json   # Gemini itself (needs GEMINI_API_KEY)
+    python voice_eval.py --replay voice-rec.json   # recorded responses, no network
+    python voice_eval.py --self-test               # gemini_stub.py, started in-process
+
+--self-test scores the stub's regex parser, not the model: it checks that the
+harness runs end to end, and its accuracy says nothing about Gemini.
+
+Replaying recorded responses checks parser and normalization changes
+without using quota; prompt changes need a live run. Save a report with
+--output and pass it as --baseline next time to fail on lower accuracy or a
+slower p95 or bigger prompts.
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import gemini_client
+from gemini_client import GeminiUnavailable, normalize_interpretation, parse_interpretation
+from gemini_stub import StubServer
+
+
+FIELDS = ("box_number", "weight", "contents")
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            missing = [key for key in ("id", "transcript", "current_box", "expected") if key not in case]
+            if missing:
+                raise ValueError(f"{path}:{number} is missing {', '.join(missing)}")
+            if any(other["id"] == case["id"] for other in cases):
+                raise ValueError(f"{path}:{number} repeats the case ID {case['id']!r}")
+            cases.append(case)
+    return cases
+
+
+def _product_types() -> List[str]:
+    # The app's list is what the endpoint accepts; it is read at import time
+    # along with DATABASE_URL, so point that at a throwaway file first
+    directory = tempfile.mkdtemp(prefix="voice-eval-")
+    atexit.register(shutil.rmtree, directory, True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'scratch.db')}"
+    os.environ.setdefault("LOG_FILE", "")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from app import PRODUCT_TYPES
+    return PRODUCT_TYPES
+
+
+def _current_state(current_box: Dict[str, Any]) -> Dict[str, Any]:
+    """current_box normalized the way the endpoint does before calling Gemini."""
+    return {
+        "box_number": current_box.get("box_number"),
+        "weight": current_box.get("weight"),
+        "contents": current_box.get("contents") or [],
+    }
+
+
+def _contents_key(contents: List[Dict[str, Any]]) -> Counter:
+    return Counter((item["product_type"], int(item["quantity"]), item.get("lcd_size")) for item in contents)
+
+
+def field_mismatches(expected: Dict[str, Any], actual: Dict[str, Any]) -> Dict[str, str]:
+    """{field: description} of every field of `actual` that differs from `expected`."""
+    if expected.get("error"):
+        return {} if actual.get("error") else {"error": f"expected an error, got {json.dumps(actual)}"}
+    if actual.get("error"):
+        return {field: f"got error {actual['error']!r}" for field in FIELDS}
+
+    mismatches = {}
+    expected_number = expected.get("box_number")
+    actual_number = actual.get("box_number")
+    if (None if expected_number is None else str(expected_number)) != (None if actual_number is None else str(actual_number)):
+        mismatches["box_number"] = f"expected {expected_number!r}, got {actual_number!r}"
+    expected_weight = expected.get("weight")
+    actual_weight = actual.get("weight")
+    if (expected_weight is None) != (actual_weight is None) or (
+            expected_weight is not None and abs(float(expected_weight) - float(actual_weight)) > 0.01):
+        mismatches["weight"] = f"expected {expected_weight!r}, got {actual_weight!r}"
+    if _contents_key(expected.get("contents") or []) != _contents_key(actual.get("contents") or []):
+        mismatches["contents"] = (f"expected {json.dumps(expected.get('contents'), ensure_ascii=False)}, "
+                                  f"got {json.dumps(actual.get('contents'), ensure_ascii=False)}")
+    return mismatches
+
+
+def start_stub(median_ms: float, sigma: float) -> StubServer:
+    """Serve gemini_stub.py on a free local port and point gemini_client at it."""
+    server = StubServer(("127.0.0.1", 0), median_ms, sigma, error_rate=0.0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ[gemini_client.GEMINI_API_BASE_ENV] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault(gemini_client.GEMINI_API_KEY_ENV, "stub")
+    return server
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _tokens(data: Dict[str, Any], prompt: str) -> Tuple[int, int]:
+    """(prompt, response) tokens from the usage metadata, else estimated at four characters a token."""
+    usage = data.get("usageMetadata") or {}
+    try:
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        text = ""
+    return (usage.get("promptTokenCount") or math.ceil(len(prompt) / 4),
+            usage.get("candidatesTokenCount") or math.ceil(len(text) / 4))
+
+
+def run_case(case: Dict[str, Any], product_types: List[str],
+             recorded: Optional[List[Dict[str, Any]]], attempt: int) -> Dict[str, Any]:
+    """Interpret one case, live or from `recorded` responses, and compare it with the expected state."""
+    current = _current_state(case["current_box"])
+    prompt = gemini_client.build_prompt(case["transcript"], current)
+    call: Dict[str, Any] = {"id": case["id"], "prompt_sha256": _prompt_hash(prompt)}
+
+    if recorded is not None:
+        if not recorded:
+            call.update(outcome="not_recorded", mismatches={"error": "no recorded response for this case"})
+            return call
+        entry = recorded[attempt % len(recorded)]
+        data, call["latency_ms"] = entry["response"], entry["latency_ms"]
+        call["stale"] = entry["prompt_sha256"] != call["prompt_sha256"]
+    else:
+        started = time.perf_counter()
+        try:
+            data = gemini_client.request_interpretation(prompt)
+        except GeminiUnavailable as exc:
+            call.update(outcome="unavailable", latency_ms=round((time.perf_counter() - started) * 1000, 1),
+                        mismatches={"error": str(exc)})
+            return call
+        call["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    call["response"] = data
+    call["prompt_tokens"], call["response_tokens"] = _tokens(data, prompt)
+
+    try:
+        merged = normalize_interpretation(parse_interpretation(data), current, product_types)
+    except ValueError as exc:
+        merged = {"error": f"LLM parsing error: {exc}"}
+    call["result"] = merged
+    call["mismatches"] = field_mismatches(case["expected"], merged)
+    call["outcome"] = "fail" if call["mismatches"] else "pass"
+    return call
+
+
+def summarize(cases: List[Dict[str, Any]], calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    answered = [call for call in calls if "latency_ms" in call and call["outcome"] != "unavailable"]
+    latencies = [call["latency_ms"] for call in answered]
+    prompt_tokens = [call["prompt_tokens"] for call in answered]
+    response_tokens = [call["response_tokens"] for call in answered]
+    # Field accuracy is over the answered calls of cases that expect a box state
+    expected = {case["id"]: case["expected"] for case in cases}
+    field_cases = [call for call in calls
+                   if call["outcome"] in ("pass", "fail") and not expected[call["id"]].get("error")]
+    return {
+        "cases": len(cases),
+        "calls": len(calls),
+        "accuracy": round(sum(call["outcome"] == "pass" for call in calls) / max(len(calls), 1), 4),
+        "field_accuracy": {
+            field: round(sum(field not in call["mismatches"] for call in field_cases) / max(len(field_cases), 1), 4)
+            for field in FIELDS
+        },
+        "outcomes": dict(Counter(call["outcome"] for call in calls)),
+        "stale_recordings": sum(bool(call.get("stale")) for call in calls),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 1),
+            "p90": round(_percentile(latencies, 90), 1),
+            "p95": round(_percentile(latencies, 95), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        "prompt_tokens": {"mean": round(sum(prompt_tokens) / max(len(prompt_tokens), 1), 1),
+                          "max": max(prompt_tokens, default=0)},
+        "response_tokens": {"mean": round(sum(response_tokens) / max(len(response_tokens), 1), 1),
+                            "max": max(response_tokens, default=0)},
+    }
+
+
+def regressions(summary: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """What got worse than `baseline`: any accuracy drop, or latency/prompt size up by more than `tolerance`."""
+    found = []
+    if summary["accuracy"] < baseline["accuracy"]:
+        found.append(f"accuracy fell from {baseline['accuracy']:.1%} to {summary['accuracy']:.1%}")
+    for metric, key in (("latency_ms", "p95"), ("prompt_tokens", "mean")):
+        before, after = baseline[metric][key], summary[metric][key]
+        if before and after > before * (1 + tolerance):
+            found.append(f"{metric} {key} rose from {before} to {after}")
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_corpus.jsonl"),
+                        help="JSON lines corpus (default: voice_corpus.jsonl next to this script)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay", metavar="FILE", help="Use responses recorded with --record instead of calling Gemini")
+    source.add_argument("--self-test", action="store_true",
+                        help="Check the harness against gemini_stub.py instead of Gemini; the accuracy measures the stub")
+    parser.add_argument("--record", metavar="FILE", help="Save the raw responses of this run for --replay")
+    parser.add_argument("--repeat", type=int, default=1, help="Calls per case (default: %(default)s)")
+    parser.add_argument("--stub-median-ms", type=float, default=20.0,
+                        help="Median latency of the --self-test stub in milliseconds (default: %(default)s)")
+    parser.add_argument("--stub-sigma", type=float, default=0.35,
+                        help="Log-normal shape of the --self-test stub's latency (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    parser.add_argument("--baseline", default=None,
+                        help="Report from an earlier run; exit with status 1 if this run is worse")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed rise in p95 latency and prompt size over the baseline (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.replay and args.record:
+        parser.error("--record cannot be combined with --replay")
+    if args.self_test and args.record:
+        parser.error("--record cannot be combined with --self-test; stub answers would replay as Gemini's")
+    if not (args.replay or args.self_test or os.getenv(gemini_client.GEMINI_API_KEY_ENV)):
+        parser.error(f"{gemini_client.GEMINI_API_KEY_ENV} is not set: set it to call Gemini, "
+                     "pass --replay FILE to use recorded responses, or --self-test to check the harness against the stub")
+    cases = load_corpus(args.corpus)
+    product_types = _product_types()
+
+    recordings: Optional[Dict[str, List[Dict[str, Any]]]] = None
+    stub = None
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            recordings = json.load(f)["calls"]
+        mode, source_name = "replay", f"replay of {args.replay}"
+    elif args.self_test:
+        stub = start_stub(args.stub_median_ms, args.stub_sigma)
+        mode, source_name = "self-test", f"gemini_stub (median {args.stub_median_ms:g} ms)"
+    else:
+        mode, source_name = "live", os.getenv(gemini_client.GEMINI_API_BASE_ENV, gemini_client.DEFAULT_API_BASE)
+
+    calls = []
+    try:
+        for attempt in range(args.repeat):
+            for case in cases:
+                recorded = recordings.get(case["id"], []) if recordings is not None else None
+                calls.append(run_case(case, product_types, recorded, attempt))
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    summary = summarize(cases, calls)
+    failures = Counter((call["id"], field, problem) for call in calls for field, problem in call["mismatches"].items())
+    for (case_id, field, problem), count in failures.items():
+        print(f"FAIL {case_id} {field}: {problem}" + (f" ({count} of {args.repeat} calls)" if args.repeat > 1 else ""))
+    if mode == "self-test":
+        print("\nHARNESS SELF-TEST: these answers come from gemini_stub.py's regex parser, not from Gemini, so the "
+              "accuracy below only shows the harness runs end to end. It says nothing about the model.")
+        print(f"Source: {source_name}; {summary['cases']} cases, {summary['calls']} calls")
+    else:
+        print(f"\nSource: {source_name}; model {gemini_client.MODEL_NAME}; "
+              f"{summary['cases']} cases, {summary['calls']} calls")
+    print(f"{'Stub accuracy' if mode == 'self-test' else 'Accuracy'}: {summary['accuracy']:.1%}  "
+          + "  ".join(f"{field} {value:.1%}" for field, value in summary["field_accuracy"].items()))
+    print(f"Outcomes: {summary['outcomes']}")
+    if summary["stale_recordings"]:
+        print(f"Stale: {summary['stale_recordings']} recorded responses were made with a different prompt")
+    latency = summary["latency_ms"]
+    print(f"Latency ms: p50 {latency['p50']}  p90 {latency['p90']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    print(f"Prompt tokens: mean {summary['prompt_tokens']['mean']}  max {summary['prompt_tokens']['max']}; "
+          f"response tokens: mean {summary['response_tokens']['mean']}  max {summary['response_tokens']['max']}")
+
+    report = {
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "mode": mode,
+        "source": source_name,
+        "model": None if mode == "self-test" else gemini_client.MODEL_NAME,
+        "corpus": args.corpus,
+        "summary": summary,
+        "calls": [{key: value for key, value in call.items() if key != "response"} for call in calls],
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.record:
+        recorded_calls: Dict[str, List[Dict[str, Any]]] = {}
+        for call in calls:
+            if "response" in call:
+                recorded_calls.setdefault(call["id"], []).append(
+                    {key: call[key] for key in ("prompt_sha256", "latency_ms", "response")})
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump({"recorded_at": report["generated_at"], "model": gemini_client.MODEL_NAME,
+                       "source": source_name, "calls": recorded_calls}, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("mode") == "self-test") != (mode == "self-test"):
+            print("Baseline and this run must both be self-tests or both be Gemini runs (live or replay)",
+                  file=sys.stderr)
+            return 2
+        found = regressions(summary, baseline["summary"], args.tolerance)
+        for problem in found:
+            print(f"REGRESSION: {problem}")
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
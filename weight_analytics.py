@@ -0,0 +1,166 @@
+"""
+Per-product unit weights and mis-weighed box detection.
+
+Every box has a recorded total weight and per-product quantities, so the
+weight of one unit of each product type (plus the empty box itself) can be
+fitted as a non-negative least-squares problem over all boxes:
+
+    weight ≈ tare + Σ quantity[product] × unit_weight[product]
+
+Boxes whose recorded weight is far from the fitted one are likely typos,
+for example a voice entry heard as 4,500 lbs instead of 45.0. The fit is
+done with NumPy on a box × product quantity matrix: the normal equations
+are only products × products, so the Lawson–Hanson active-set solver runs
+on a tiny system however many boxes there are. NumPy is optional; without
+it `numpy_available` is False and callers should report the feature as
+unavailable.
+"""
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from sqlalchemy.engine import Connection
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the estimate is unavailable without it
+    np = None
+
+numpy_available = np is not None
+
+# Column of the fit holding the weight of an empty box
+TARE = "(empty box)"
+
+# Consistency constant turning a median absolute deviation into a standard deviation
+MAD_SCALE = 1.4826
+
+# (box ID, recorded weight, product type, quantity), one row per box content line
+ContentRow = Tuple[int, float, str, int]
+
+ROW_DTYPE = [("box_id", "i8"), ("weight", "f8"), ("product", "O"), ("quantity", "f8")]
+
+
+class UnitWeightFit(NamedTuple):
+    unit_weights: Dict[str, float]
+    box_ids: Any  # numpy arrays, aligned by box
+    weights: Any
+    expected: Any
+    scores: Any
+    boxes_used: int
+    products_skipped: List[str]
+
+
+def _nnls(ata: Any, atb: Any, max_iterations: int = 100) -> Any:
+    """Lawson–Hanson NNLS on the normal equations: min |Ax - b| with x >= 0, given AᵀA and Aᵀb."""
+    size = len(atb)
+    x = np.zeros(size)
+    passive = np.zeros(size, dtype=bool)
+    tolerance = 1e-10 * max(1.0, float(np.abs(ata).max()))
+    gradient = atb - ata @ x
+    for _ in range(max_iterations):
+        candidates = np.where(passive, -np.inf, gradient)
+        if passive.all() or candidates.max() <= tolerance:
+            break
+        passive[int(candidates.argmax())] = True
+        while True:
+            solution = np.zeros(size)
+            solution[passive] = np.linalg.lstsq(ata[np.ix_(passive, passive)], atb[passive], rcond=None)[0]
+            if (solution[passive] > tolerance).all():
+                break
+            # Step back towards x until the first passive variable hits zero, then drop it.
+            # Only variables moving down bound the step: one just made passive has x == 0,
+            # and with collinear or empty columns its solution can be 0 too (a 0/0 step)
+            blocking = passive & (solution <= tolerance) & (x > solution)
+            step = np.min(x[blocking] / (x[blocking] - solution[blocking])) if blocking.any() else 0.0
+            x = x + step * (solution - x)
+            passive &= x > tolerance
+            x[~passive] = 0.0
+        x = solution
+        gradient = atb - ata @ x
+    return x
+
+
+def load_content_rows(connection: Connection) -> List[ContentRow]:
+    """
+    Every live box content line with its box's weight. Read through the
+    DBAPI cursor: building SQLAlchemy rows costs more than the whole fit at
+    100k boxes.
+    """
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT box_content.box_id, box.weight, box_content.product_type, box_content.quantity "
+            "FROM box_content JOIN box ON box.id = box_content.box_id"
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def fit_unit_weights(rows: Sequence[ContentRow], min_boxes: int = 20,
+                     outlier_score: float = 5.0) -> UnitWeightFit:
+    """
+    Fit unit weights to `rows`. Product types found in fewer than
+    `min_boxes` boxes are skipped, along with the boxes containing them,
+    since their weight cannot be told apart from noise. The fit is repeated
+    once without boxes scoring above `outlier_score`, so a few gross typos
+    do not skew the unit weights used to judge everything else.
+    """
+    if not rows:
+        empty = np.zeros(0)
+        return UnitWeightFit({}, empty.astype(np.int64), empty, empty, empty, 0, [])
+
+    table = np.array(rows, dtype=ROW_DTYPE)
+    products = sorted(set(table["product"]))
+    product_index = {product: index for index, product in enumerate(products)}
+    product_ids = np.array([product_index[product] for product in table["product"]], dtype=np.int64)
+    box_ids, box_rows = np.unique(table["box_id"], return_inverse=True)
+    weights = np.zeros(len(box_ids))
+    weights[box_rows] = table["weight"]
+
+    # A box may list a product in several sections; bincount adds those up
+    quantities = np.bincount(box_rows * len(products) + product_ids, weights=table["quantity"],
+                             minlength=len(box_ids) * len(products)).reshape(len(box_ids), len(products))
+
+    boxes_per_product = np.count_nonzero(quantities, axis=0)
+    kept = boxes_per_product >= min_boxes
+    skipped = [product for product, keep in zip(products, kept) if not keep]
+    usable = ~np.any(quantities[:, ~kept] != 0, axis=1)
+    box_ids, weights = box_ids[usable], weights[usable]
+    matrix = np.column_stack([np.ones(len(box_ids)), quantities[usable][:, kept]])
+    columns = [TARE] + [product for product, keep in zip(products, kept) if keep]
+
+    included = np.ones(len(box_ids), dtype=bool)
+    for _ in range(2):
+        fitted = matrix[included]
+        coefficients = _nnls(fitted.T @ fitted, fitted.T @ weights[included])
+        expected = matrix @ coefficients
+        residuals = weights - expected
+        center = np.median(residuals[included])
+        spread = MAD_SCALE * np.median(np.abs(residuals[included] - center))
+        scores = (residuals - center) / max(spread, 1e-9)
+        included = np.abs(scores) <= outlier_score
+        if included.sum() <= len(columns):
+            break
+
+    return UnitWeightFit(
+        unit_weights={column: round(float(value), 3) for column, value in zip(columns, coefficients)},
+        box_ids=box_ids,
+        weights=weights,
+        expected=expected,
+        scores=scores,
+        boxes_used=int(len(box_ids)),
+        products_skipped=skipped,
+    )
+
+
+def ranked_outliers(fit: UnitWeightFit, threshold: float, limit: int) -> List[Dict[str, Any]]:
+    """The boxes scoring above `threshold`, most implausible first."""
+    magnitude = np.abs(fit.scores)
+    flagged = np.flatnonzero(magnitude > threshold)
+    flagged = flagged[np.argsort(-magnitude[flagged], kind="stable")][:limit]
+    return [{
+        "box_id": int(fit.box_ids[index]),
+        "weight": round(float(fit.weights[index]), 2),
+        "expected_weight": round(float(fit.expected[index]), 2),
+        "difference": round(float(fit.weights[index] - fit.expected[index]), 2),
+        "score": round(float(fit.scores[index]), 2),
+    } for index in flagged]
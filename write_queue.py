@@ -0,0 +1,147 @@
+"""
+Single-writer queue with group commit for the SQLite databases.
+
+SQLite lets one connection write at a time, so when every request opens its
+own write transaction a burst of saves piles up on the database lock, each
+waiting for the others' commits and some giving up with "database is
+locked". With the queue, requests hand their change to one writer thread
+per site and process instead. The writer takes what has queued up (up to
+`max_batch` writes, waiting at most `max_delay` seconds after the first),
+runs each write in its own savepoint of one transaction and commits once.
+
+A write that raises only rolls back its savepoint; its caller gets the
+exception and the rest of the group still commits. If the commit itself
+fails, the group's writes are retried one at a time so each caller gets its
+own outcome. Writes run in the writer thread, so they must not touch the
+request and should return plain values (IDs, dicts) rather than ORM objects.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, ContextManager, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueBusy(Exception):
+    """Too many writes are waiting, or this one waited too long to start."""
+
+
+class _Write(NamedTuple):
+    fn: Callable[[], Any]
+    future: Future
+
+
+class WriteQueue:
+    """
+    One writer thread per site, started on first use. `session_scope(site)`
+    must return a context manager giving a fresh Session routed to that
+    site; the writer calls begin_nested(), commit() and rollback() on it.
+    At most `max_pending` writes wait per site; more are turned away.
+    """
+
+    def __init__(self, session_scope: Callable[[str], ContextManager[Session]], max_batch: int = 50,
+                 max_delay: float = 0.005, max_pending: int = 500):
+        self.session_scope = session_scope
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._queues: Dict[str, "queue.Queue[_Write]"] = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, site: str) -> "queue.Queue[_Write]":
+        with self._lock:
+            pending = self._queues.get(site)
+            if pending is None:
+                pending = self._queues[site] = queue.Queue(maxsize=self.max_pending)
+                threading.Thread(target=self._loop, args=(site, pending), name=f"writer-{site}",
+                                 daemon=True).start()
+        return pending
+
+    def submit(self, site: str, fn: Callable[[], Any]) -> Future:
+        """Queue `fn` for the site's writer; the future holds its return value or exception."""
+        future: Future = Future()
+        try:
+            self._queue(site).put_nowait(_Write(fn, future))
+        except queue.Full:
+            raise WriteQueueBusy(f"{self.max_pending} writes are already waiting; try again shortly") from None
+        return future
+
+    def run(self, site: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn` in the site's writer and return its result. If it has not
+        started after `timeout` seconds it is cancelled, so it never runs
+        behind the caller's back, and WriteQueueBusy is raised. A write that
+        already started is waited for.
+        """
+        future = self.submit(site, fn)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise WriteQueueBusy(f"The write did not start within {timeout:g} seconds; try again") from None
+            return future.result()
+
+    def _next_batch(self, pending: "queue.Queue[_Write]") -> List[_Write]:
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(pending.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        # Writes whose callers gave up are dropped here
+        return [write for write in batch if write.future.set_running_or_notify_cancel()]
+
+    def _loop(self, site: str, pending: "queue.Queue[_Write]") -> None:
+        while True:
+            batch = self._next_batch(pending)
+            if not batch:
+                continue
+            try:
+                self._commit_group(site, batch)
+            except Exception as exc:
+                if len(batch) == 1:
+                    batch[0].future.set_exception(exc)
+                    continue
+                logger.warning(f"Group commit of {len(batch)} writes on {site} failed ({exc}); "
+                               "retrying them one at a time")
+                for write in batch:
+                    try:
+                        self._commit_group(site, [write])
+                    except Exception as single_exc:
+                        write.future.set_exception(single_exc)
+
+    def _commit_group(self, site: str, batch: List[_Write]) -> None:
+        started = time.perf_counter()
+        with self.session_scope(site) as session:
+            try:
+                # pysqlite only opens a transaction before DML, so without this the
+                # first savepoint would be the transaction and releasing it would
+                # commit. IMMEDIATE takes the write lock up front, waiting out other
+                # processes' writes under the busy timeout instead of failing midway.
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+                outcomes = [self._apply(session, write) for write in batch]
+                session.commit()
+            except BaseException:
+                session.rollback()
+                raise
+        for write, (error, result) in zip(batch, outcomes):
+            if error is not None:
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+        if len(batch) > 1:
+            logger.debug(f"Committed {len(batch)} writes on {site} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    @staticmethod
+    def _apply(session: Session, write: _Write) -> Tuple[Optional[BaseException], Any]:
+        try:
+            with session.begin_nested():
+                return None, write.fn()
+        except Exception as exc:
+            return exc, None